@@ -0,0 +1,363 @@
+# batch_render.py - 无界面的批量渲染入口
+#
+# 用法 (在 manim_export_gui 目录下运行):
+#     python batch_render.py renders.toml --max-workers 4 --summary summary.json
+#     python batch_render.py renders.toml --resume      # 只重新渲染上次失败或未完成的任务
+#     python batch_render.py renders.toml --dry-run     # 打印命令、场景是否未改变和根据渲染记录估算的耗时
+#
+# 清单文件为 JSON 或 TOML，每个条目对应 GUI 中的一次"开始渲染"：
+#
+#     python = "/path/to/.venv/bin/python"   # 可选，默认为运行本脚本的解释器
+#     max_workers = 4                        # 可选，默认为 CPU 核心数
+#
+#     [defaults]                             # 可选，各条目的默认值
+#     quality = "high"                       # low / medium / high / production / 4k (或 -ql 等参数)
+#     format = "mp4"                         # mp4 / gif / png_last
+#     transparent = false
+#
+#     [[renders]]
+#     script = "../topic02_future_uncertainty.py"   # 相对路径以清单文件所在目录为基准
+#     scenes = ["UncertaintyIllustration"]           # 省略或为 "all" 时渲染脚本中的全部场景
+#     output_dir = "../media"                        # 省略时为脚本同级的 media 目录 (与 GUI 默认一致)
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+if script_dir not in sys.path:
+    sys.path.insert(0, script_dir)
+
+from core.command_builder import build_manim_command, normalize_quality, OUTPUT_FORMATS
+from core.manim_runner import run_manim_jobs
+from core.tex_cache import get_default_tex_cache_dir
+from core.render_cache import RenderCache
+from core.render_events import AnimationProgress, FileReady, RenderFinished, format_event
+from core.class_index import find_scene_names
+from core.cost_estimator import estimate_command, format_cost, order_longest_first
+from core.telemetry import TelemetryStore, format_expected
+
+# 条目中可以使用的键
+_ENTRY_KEYS = {"script", "scenes", "quality", "format", "transparent", "output_dir"}
+
+def load_manifest(path):
+    """读取 JSON 或 TOML (扩展名为 .toml) 格式的清单文件。
+
+    Raises:
+        ValueError: 文件格式错误，或当前 Python 不支持 TOML。
+    """
+    if path.lower().endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ValueError("读取 TOML 清单需要 Python 3.11+ 或安装 tomli，也可以改用 JSON 清单。")
+        with open(path, "rb") as f:
+            try:
+                return tomllib.load(f)
+            except tomllib.TOMLDecodeError as e:
+                raise ValueError(f"TOML 格式错误: {e}")
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except ValueError as e:
+            raise ValueError(f"JSON 格式错误: {e}")
+
+def _job_id(command):
+    """任务标识：由解释器之后的完整命令 (参数、脚本、场景) 计算，用于断点续跑。"""
+    return hashlib.sha1(json.dumps(command[1:], ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def expand_manifest(manifest, base_dir, python_path=None):
+    """把清单展开为每个场景一个渲染任务。
+
+    Args:
+        manifest (dict): load_manifest 的结果。
+        base_dir (str): 解析相对路径的基准目录 (清单文件所在目录)。
+        python_path (str | None): 覆盖清单中的解释器。
+
+    Returns:
+        list[dict]: 任务列表，每项包含 id、name、script、scene、quality、format、
+            transparent、output_dir 和 command。
+
+    Raises:
+        ValueError: 条目缺少脚本、选项无效或找不到场景。
+    """
+    python_path = python_path or manifest.get("python") or sys.executable
+    defaults = manifest.get("defaults", {})
+    entries = manifest.get("renders")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("清单中没有 renders 条目。")
+
+    jobs = []
+    for index, entry in enumerate(entries, start=1):
+        unknown = set(entry) - _ENTRY_KEYS
+        if unknown:
+            raise ValueError(f"第 {index} 个条目包含未知的键: {', '.join(sorted(unknown))}")
+        options = dict(defaults, **entry)
+        if not options.get("script"):
+            raise ValueError(f"第 {index} 个条目缺少 script。")
+        script = os.path.normpath(os.path.join(base_dir, options["script"]))
+        if not os.path.isfile(script):
+            raise ValueError(f"第 {index} 个条目的脚本不存在: {script}")
+
+        scenes = options.get("scenes", "all")
+        if isinstance(scenes, str):
+            scenes = find_scene_names(script) if scenes == "all" else [scenes]
+        if not scenes:
+            raise ValueError(f"第 {index} 个条目在 {script} 中找不到场景。")
+
+        output_format = options.get("format", "mp4")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"第 {index} 个条目的 format 无效: {output_format} (可选: {', '.join(OUTPUT_FORMATS)})")
+        try:
+            quality_flag = normalize_quality(options.get("quality", "high"))
+        except ValueError as e:
+            raise ValueError(f"第 {index} 个条目: {e}")
+        output_dir = options.get("output_dir")
+        output_dir = os.path.normpath(os.path.join(base_dir, output_dir)) if output_dir \
+            else os.path.join(os.path.dirname(script), "media")
+        transparent = bool(options.get("transparent", False))
+
+        base_command = build_manim_command(python_path, quality_flag, output_format, transparent,
+                                           media_dir=output_dir)
+        for scene in scenes:
+            command = base_command + [script, scene]
+            jobs.append({
+                "id": _job_id(command),
+                "name": f"{os.path.splitext(os.path.basename(script))[0]}.{scene}",
+                "script": script,
+                "scene": scene,
+                "quality": quality_flag,
+                "format": output_format,
+                "transparent": transparent,
+                "output_dir": output_dir,
+                "command": command,
+            })
+
+    # 同一场景以不同参数渲染多次时，任务名称加上序号以便区分
+    counts = {}
+    for job in jobs:
+        counts[job["name"]] = counts.get(job["name"], 0) + 1
+    seen = {}
+    for job in jobs:
+        if counts[job["name"]] > 1:
+            seen[job["name"]] = seen.get(job["name"], 0) + 1
+            job["name"] = f"{job['name']}#{seen[job['name']]}"
+    return jobs
+
+def load_state(path):
+    """读取断点续跑状态 {任务 id: 结果}；文件不存在或损坏时返回空字典。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("succeeded", {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+def save_state(path, succeeded):
+    """原子地写入断点续跑状态。"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"succeeded": succeeded}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def estimate_jobs(jobs, telemetry):
+    """根据渲染记录给每个任务填写 expected (TelemetryStore.expected 的结果)，返回有记录的预计总耗时 (秒)。"""
+    total = 0.0
+    for job in jobs:
+        job["expected"] = telemetry.expected(job["command"])
+        if job["expected"]:
+            total += job["expected"]["seconds"]
+    return total
+
+def run_batch(jobs, max_workers=None, cache=None, chunked=False, timeout=None, fail_fast=False,
+              state_path=None, resume=False, log=None, telemetry=None, static_fast_path=True,
+              tex_cache_dir=None, precompile_tex=True):
+    """执行批量渲染并返回汇总信息。
+
+    Args:
+        jobs (list[dict]): expand_manifest 的结果。
+        max_workers (int | None): 最大并发数。
+        cache (RenderCache | None): 渲染缓存。
+        chunked (bool): 是否把每个场景分段并行渲染。
+        timeout (float | None): 整批任务的墙钟超时 (秒)。
+        fail_fast (bool): 为 True 时第一个任务失败后取消其余任务。
+        state_path (str | None): 断点续跑状态文件；每个任务成功后立即更新。
+        resume (bool): 为 True 时跳过状态文件中已成功的任务。
+        log (callable | None): 接收 RenderEvent 的日志函数。
+        telemetry (TelemetryStore | None): 渲染记录；提供时记录每个任务的耗时和资源占用。
+        static_fast_path (bool): 从不播放动画的场景 (format 为 mp4 时) 直接导出单帧 PNG。
+        tex_cache_dir (str | None): 共享的 LaTeX / Text 缓存目录；为 None 时使用各输出目录下的缓存。
+        precompile_tex (bool): 使用共享缓存时，开始渲染前并行预编译各脚本中的 LaTeX 字符串。
+
+    Returns:
+        dict: 可序列化为 JSON 的汇总信息。
+    """
+    succeeded_state = load_state(state_path) if state_path and resume else {}
+    to_run = [job for job in jobs if job["id"] not in succeeded_state]
+    by_name = {job["name"]: job for job in to_run}
+    records = {job["id"]: {"status": "skipped", "return_code": 0, "duration": 0.0, "cached": False,
+                           "output_files": succeeded_state.get(job["id"], {}).get("output_files", [])}
+               for job in jobs}
+    lock = threading.Lock()
+    failed = threading.Event()
+
+    def on_event(event):
+        if log:
+            log(event)
+        name = event.job if len(to_run) > 1 else to_run[0]["name"]
+        job = by_name.get(name) # 分段渲染的片段事件 ("名称 片段 i/K") 不计入任务结果
+        if job is None:
+            return
+        with lock:
+            record = records[job["id"]]
+            if isinstance(event, FileReady):
+                record["output_files"].append(event.path)
+            elif isinstance(event, RenderFinished):
+                record["return_code"] = event.return_code
+                record["duration"] = event.duration
+                record["cached"] = event.cached
+                if event.cancelled:
+                    record["status"] = "cancelled"
+                elif event.return_code == 0:
+                    record["status"] = "succeeded"
+                    if state_path:
+                        succeeded_state[job["id"]] = {"name": job["name"], "output_files": record["output_files"],
+                                                      "finished": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                        save_state(state_path, succeeded_state)
+                else:
+                    record["status"] = "failed"
+                    failed.set()
+
+    for job in to_run:
+        records[job["id"]].update(status="pending", return_code=None, output_files=[])
+
+    start = time.time()
+    interrupted = False
+    if to_run:
+        # 按静态估计的像素量先启动最长的任务，避免长任务最后才开始
+        ordered = order_longest_first(to_run, command_of=lambda job: job["command"])
+        handle = run_manim_jobs([(job["name"], job["command"]) for job in ordered], on_event,
+                                max_workers=max_workers, cache=cache, chunked=chunked, timeout=timeout,
+                                telemetry=telemetry, static_fast_path=static_fast_path,
+                                tex_cache_dir=tex_cache_dir, precompile_tex=precompile_tex)
+        try:
+            while handle.wait(0.2) is None:
+                if fail_fast and failed.is_set() and not handle.cancelled:
+                    handle.cancel()
+        except KeyboardInterrupt:
+            interrupted = True
+            handle.cancel()
+            handle.wait()
+        for job in to_run:
+            if records[job["id"]]["status"] == "pending":
+                records[job["id"]]["status"] = "cancelled"
+
+    results = [dict({key: job[key] for key in ("id", "name", "script", "scene", "quality", "format",
+                                                 "transparent", "output_dir", "command")},
+                    expected_seconds=(job.get("expected") or {}).get("seconds"), **records[job["id"]])
+               for job in jobs]
+    counts = {status: sum(1 for item in results if item["status"] == status)
+              for status in ("succeeded", "failed", "cancelled", "skipped")}
+    return dict(counts, total=len(results), duration=time.time() - start, interrupted=interrupted,
+                ok=counts["failed"] == 0 and counts["cancelled"] == 0, jobs=results)
+
+def main():
+    parser = argparse.ArgumentParser(description="根据清单文件 (JSON / TOML) 无界面批量渲染 Manim 场景")
+    parser.add_argument("manifest", help="清单文件路径")
+    parser.add_argument("--python", help="覆盖清单中的 Python 解释器")
+    parser.add_argument("--max-workers", type=int, help="最大并发渲染数 (默认读取清单，否则为 CPU 核心数)")
+    parser.add_argument("--resume", action="store_true", help="跳过上次已成功的任务，只渲染失败或未完成的任务")
+    parser.add_argument("--state", help="断点续跑状态文件 (默认为 <清单>.state.json)")
+    parser.add_argument("--fail-fast", action="store_true", help="任一任务失败时取消其余任务")
+    parser.add_argument("--timeout", type=float, help="整批任务的墙钟超时 (秒)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用渲染缓存")
+    parser.add_argument("--no-telemetry", action="store_true", help="不读取也不写入渲染记录 (耗时和峰值内存历史)")
+    parser.add_argument("--no-static-fast-path", action="store_true",
+                        help="从不播放动画的场景也渲染视频 (默认直接导出单帧 PNG)")
+    parser.add_argument("--no-tex-cache", action="store_true",
+                        help="不使用共享的 LaTeX / Text 缓存 (每个输出目录单独编译)")
+    parser.add_argument("--no-tex-precompile", action="store_true",
+                        help="渲染前不预编译脚本中的 LaTeX 字符串 (渲染时逐个编译)")
+    parser.add_argument("--chunked", action="store_true", help="把每个场景按动画分段并行渲染 (需要 ffmpeg)")
+    parser.add_argument("--summary", help="把 JSON 汇总写入该文件")
+    parser.add_argument("--json", action="store_true", help="在标准输出打印 JSON 汇总 (日志改为输出到标准错误)")
+    parser.add_argument("--quiet", action="store_true", help="只输出每个任务的结束信息")
+    parser.add_argument("--dry-run", action="store_true", help="只打印将要执行的命令")
+    args = parser.parse_args()
+
+    manifest_path = os.path.abspath(args.manifest)
+    try:
+        manifest = load_manifest(manifest_path)
+        jobs = expand_manifest(manifest, os.path.dirname(manifest_path), args.python)
+    except (OSError, ValueError) as e:
+        print(f"无法读取清单 {args.manifest}: {e}", file=sys.stderr)
+        return 2
+
+    log_stream = sys.stderr if args.json else sys.stdout
+    telemetry = None if args.no_telemetry else TelemetryStore()
+    if telemetry is not None:
+        expected_total = estimate_jobs(jobs, telemetry)
+    if args.dry_run:
+        cache = None if args.no_cache else RenderCache()
+        for job in jobs:
+            print(f"[{job['id']}] {job['name']}: {' '.join(job['command'])}", file=log_stream)
+            if cache is not None and cache.is_fresh(job["command"]):
+                print("    场景未改变，将直接复用渲染缓存", file=log_stream)
+            elif telemetry is not None:
+                print(f"    预计耗时: {format_expected(job['expected'])}", file=log_stream)
+            estimate = estimate_command(job["command"])
+            if estimate:
+                print(f"    静态估计: {format_cost(*estimate)}", file=log_stream)
+        if telemetry is not None:
+            print(f"有历史记录的任务合计约 {expected_total:.1f}s (未计并行)", file=log_stream)
+        return 0
+    if telemetry is not None and not args.quiet:
+        for job in jobs:
+            print(f"[{job['name']}] 预计耗时: {format_expected(job['expected'])}", file=log_stream)
+
+    def log(event):
+        if isinstance(event, AnimationProgress): # 无界面运行时不输出进度条刷新
+            return
+        if args.quiet and not isinstance(event, RenderFinished):
+            return
+        text = format_event(event)
+        if text:
+            log_stream.write(text if text.endswith("\n") else text + "\n")
+            log_stream.flush()
+
+    summary = run_batch(
+        jobs,
+        max_workers=args.max_workers or manifest.get("max_workers"),
+        cache=None if args.no_cache else RenderCache(),
+        chunked=args.chunked,
+        timeout=args.timeout,
+        fail_fast=args.fail_fast,
+        state_path=args.state or f"{manifest_path}.state.json",
+        resume=args.resume,
+        log=log,
+        telemetry=telemetry,
+        static_fast_path=not args.no_static_fast_path,
+        tex_cache_dir=None if args.no_tex_cache else get_default_tex_cache_dir(),
+        precompile_tex=not args.no_tex_precompile,
+    )
+    summary["manifest"] = manifest_path
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    if args.json:
+        json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    print(f"完成: 成功 {summary['succeeded']}，失败 {summary['failed']}，取消 {summary['cancelled']}，"
+          f"跳过 {summary['skipped']} (共 {summary['total']}，耗时 {summary['duration']:.1f}s)", file=log_stream)
+    if summary["interrupted"]:
+        return 130
+    return 0 if summary["ok"] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# benchmarks/bench_driver.py - 在渲染进程内分阶段计时的 manim 入口
+#
+# 由 render_bench.py 使用目标 Python 解释器启动 (只依赖标准库和 manim):
+#     python bench_driver.py --launch-time 1700000000.0 --timings out.json --seed 0 -- -ql scene.py MyScene
+#
+# 导入 manim 之后替换以下方法以统计各阶段耗时 (只统计最外层调用):
+#   Scene.render                         -> scene       场景总耗时 (setup + construct + 收尾)
+#   CairoRenderer.update_frame/get_frame -> frames      绘制帧像素
+#   SceneFileWriter.write_frame/...      -> encode      把帧交给编码器、关闭分段文件和拼接输出
+# construct 阶段为 scene - frames - encode，即场景本身的计算 (创建对象、插值、LaTeX 等)。
+
+import argparse
+import json
+import random
+import sys
+import time
+
+_totals = {}
+_depth = {}
+
+def _timed(category, function):
+    """包装 function，把最外层调用的耗时累加到 category。"""
+    def wrapper(*args, **kwargs):
+        depth = _depth.get(category, 0)
+        _depth[category] = depth + 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _depth[category] = depth
+            if depth == 0:
+                _totals[category] = _totals.get(category, 0.0) + time.perf_counter() - start
+    wrapper.__wrapped__ = function
+    return wrapper
+
+def _patch(owner, names, category, missing):
+    for name in names:
+        if hasattr(owner, name):
+            setattr(owner, name, _timed(category, getattr(owner, name)))
+        else:
+            missing.append(f"{owner.__name__}.{name}")
+
+def _seed_everything(seed):
+    """固定 random 和 numpy 的随机种子，保证每次渲染的内容一致。"""
+    random.seed(seed)
+    try:
+        import numpy as np
+        np.random.seed(seed)
+    except ImportError:
+        pass
+
+def _peak_rss_bytes():
+    """当前进程的峰值 RSS (字节)；不支持时返回 None。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Linux 上单位为 KiB
+
+def main():
+    parser = argparse.ArgumentParser(description="分阶段计时的 manim 渲染入口")
+    parser.add_argument("--launch-time", type=float, required=True, help="父进程启动本进程时的 time.time()")
+    parser.add_argument("--timings", required=True, help="计时结果 JSON 文件")
+    parser.add_argument("--seed", type=int, default=0, help="random / numpy 随机种子")
+    argv = sys.argv[1:]
+    manim_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+
+    driver_start = time.time()
+    result = {"interpreter": driver_start - args.launch_time, "missing_hooks": []}
+    code = 1
+    try:
+        import_start = time.perf_counter()
+        import manim
+        from manim.__main__ import main as manim_main
+        from manim.scene.scene import Scene
+        from manim.renderer.cairo_renderer import CairoRenderer
+        from manim.scene.scene_file_writer import SceneFileWriter
+        result["import"] = time.perf_counter() - import_start
+        result["manim_version"] = getattr(manim, "__version__", "unknown")
+
+        missing = result["missing_hooks"]
+        _patch(Scene, ["render"], "scene", missing)
+        _patch(CairoRenderer, ["update_frame", "get_frame"], "frames", missing)
+        _patch(SceneFileWriter, ["write_frame", "close_partial_movie_stream", "combine_to_movie",
+                                 "combine_to_section_videos", "save_final_image"], "encode", missing)
+        # 每个场景开始前重新固定随机种子；渲染前先固定一次，脚本模块导入时的随机数也保持一致
+        render = Scene.render
+        def seeded_render(self, *render_args, **render_kwargs):
+            if "scene_start" not in result:
+                result["scene_start"] = time.time() - args.launch_time
+            _seed_everything(args.seed)
+            return render(self, *render_args, **render_kwargs)
+        Scene.render = seeded_render
+        _seed_everything(args.seed)
+
+        sys.argv = ["manim"] + manim_args
+        try:
+            manim_main.main(args=manim_args, prog_name="manim", standalone_mode=True)
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        scene = _totals.get("scene", 0.0)
+        frames = _totals.get("frames", 0.0)
+        encode = _totals.get("encode", 0.0)
+        result.update(
+            return_code=code,
+            scene=scene,
+            frames=frames,
+            encode=encode,
+            construct=max(0.0, scene - frames - encode),
+            process=time.time() - args.launch_time,
+            peak_rss_self_bytes=_peak_rss_bytes(),
+        )
+        with open(args.timings, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main())
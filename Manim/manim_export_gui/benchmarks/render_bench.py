@@ -0,0 +1,193 @@
+# benchmarks/render_bench.py - 示例场景的分阶段渲染基准
+#
+# 用法 (在 manim_export_gui 目录下运行):
+#     python benchmarks/render_bench.py --json bench.json                      # 渲染全部示例场景和质量
+#     python benchmarks/render_bench.py --qualities low --runs 3 --baseline bench.json  # 与基线对比
+#
+# 默认以 -ql、-qm、-qh 渲染 UncertaintyIllustration、TimeSeriesExamples8x9 和 PanelData3D，
+# 每次渲染通过 bench_driver.py 在渲染进程内分别统计:
+#   startup   解释器启动、导入 manim 和解析命令行/脚本 (到第一个场景开始)
+#   construct 场景本身的计算 (创建对象、插值、LaTeX 等)
+#   frames    绘制帧像素
+#   encode    编码帧、拼接分段视频
+# 以及渲染进程树 (包括 ffmpeg、latex 子进程) 的峰值内存。
+# 使用 --disable_caching 和临时输出目录，随机种子固定，各次结果可直接比较。
+# 有 --baseline 时，任一指标比基线慢 (或内存增加) 超过阈值即视为回归，退出代码为 1。
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+gui_dir = os.path.dirname(script_dir)
+if gui_dir not in sys.path:
+    sys.path.insert(0, gui_dir)
+
+from core.command_builder import normalize_quality
+from core.manim_runner import _run_process
+from core.render_events import ProcessStarted
+from core.telemetry import ProcessTreeSampler
+
+DRIVER_PATH = os.path.join(script_dir, "bench_driver.py")
+EXAMPLES_DIR = os.path.dirname(gui_dir)
+# (脚本, 场景) 默认基准场景
+DEFAULT_SCENES = [
+    ("topic02_future_uncertainty.py", "UncertaintyIllustration"),
+    ("topic02_timeseries_examples.py", "TimeSeriesExamples8x9"),
+    ("topic03_panal_data_.py", "PanelData3D"),
+]
+DEFAULT_QUALITIES = ["-ql", "-qm", "-qh"]
+TIME_METRICS = ("startup", "construct", "frames", "encode", "total")
+MEMORY_METRIC = "peak_rss_bytes"
+# 对比基线时忽略的微小差异
+MIN_TIME_DELTA = 0.05                  # 秒
+MIN_MEMORY_DELTA = 16 * 1024 ** 2      # 字节
+
+def bench_once(python_path, script, scene, quality, seed, quiet):
+    """渲染一次，返回各阶段耗时 (秒) 和峰值内存 (字节)。
+
+    Raises:
+        RuntimeError: 渲染失败。
+    """
+    with tempfile.TemporaryDirectory(prefix="manim_bench_") as tmp_dir:
+        timings_path = os.path.join(tmp_dir, "timings.json")
+        manim_args = ["--media_dir", os.path.join(tmp_dir, "media"), "--disable_caching", quality, script, scene]
+        sampler = ProcessTreeSampler()
+
+        def callback(event):
+            if isinstance(event, ProcessStarted):
+                sampler.add(event.pid)
+            elif not quiet:
+                print(event.text, end='')
+
+        command = [python_path, DRIVER_PATH, "--launch-time", repr(time.time()), "--timings", timings_path,
+                   "--seed", str(seed), "--"] + manim_args
+        start = time.perf_counter()
+        try:
+            code = _run_process(command, callback)
+        finally:
+            sampler.stop()
+        total = time.perf_counter() - start
+        try:
+            with open(timings_path, "r", encoding="utf-8") as f:
+                timings = json.load(f)
+        except (OSError, ValueError):
+            timings = None
+    if code != 0 or timings is None or timings.get("return_code") != 0:
+        raise RuntimeError(f"{scene} {quality} 渲染失败，返回代码: {code}")
+    if timings.get("missing_hooks"):
+        print(f"警告: 当前 manim 版本缺少计时挂钩 {', '.join(timings['missing_hooks'])}，对应阶段计入 construct")
+    return {
+        "startup": timings.get("scene_start", timings["process"]),
+        "construct": timings["construct"],
+        "frames": timings["frames"],
+        "encode": timings["encode"],
+        "total": total,
+        "peak_rss_bytes": sampler.peak_rss_bytes or timings.get("peak_rss_self_bytes"),
+        "import": timings.get("import"),
+        "manim_version": timings.get("manim_version"),
+    }
+
+def bench_case(python_path, script, scene, quality, runs, seed, quiet):
+    """重复渲染 runs 次，返回各指标的中位数和全部样本。"""
+    samples = [bench_once(python_path, script, scene, quality, seed, quiet) for _ in range(runs)]
+    result = {"runs": runs, "samples": samples}
+    for metric in TIME_METRICS + (MEMORY_METRIC, "import"):
+        values = [sample[metric] for sample in samples if sample.get(metric) is not None]
+        result[metric] = statistics.median(values) if values else None
+    result["manim_version"] = samples[-1].get("manim_version")
+    return result
+
+def compare(results, baseline, tolerance):
+    """与基线逐项对比，返回回归列表 [(用例, 指标, 基线值, 当前值)]。"""
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get("results", {}).get(case)
+        if not previous:
+            continue
+        for metric in TIME_METRICS + (MEMORY_METRIC,):
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            min_delta = MIN_MEMORY_DELTA if metric == MEMORY_METRIC else MIN_TIME_DELTA
+            if new > old * (1 + tolerance) and new - old > min_delta:
+                regressions.append((case, metric, old, new))
+    return regressions
+
+def _format_value(metric, value):
+    if value is None:
+        return "-"
+    if metric == MEMORY_METRIC:
+        return f"{value / 1024 ** 2:.0f}MiB"
+    return f"{value:.2f}s"
+
+def main():
+    parser = argparse.ArgumentParser(description="示例场景的分阶段渲染基准")
+    parser.add_argument("--python", default=sys.executable, help="用于渲染的 Python 解释器")
+    parser.add_argument("--scene", action="append", metavar="脚本:场景",
+                        help="只测试指定场景 (可重复)，默认为三个示例场景")
+    parser.add_argument("--qualities", nargs="+", type=normalize_quality, default=DEFAULT_QUALITIES,
+                        help="渲染质量，例如 low medium high 或 ql qh (默认 -ql -qm -qh)")
+    parser.add_argument("--runs", type=int, default=1, help="每个用例的重复次数 (取中位数)")
+    parser.add_argument("--seed", type=int, default=0, help="random / numpy 随机种子")
+    parser.add_argument("--json", dest="json_path", help="把结果写入该 JSON 文件 (可作为之后的基线)")
+    parser.add_argument("--baseline", help="与该 JSON 结果对比，出现回归时退出代码为 1")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="判定回归的相对阈值 (默认 0.10)")
+    parser.add_argument("--verbose", action="store_true", help="显示 manim 输出")
+    args = parser.parse_args()
+
+    cases = DEFAULT_SCENES
+    if args.scene:
+        cases = [tuple(item.rsplit(":", 1)) for item in args.scene]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    header = f"{'用例':<36}" + "".join(f"{metric:>11}" for metric in TIME_METRICS + ("peak_rss",))
+    print(header)
+    for script, scene in cases:
+        script_path = os.path.abspath(os.path.join(EXAMPLES_DIR, script))
+        for quality in args.qualities:
+            case = f"{scene}{quality}"
+            try:
+                results[case] = bench_case(args.python, script_path, scene, quality, args.runs, args.seed,
+                                           not args.verbose)
+            except RuntimeError as e:
+                print(f"{case:<36} 失败: {e}")
+                continue
+            print(f"{case:<36}" + "".join(f"{_format_value(metric, results[case][metric]):>11}"
+                                          for metric in TIME_METRICS + (MEMORY_METRIC,)))
+
+    output = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": args.python,
+        "platform": platform.platform(),
+        "manim_version": next((item["manim_version"] for item in results.values()), None),
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+
+    if baseline is None:
+        return 0 if len(results) == len(cases) * len(args.qualities) else 1
+    if baseline.get("manim_version") != output["manim_version"]:
+        print(f"manim 版本: {baseline.get('manim_version')} -> {output['manim_version']}")
+    regressions = compare(results, baseline, args.tolerance)
+    for case, metric, old, new in regressions:
+        print(f"回归: {case} {metric} {_format_value(metric, old)} -> {_format_value(metric, new)}"
+              f" (+{(new / old - 1) * 100:.0f}%)")
+    if not regressions:
+        print(f"与基线相比没有超过 {args.tolerance * 100:.0f}% 的回归。")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
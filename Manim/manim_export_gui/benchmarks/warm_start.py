@@ -0,0 +1,116 @@
+# benchmarks/warm_start.py - 冷启动与预热进程的单任务耗时对比
+#
+# 用法 (在 manim_export_gui 目录下运行):
+#     python benchmarks/warm_start.py ../topic02_future_uncertainty.py UncertaintyIllustration -- -ql -s
+#
+# 冷启动: 每次渲染都执行一次 [python, -m, manim, ...] (与 GUI 默认路径相同)。
+# 预热:   先启动 WarmWorkerPool 并等待其导入 manim，再逐个提交相同的渲染任务。
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+gui_dir = os.path.dirname(script_dir)
+if gui_dir not in sys.path:
+    sys.path.insert(0, gui_dir)
+
+from core.manim_runner import _run_process, WarmWorkerPool
+
+def _summarize(times):
+    """返回一组耗时的统计信息。"""
+    return {
+        "runs": len(times),
+        "mean": statistics.mean(times) if times else None,
+        "median": statistics.median(times) if times else None,
+        "min": min(times) if times else None,
+        "max": max(times) if times else None,
+        "samples": times,
+    }
+
+def bench_cold(python_path, manim_args, runs, quiet):
+    """以独立子进程方式重复渲染，返回每次的耗时列表。"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        code = _run_process([python_path, "-m", "manim"] + manim_args, _make_callback(quiet))
+        times.append(time.perf_counter() - start)
+        if code != 0:
+            raise RuntimeError(f"冷启动渲染失败，返回代码: {code}")
+    return times
+
+def bench_warm(python_path, manim_args, runs, quiet):
+    """以预热进程方式重复渲染，返回 (预热耗时, 每次的耗时列表)。"""
+    pool = WarmWorkerPool(python_path, max_children=1)
+    start = time.perf_counter()
+    pool.start()
+    if not pool.wait_ready(timeout=300):
+        pool.close()
+        raise RuntimeError("预热进程启动失败")
+    warmup = time.perf_counter() - start
+    times = []
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            code = pool.run(manim_args, _make_callback(quiet))
+            times.append(time.perf_counter() - start)
+            if code != 0:
+                raise RuntimeError(f"预热进程渲染失败，返回代码: {code}")
+    finally:
+        pool.close()
+    return warmup, times
+
+def _make_callback(quiet):
+    if quiet:
+        return lambda event: None
+    return lambda event: print(event.text, end='')
+
+def main():
+    parser = argparse.ArgumentParser(description="对比冷启动与预热进程的单任务渲染耗时")
+    parser.add_argument("script", help="Manim 脚本路径")
+    parser.add_argument("scene", help="场景名称")
+    parser.add_argument("--python", default=sys.executable, help="用于渲染的 Python 解释器")
+    parser.add_argument("--runs", type=int, default=5, help="每种模式的重复次数")
+    parser.add_argument("--json", dest="json_path", help="把结果写入该 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="显示 manim 输出")
+    # "--" 之后的参数原样传给 manim (默认 -ql)
+    argv = sys.argv[1:]
+    extra_args = []
+    if "--" in argv:
+        extra_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    args = parser.parse_args(argv)
+
+    if not WarmWorkerPool.is_supported():
+        print("当前平台不支持 fork-server 模式。")
+        return 1
+
+    manim_args = (extra_args or ["-ql"]) + [os.path.abspath(args.script), args.scene]
+    quiet = not args.verbose
+
+    cold = bench_cold(args.python, manim_args, args.runs, quiet)
+    warmup, warm = bench_warm(args.python, manim_args, args.runs, quiet)
+
+    result = {
+        "python": args.python,
+        "manim_args": manim_args,
+        "cold": _summarize(cold),
+        "warm": _summarize(warm),
+        "warm_startup_seconds": warmup,
+    }
+    print(f"冷启动  每任务: 平均 {result['cold']['mean']:.3f}s, 中位数 {result['cold']['median']:.3f}s")
+    print(f"预热进程 每任务: 平均 {result['warm']['mean']:.3f}s, 中位数 {result['warm']['median']:.3f}s"
+          f" (一次性预热 {warmup:.3f}s)")
+    if result["warm"]["mean"]:
+        print(f"加速比: {result['cold']['mean'] / result['warm']['mean']:.2f}x")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
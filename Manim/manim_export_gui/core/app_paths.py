@@ -0,0 +1,23 @@
+# core/app_paths.py
+
+import os
+import sys
+
+APP_NAME = "manim_export_gui"
+
+def get_app_cache_dir(*subdirs):
+    """返回应用在用户缓存目录下的子目录路径 (不会自动创建)。
+
+    Windows 使用 %LOCALAPPDATA%，其他平台使用 $XDG_CACHE_HOME 或 ~/.cache。
+
+    Args:
+        *subdirs (str): 追加在应用缓存目录之后的子目录。
+
+    Returns:
+        str: 目录路径。
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, APP_NAME, *subdirs)
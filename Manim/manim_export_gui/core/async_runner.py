@@ -0,0 +1,315 @@
+# core/async_runner.py
+
+import abc
+import asyncio
+import codecs
+import time
+
+try:
+    from core.manim_runner import (OutputSplitter, OUTPUT_INTERVAL, READ_CHUNK_SIZE, _child_env,
+                                   _get_startupinfo, get_default_max_workers, static_fast_path_command)
+    from core.file_opener import apply_preview
+    from core.render_cache import find_scene_outputs
+    from core.render_events import (LogLine, FileReady, ProcessStarted, RenderFinished, RenderEventParser,
+                                    tag_job)
+    from core.render_job import RenderResult, process_group_kwargs, kill_process_tree
+    from core.tex_cache import wrap_command
+except ImportError:
+    from manim_runner import (OutputSplitter, OUTPUT_INTERVAL, READ_CHUNK_SIZE, _child_env,
+                              _get_startupinfo, get_default_max_workers, static_fast_path_command)
+    from file_opener import apply_preview
+    from render_cache import find_scene_outputs
+    from render_events import (LogLine, FileReady, ProcessStarted, RenderFinished, RenderEventParser,
+                               tag_job)
+    from render_job import RenderResult, process_group_kwargs, kill_process_tree
+    from tex_cache import wrap_command
+
+_END = object() # 事件流结束标记
+
+class _AsyncEventStream(abc.ABC):
+    """异步事件流：可用 async for 逐个取出事件，也可 await 取得最终的 RenderResult。
+
+    必须在运行中的事件循环内创建；创建时即开始执行。
+    """
+
+    def __init__(self, event_callback=None, timeout=None):
+        self.event_callback = event_callback
+        self.cancelled = False
+        self.timed_out = False
+        self._queue = asyncio.Queue() if event_callback is None else None
+        self._output_files = []
+        self._start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(timeout, self._expire) if timeout else None
+        self._task = loop.create_task(self._main())
+
+    async def _main(self):
+        return_code, job_results = None, {}
+        try:
+            return_code, job_results = await self._run()
+        finally:
+            if self._timer is not None:
+                self._timer.cancel()
+            if self._queue is not None:
+                self._queue.put_nowait(_END)
+        return RenderResult(
+            return_code=return_code,
+            duration=time.monotonic() - self._start,
+            cancelled=self.cancelled,
+            timed_out=self.timed_out,
+            output_files=list(self._output_files),
+            job_results=job_results,
+        )
+
+    @abc.abstractmethod
+    async def _run(self):
+        """执行任务，返回 (返回代码, {任务名称: 返回代码})。"""
+
+    def _emit(self, event):
+        if isinstance(event, FileReady):
+            self._output_files.append(event.path)
+        if self.event_callback is not None:
+            self.event_callback(event)
+        else:
+            self._queue.put_nowait(event)
+
+    def _expire(self):
+        self.timed_out = True
+        self.cancel()
+
+    @abc.abstractmethod
+    def cancel(self):
+        """终止正在运行的渲染进程。"""
+
+    def done(self):
+        """是否已结束。"""
+        return self._task.done()
+
+    def __aiter__(self):
+        if self._queue is None:
+            raise TypeError("提供了 event_callback 时事件不会进入异步迭代器")
+        return self
+
+    async def __anext__(self):
+        event = await self._queue.get()
+        if event is _END:
+            self._queue.put_nowait(_END) # 允许重复迭代到结束
+            raise StopAsyncIteration
+        return event
+
+    def __await__(self):
+        return self._task.__await__()
+
+class AsyncRender(_AsyncEventStream):
+    """用 asyncio 子进程执行一个 Manim 命令，行为与 manim_runner.run_manim_jobs 中的单个任务一致
+    (渲染缓存、渲染记录、共享 LaTeX 缓存和静态场景快速路径)。
+
+    用法:
+        render = AsyncRender([python, "-m", "manim", "-ql", "scene.py", "MyScene"])
+        async for event in render:
+            ...
+        result = await render
+
+    子进程在独立的进程组中运行，cancel() 或超时时连同 ffmpeg、latex 子进程一起终止。
+    """
+
+    def __init__(self, command_list, cache=None, timeout=None, event_callback=None, telemetry=None,
+                 tex_cache_dir=None, static_fast_path=False):
+        """
+        Args:
+            command_list (list[str]): 要执行的命令列表。
+            cache (RenderCache | None): 提供时，未改变的单场景渲染直接复用缓存的输出文件。
+            timeout (float | None): 墙钟超时 (秒)。
+            event_callback (callable | None): 提供时事件交给该函数 (在事件循环线程中调用)，
+                不再进入异步迭代器。
+            telemetry (TelemetryStore | None): 提供时把耗时和资源占用写入渲染记录。
+            tex_cache_dir (str | None): 提供时通过 tex_cache_launcher 启动，使用共享的 LaTeX / Text 缓存。
+            static_fast_path (bool): 为 True 时从不播放动画的场景直接导出单帧 PNG。
+        """
+        still_command = static_fast_path_command(command_list) if static_fast_path else None
+        self.command_list = still_command or list(command_list)
+        self.still = still_command is not None
+        self.cache = cache
+        self.tex_cache_dir = tex_cache_dir
+        self._process = None
+        self._recorder = None
+        if telemetry is not None:
+            self._recorder = telemetry.track(self.command_list, lambda event: _AsyncEventStream._emit(self, event))
+        super().__init__(event_callback, timeout)
+
+    def _emit(self, event):
+        if self._recorder is not None:
+            self._recorder(event)
+        else:
+            super()._emit(event)
+
+    def cancel(self):
+        """终止渲染进程组；尚未启动时不再启动。"""
+        self.cancelled = True
+        if self._process is not None:
+            kill_process_tree(self._process)
+
+    async def _run(self):
+        if self.still:
+            self._emit(LogLine("--- 静态场景 (没有 play / wait)：快速路径，直接导出单帧 PNG，跳过视频编码 ---\n"))
+        described = None
+        if self.cache is not None:
+            try:
+                described = await asyncio.to_thread(self.cache.describe, self.command_list)
+            except OSError as e:
+                self._emit(LogLine(f"计算渲染缓存键时出错，跳过缓存: {e}\n"))
+        if described is not None:
+            key, info = described
+            hit = await asyncio.to_thread(self.cache.lookup, key, info["media_dir"])
+            if hit:
+                self._emit(LogLine("--- 命中渲染缓存，跳过渲染 ---\n"))
+                for path in hit:
+                    self._emit(LogLine(f"File ready at '{path}'\n"))
+                    self._emit(FileReady(path))
+                apply_preview(self.command_list, hit)
+                self._emit(RenderFinished(0, 0.0, cached=True))
+                return 0, {}
+
+        start = time.time()
+        return_code = await self._run_process()
+        if described is not None and return_code == 0:
+            scene = info["scenes"][0]
+            outputs = await asyncio.to_thread(find_scene_outputs, info["media_dir"], scene, start)
+            if outputs:
+                await asyncio.to_thread(self.cache.store, key, info["media_dir"], outputs,
+                                        info["script"], scene)
+        return return_code, {}
+
+    async def _run_process(self):
+        start = time.monotonic()
+        return_code = None
+        if self.cancelled:
+            self._emit(RenderFinished(None, 0.0, cancelled=True))
+            return None
+        try:
+            command = wrap_command(self.command_list, self.tex_cache_dir) if self.tex_cache_dir else self.command_list
+            self._process = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                env=_child_env(),
+                startupinfo=_get_startupinfo(),
+                **process_group_kwargs()
+            )
+            self._emit(ProcessStarted(self._process.pid))
+            if self.cancelled: # 启动期间被取消
+                kill_process_tree(self._process)
+            parser = RenderEventParser(self._emit)
+            splitter = OutputSplitter(parser.feed)
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            while True:
+                try:
+                    data = await asyncio.wait_for(self._process.stdout.read(READ_CHUNK_SIZE), OUTPUT_INTERVAL)
+                except asyncio.TimeoutError:
+                    splitter.flush() # 没有新数据时也按时回传积累的内容
+                    continue
+                if not data:
+                    break
+                splitter.feed(decoder.decode(data))
+            splitter.feed(decoder.decode(b"", final=True))
+            splitter.close()
+            parser.close()
+            return_code = await self._process.wait()
+        except asyncio.CancelledError:
+            # 外部取消了 asyncio 任务：不留下孤儿渲染进程
+            self.cancel()
+            raise
+        except FileNotFoundError:
+            self._emit(LogLine("错误：找不到 'manim' 命令。请确保 Manim 已正确安装并添加到系统 PATH。\n"))
+        except Exception as e:
+            self._emit(LogLine(f"执行 Manim 命令时出错: {e}\n"))
+        self._emit(RenderFinished(return_code, time.monotonic() - start, cancelled=self.cancelled))
+        return return_code
+
+class AsyncRenderBatch(_AsyncEventStream):
+    """在一个事件循环中并发执行多个渲染任务 (每个渲染进程不再占用一个线程)。
+
+    行为与 manim_runner.run_manim_jobs 一致：有多个任务时事件的 job 属性为任务名称，
+    结束时回传一行汇总信息；await 得到的 RenderResult.job_results 为
+    {任务名称: 返回代码}，results 属性为 {任务名称: RenderResult}。
+    """
+
+    def __init__(self, jobs, max_workers=None, cache=None, timeout=None, event_callback=None, telemetry=None,
+                 tex_cache_dir=None, static_fast_path=False):
+        """
+        Args:
+            jobs (list[tuple[str, list[str]]]): (任务名称, 命令列表) 元组的列表。
+            max_workers (int | None): 同时运行的渲染进程上限，默认为 CPU 核心数。
+            cache (RenderCache | None): 渲染缓存。
+            timeout (float | None): 全部任务的墙钟超时 (秒)。
+            event_callback (callable | None): 见 AsyncRender。
+            telemetry、tex_cache_dir、static_fast_path: 传给每个 AsyncRender。
+        """
+        self.jobs = list(jobs)
+        self.max_workers = max_workers or get_default_max_workers(len(self.jobs))
+        self.cache = cache
+        self.render_options = {"telemetry": telemetry, "tex_cache_dir": tex_cache_dir,
+                               "static_fast_path": static_fast_path}
+        self.results = {}
+        self._renders = {}
+        super().__init__(event_callback, timeout)
+
+    def cancel(self):
+        """取消所有正在运行和排队中的任务。"""
+        self.cancelled = True
+        for render in list(self._renders.values()):
+            render.cancel()
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.max_workers)
+        multiple = len(self.jobs) > 1
+        if multiple:
+            self._emit(LogLine(f"--- 并行渲染 {len(self.jobs)} 个任务，并发数: {self.max_workers} ---\n"))
+
+        async def run_job(job_name, command_list):
+            def job_callback(event):
+                self._emit(tag_job(event, job_name) if multiple else event)
+
+            async with semaphore:
+                if self.cancelled:
+                    job_callback(RenderFinished(None, 0.0, cancelled=True))
+                    return job_name, RenderResult(None, 0.0, cancelled=True)
+                render = AsyncRender(command_list, cache=self.cache, event_callback=job_callback,
+                                     **self.render_options)
+                self._renders[job_name] = render
+                try:
+                    return job_name, await render
+                finally:
+                    self._renders.pop(job_name, None)
+
+        for job_name, result in await asyncio.gather(*(run_job(name, cmd) for name, cmd in self.jobs)):
+            self.results[job_name] = result
+        codes = {name: result.return_code for name, result in self.results.items()}
+        failed = [name for name, code in codes.items() if code != 0]
+        summary = f"\n--- 全部渲染任务结束: 成功 {len(codes) - len(failed)}/{len(self.jobs)}"
+        if failed:
+            summary += f"，失败: {', '.join(failed)}"
+        if self.timed_out:
+            summary += "，已超时"
+        elif self.cancelled:
+            summary += "，已取消"
+        self._emit(LogLine(summary + " ---\n"))
+        return next((codes[name] for name in failed), 0 if codes else None), codes
+
+async def run_manim_async(command_list, cache=None, timeout=None, event_callback=None, **render_options):
+    """执行一个渲染并等待结束，返回 RenderResult (render_options 见 AsyncRender)。"""
+    render = AsyncRender(command_list, cache=cache, timeout=timeout,
+                         event_callback=event_callback or (lambda event: None), **render_options)
+    return await render
+
+# 示例用法
+if __name__ == '__main__':
+    import sys
+
+    async def demo():
+        render = AsyncRender([sys.executable, "-m", "manim", "--help"])
+        async for event in render:
+            print(event.text, end='')
+        print(await render)
+
+    asyncio.run(demo())
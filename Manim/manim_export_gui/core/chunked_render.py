@@ -0,0 +1,179 @@
+# core/chunked_render.py
+
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from core.manim_runner import _run_process, get_default_max_workers
+    from core.render_cache import parse_manim_command, find_scene_outputs
+    from core.ffmpeg_tools import find_ffmpeg, concat_copy
+    from core.file_opener import apply_preview
+    from core.render_events import LogLine, FileReady, ScenePlayed, RenderFinished, tag_job
+except ImportError:
+    from manim_runner import _run_process, get_default_max_workers
+    from render_cache import parse_manim_command, find_scene_outputs
+    from ffmpeg_tools import find_ffmpeg, concat_copy
+    from file_opener import apply_preview
+    from render_events import LogLine, FileReady, ScenePlayed, RenderFinished, tag_job
+
+# 输出不是可拼接视频或已指定动画范围的参数
+_UNCHUNKABLE_FLAGS = {"-s", "--save_last_frame", "-a", "--write_all", "-g", "--save_pngs",
+                      "-n", "--from_animation_number", "--dry_run"}
+# 可以流复制拼接的视频格式
+_CHUNKABLE_FORMATS = {"mp4", "mov", "webm"}
+
+def _is_chunkable(info):
+    """命令是否为可分段的单场景视频渲染。"""
+    if info is None or len(info["scenes"]) != 1 or _UNCHUNKABLE_FLAGS & set(info["flags"]):
+        return False
+    flags = info["flags"]
+    if "--format" in flags:
+        index = flags.index("--format")
+        if index + 1 < len(flags) and flags[index + 1] not in _CHUNKABLE_FORMATS:
+            return False
+    return True
+
+def plan_chunks(animation_count, chunk_count):
+    """把 [0, animation_count) 的动画编号划分为连续的片段。
+
+    Args:
+        animation_count (int): 场景中的动画数量 (self.play / self.wait 调用次数)。
+        chunk_count (int): 期望的片段数量。
+
+    Returns:
+        list[tuple[int, int | None]]: (起始编号, 结束编号) 列表，编号均包含在内；
+            最后一个片段的结束编号为 None，表示一直渲染到场景结束。
+    """
+    chunk_count = max(1, min(chunk_count, animation_count))
+    bounds = [round(i * animation_count / chunk_count) for i in range(chunk_count + 1)]
+    ranges = [(bounds[i], bounds[i + 1] - 1) for i in range(chunk_count)]
+    # manim 把 "-n 0,0" 的结束编号 0 视为未指定，第一个片段至少包含两个动画
+    if len(ranges) > 1 and ranges[0][1] == 0:
+        ranges[1] = (0, ranges[1][1])
+        ranges.pop(0)
+    start, _ = ranges[-1]
+    ranges[-1] = (start, None)
+    return ranges
+
+def count_animations(info, output_callback, run=_run_process, job=None):
+    """以 --dry_run 方式执行一次场景 (不输出任何文件)，返回其动画数量。
+
+    Returns:
+        int | None: 动画数量；无法确定时返回 None。
+    """
+    counted = []
+
+    def collect(event):
+        if isinstance(event, ScenePlayed):
+            counted.append(event.animation_count)
+
+    command = [info["python"], "-m", "manim", "--dry_run"] + info["flags"] \
+        + [info["script"], info["scenes"][0]]
+    return_code = run(command, collect, job=job)
+    if return_code != 0 or not counted:
+        output_callback(LogLine(f"无法通过 --dry_run 确定动画数量 (返回代码: {return_code})。\n"))
+        return None
+    return counted[-1]
+
+def run_chunked_render(command_list, output_callback, max_workers=None, run=_run_process, job=None):
+    """把单个场景按动画编号分段，各段在独立进程中并行渲染后无损拼接。
+
+    每个片段以 manim 的 "-n 起始,结束" 参数渲染到独立的临时 media 目录，
+    被跳过的动画仍会执行以更新场景状态，因此拼接结果与单进程渲染的画面一致。
+    拼接使用 ffmpeg concat 流复制，不重新编码。片段命令不带 -p / -f，
+    这两个参数在拼接完成后作用于最终的视频。命令不适合分段 (多个场景、
+    静帧/GIF 输出、动画数量不足或缺少 ffmpeg) 时退回普通渲染。
+
+    Args:
+        command_list (list[str]): [python, '-m', 'manim', ...] 形式的单场景渲染命令。
+        output_callback (callable): 接收 RenderEvent 的函数。各片段的事件以 "片段 i/K"
+            标记所属任务；片段的 RenderFinished 只作为日志回传，FileReady 不回传，
+            整个场景结束时回传拼接结果的 FileReady 和一个 RenderFinished。
+        max_workers (int | None): 最大片段数 / 并发数，默认为 CPU 核心数。
+        run (callable): 执行单个命令的函数，签名与 _run_process 相同。
+        job (RenderJob | None): 所属任务的句柄；取消时终止所有片段和 ffmpeg 进程。
+
+    Returns:
+        int | None: 返回代码。
+    """
+    info = parse_manim_command(command_list)
+    if not _is_chunkable(info):
+        return run(command_list, output_callback, job=job)
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        output_callback(LogLine("未找到 ffmpeg，无法拼接分段视频，改为单进程渲染。\n"))
+        return run(command_list, output_callback, job=job)
+
+    workers = max_workers or get_default_max_workers()
+    scene = info["scenes"][0]
+    start_time = time.time()
+    output_callback(LogLine(f"--- 分段渲染: 正在统计 {scene} 的动画数量 (--dry_run) ---\n"))
+    animation_count = count_animations(info, output_callback, run=run, job=job)
+    if not animation_count or animation_count < 2 or workers < 2:
+        output_callback(LogLine("动画数量不足或只有一个可用核心，改为单进程渲染。\n"))
+        return run(command_list, output_callback, job=job)
+
+    ranges = plan_chunks(animation_count, workers)
+    if len(ranges) < 2:
+        return run(command_list, output_callback, job=job)
+    chunk_root = os.path.join(info["media_dir"], "chunks", f"{scene}_{os.getpid()}_{int(start_time)}")
+    output_callback(LogLine(f"--- 分段渲染: {animation_count} 个动画，分为 {len(ranges)} 段并行 ---\n"))
+
+    def finish(return_code):
+        output_callback(RenderFinished(return_code, time.time() - start_time,
+                                       cancelled=job is not None and job.cancelled))
+        return return_code
+
+    def render_chunk(index, chunk_range):
+        first, last = chunk_range
+        spec = f"{first},{last}" if last is not None else f"{first}"
+        chunk_dir = os.path.join(chunk_root, f"chunk_{index:03d}")
+        command = [info["python"], "-m", "manim"] + info["flags"] \
+            + ["--media_dir", chunk_dir, "-n", spec, info["script"], scene]
+        chunk_name = f"片段 {index + 1}/{len(ranges)}"
+
+        def chunk_callback(event):
+            if isinstance(event, FileReady):
+                return # 片段文件是临时文件
+            if isinstance(event, RenderFinished):
+                event = LogLine(event.text + "\n")
+            output_callback(tag_job(event, chunk_name))
+
+        return_code = run(command, chunk_callback, job=job)
+        return chunk_dir, return_code
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="manim_chunk") as executor:
+            results = list(executor.map(lambda item: render_chunk(*item), enumerate(ranges)))
+
+        failed = [code for _, code in results if code != 0]
+        if failed:
+            return finish(failed[0])
+
+        # 每个片段的输出在其临时 media 目录中的相对路径与完整渲染时相同
+        chunk_files = []
+        for chunk_dir, _ in results:
+            outputs = [path for path in find_scene_outputs(chunk_dir, scene)
+                       if os.path.splitext(path)[1].lower() in (".mp4", ".mov", ".webm")]
+            if not outputs:
+                output_callback(LogLine(f"在 {chunk_dir} 中找不到片段输出文件。\n"))
+                return finish(1)
+            chunk_files.append(outputs[0])
+
+        final_path = os.path.join(info["media_dir"], os.path.relpath(chunk_files[0], results[0][0]))
+        output_callback(LogLine(f"--- 正在以流复制方式拼接 {len(chunk_files)} 个片段 ---\n"))
+        return_code = concat_copy(chunk_files, final_path, output_callback, ffmpeg=ffmpeg, job=job)
+        if return_code == 0:
+            output_callback(LogLine(f"File ready at '{final_path}'\n"))
+            output_callback(FileReady(final_path))
+            apply_preview(command_list, [final_path])
+            output_callback(LogLine(f"分段渲染总耗时: {time.time() - start_time:.1f}s\n"))
+        return finish(return_code)
+    finally:
+        shutil.rmtree(chunk_root, ignore_errors=True)
+        try:
+            os.rmdir(os.path.dirname(chunk_root)) # 仅在 chunks 目录已空时删除
+        except OSError:
+            pass
@@ -0,0 +1,322 @@
+# core/class_index.py
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from core.app_paths import get_app_cache_dir
+    from core.script_parser import VALID_SCENE_BASE_NAMES, parse_module_summary, is_manim_scene_base
+except ImportError:
+    from app_paths import get_app_cache_dir
+    from script_parser import VALID_SCENE_BASE_NAMES, parse_module_summary, is_manim_scene_base
+
+# 索引文件格式版本，格式改变时旧索引会被丢弃
+INDEX_VERSION = 1
+# 需要重新解析的文件达到该数量时使用进程池并行解析
+PARALLEL_MIN_FILES = 16
+# 扫描时跳过的目录
+SKIP_DIRS = {"__pycache__", "media", "venv", ".venv", "env", "site-packages", "node_modules"}
+
+def get_default_index_path(root, recursive=True):
+    """返回目录 root 的类索引文件路径 (用户缓存目录下，按目录路径和是否包含子目录区分)。"""
+    key = os.path.abspath(root) + ("" if recursive else "|flat")
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return get_app_cache_dir("class_index", f"{digest}.json")
+
+def summarize_file(path):
+    """解析一个脚本，返回其类定义、导入信息以及 mtime_ns、size。
+
+    解析失败时 error 为错误信息，类和导入为空。
+    """
+    stat = os.stat(path)
+    summary = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            summary.update(parse_module_summary(f.read()))
+    except (OSError, SyntaxError, ValueError) as e:
+        summary.update(classes={}, imports={}, star_imports=[], error=str(e))
+    return summary
+
+def iter_python_files(root, recursive=True):
+    """列出 root 下的 .py 文件 (跳过隐藏目录和 SKIP_DIRS)，按路径排序。"""
+    paths = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(name for name in dir_names if not name.startswith(".") and name not in SKIP_DIRS)
+        paths.extend(os.path.join(dir_path, name) for name in file_names if name.endswith(".py"))
+        if not recursive:
+            break
+    return sorted(paths)
+
+def _module_name(rel_path):
+    """把相对路径 "pkg/sub/mod.py" 转换为模块名 "pkg.sub.mod"。"""
+    parts = os.path.splitext(rel_path)[0].replace("\\", "/").split("/")
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts = parts[:-1]
+    return ".".join(parts)
+
+class ClassIndex:
+    """目录中所有脚本的类继承关系索引，用于找出 (间接) 继承 manim 场景基类的类。
+
+    可以解析:
+        from manim import Scene as S       导入别名
+        class A(manim.Scene) / (mn.Scene)   模块限定的基类
+        from card_base import CardScene     来自同一目录其他脚本的基类 (包括 from x import *)
+        from .base import CardScene         包内的相对导入
+
+    索引 (每个文件的 mtime、大小、类及其基类、导入) 保存在用户缓存目录，
+    update() 只重新解析修改过的文件，文件较多时在进程池中并行解析。
+    """
+
+    def __init__(self, root, index_path=None, recursive=True):
+        """
+        Args:
+            root (str): 脚本目录。
+            index_path (str | None): 索引文件路径，默认为 get_default_index_path(root, recursive)。
+            recursive (bool): 是否包含子目录。
+        """
+        self.root = os.path.abspath(root)
+        self.index_path = index_path or get_default_index_path(self.root, recursive)
+        self.recursive = recursive
+        self.files = {}            # {相对路径: summarize_file 的结果}
+        self._modules = {}         # {模块名: 相对路径}
+        self._memo = {}            # {(模块名, 类名): 是否为场景}
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION and data.get("root") == self.root \
+                and data.get("recursive", True) == self.recursive:
+            self.files = data.get("files", {})
+            self._rebuild()
+
+    def save(self):
+        """原子地写入索引文件。"""
+        with self._lock:
+            data = {"version": INDEX_VERSION, "root": self.root, "recursive": self.recursive, "files": self.files}
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.index_path)
+            except OSError as e:
+                print(f"保存类索引时出错: {e}")
+
+    def _rebuild(self):
+        self._modules = {_module_name(rel_path): rel_path for rel_path in self.files}
+        self._memo = {}
+
+    def _rel(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def _is_current(self, rel_path, path):
+        summary = self.files.get(rel_path)
+        if summary is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return (summary["mtime_ns"], summary["size"]) == (stat.st_mtime_ns, stat.st_size)
+
+    def update(self, paths=None):
+        """扫描目录，重新解析新增和修改过的文件并删除已不存在的文件，有变化时保存索引。
+
+        Args:
+            paths (list[str] | None): 当前的脚本列表，默认扫描 root。
+
+        Returns:
+            list[str]: 重新解析的文件 (绝对路径)。
+        """
+        paths = iter_python_files(self.root, self.recursive) if paths is None else list(paths)
+        with self._lock:
+            current = {self._rel(path): path for path in paths}
+            stale = [path for rel_path, path in current.items() if not self._is_current(rel_path, path)]
+            removed = [rel_path for rel_path in self.files if rel_path not in current]
+        summaries = self._summarize(stale)
+        with self._lock:
+            for rel_path in removed:
+                del self.files[rel_path]
+            for path, summary in summaries.items():
+                self.files[self._rel(path)] = summary
+            if stale or removed:
+                self._rebuild()
+                self.save()
+        return stale
+
+    def _summarize(self, paths):
+        """解析多个文件，返回 {路径: 摘要}；无法读取的文件不包含在结果中。
+
+        文件数达到 PARALLEL_MIN_FILES 时在进程池中解析 (ast 解析受 GIL 限制，线程无法并行)，
+        进程池无法启动时退回逐个解析。
+        """
+        summaries = {}
+        if len(paths) >= PARALLEL_MIN_FILES:
+            try:
+                workers = min(len(paths), os.cpu_count() or 1)
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = {path: executor.submit(summarize_file, path) for path in paths}
+                    for path, future in futures.items():
+                        try:
+                            summaries[path] = future.result()
+                        except OSError:
+                            pass
+                return summaries
+            except (BrokenProcessPool, OSError, RuntimeError) as e:
+                print(f"并行解析失败，改为逐个解析: {e}")
+                summaries = {}
+        for path in paths:
+            try:
+                summaries[path] = summarize_file(path)
+            except OSError:
+                pass
+        return summaries
+
+    def update_file(self, path):
+        """单个文件改变 (或被删除) 后更新索引。"""
+        rel_path = self._rel(path)
+        with self._lock:
+            if os.path.isfile(path):
+                if self._is_current(rel_path, path):
+                    return
+                self.files[rel_path] = summarize_file(path)
+            elif self.files.pop(rel_path, None) is None:
+                return
+            self._rebuild()
+            self.save()
+
+    def _find_module(self, name, from_module):
+        """把导入的模块名解析为索引中的模块名；不是本目录中的模块时返回 None。"""
+        if name.startswith("."):
+            level = len(name) - len(name.lstrip("."))
+            package = from_module.split(".")[:-level]
+            candidates = [".".join(package + ([name.lstrip(".")] if name.lstrip(".") else []))]
+        else:
+            # manim 运行脚本时脚本所在目录在 sys.path 中，优先匹配同目录的模块
+            package = from_module.split(".")[:-1]
+            candidates = [".".join(package + [name]), name] if package else [name]
+        return next((candidate for candidate in candidates if candidate in self._modules), None)
+
+    def _name_is_scene(self, module, name, seen):
+        """模块 module 中的名称 name (类、导入的名称或基类名) 是否为场景类或场景基类。"""
+        summary = self.files[self._modules[module]]
+        head, _, rest = name.partition(".")
+        if head in summary["imports"]:
+            return self._target_is_scene(module, summary["imports"][head] + ("." + rest if rest else ""), seen)
+        if not rest and head in VALID_SCENE_BASE_NAMES:
+            return True
+        if not rest and head in summary["classes"]:
+            return self._class_is_scene(module, head, seen)
+        if not rest:
+            for star_module in summary["star_imports"]:
+                found = self._find_module(star_module, module)
+                if found and found != module and self._defines(found, head):
+                    return self._name_is_scene(found, head, seen)
+            return False
+        return self._target_is_scene(module, name, seen)
+
+    def _defines(self, module, name):
+        summary = self.files[self._modules[module]]
+        return name in summary["classes"] or name in summary["imports"]
+
+    def _target_is_scene(self, module, target, seen):
+        """导入目标 (例如 "manim.Scene"、"card_base.CardScene"、".base.CardScene") 是否为场景。"""
+        if is_manim_scene_base(target):
+            return True
+        dots = len(target) - len(target.lstrip("."))
+        parts = target.lstrip(".").split(".")
+        for i in range(len(parts) - 1, 0, -1):
+            found = self._find_module("." * dots + ".".join(parts[:i]), module)
+            if found:
+                return i == len(parts) - 1 and self._name_is_scene(found, parts[i], seen)
+        return False
+
+    def _class_is_scene(self, module, name, seen):
+        key = (module, name)
+        if key in self._memo:
+            return self._memo[key]
+        if key in seen: # 避免循环继承
+            return False
+        seen = seen | {key}
+        result = any(self._name_is_scene(module, base, seen)
+                     for base in self.files[self._modules[module]]["classes"][name])
+        self._memo[key] = result
+        return result
+
+    def get_scene_names(self, path):
+        """返回脚本中的场景类名 (按定义顺序)；脚本不在索引中时返回空列表。"""
+        with self._lock:
+            rel_path = self._rel(path)
+            summary = self.files.get(rel_path)
+            if summary is None:
+                return []
+            module = _module_name(rel_path)
+            return [name for name in summary["classes"]
+                    if name not in VALID_SCENE_BASE_NAMES and self._class_is_scene(module, name, frozenset())]
+
+    def scenes(self):
+        """返回 {脚本绝对路径: 场景类名列表}，只包含有场景的脚本。"""
+        with self._lock:
+            result = {}
+            for rel_path in sorted(self.files):
+                path = os.path.join(self.root, rel_path)
+                names = self.get_scene_names(path)
+                if names:
+                    result[path] = names
+            return result
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(root, recursive=False):
+    """返回目录 root 的 ClassIndex (同一进程内复用，首次使用时从索引文件加载)。"""
+    key = (os.path.abspath(root), recursive)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = ClassIndex(root, recursive=recursive)
+        return _indexes[key]
+
+def _covering_index(directory):
+    """返回已加载的、包含 directory 的递归索引 (例如启动时扫描的父目录)；没有时返回 None。"""
+    with _indexes_lock:
+        for (root, recursive), index in _indexes.items():
+            if recursive and (directory == root or directory.startswith(root.rstrip(os.sep) + os.sep)):
+                return index
+    return None
+
+def find_scene_names(script_path):
+    """在类索引中查找脚本的场景 (基类可以来自同目录或同一项目中的其他脚本)。
+
+    脚本位于已加载的递归索引中时只刷新脚本所在目录的文件，否则使用该目录的索引。
+
+    Returns:
+        list[str]: 场景类名列表。
+    """
+    directory = os.path.dirname(os.path.abspath(script_path))
+    index = _covering_index(directory)
+    if index is None:
+        index = get_index(directory)
+        index.update()
+    else:
+        for path in iter_python_files(directory, recursive=False):
+            index.update_file(path)
+        index.update_file(script_path)
+    return index.get_scene_names(script_path)
+
+# 示例用法：python core/class_index.py <脚本目录>
+if __name__ == '__main__':
+    import sys
+    index = ClassIndex(sys.argv[1] if len(sys.argv) > 1 else ".")
+    changed = index.update()
+    print(f"重新解析 {len(changed)} 个文件，索引: {index.index_path}")
+    for script, names in index.scenes().items():
+        print(f"{os.path.relpath(script, index.root)}: {', '.join(names)}")
@@ -0,0 +1,109 @@
+# core/command_builder.py
+
+# 渲染质量名称与 manim 参数的对应关系 (清单文件和命令行中使用)
+QUALITY_FLAGS = {
+    "low": "-ql",
+    "medium": "-qm",
+    "high": "-qh",
+    "production": "-qp",
+    "4k": "-qk",
+}
+# 各质量参数对应的 manim 默认分辨率和帧率: (像素宽度, 像素高度, 帧率)
+QUALITY_PROFILES = {
+    "-ql": (854, 480, 15),
+    "-qm": (1280, 720, 30),
+    "-qh": (1920, 1080, 60),
+    "-qp": (2560, 1440, 60),
+    "-qk": (3840, 2160, 60),
+}
+# 支持的输出格式: mp4 视频、gif 动图、png_last 最后一帧
+OUTPUT_FORMATS = ("mp4", "gif", "png_last")
+# 预览参数: -p 播放, -f 打开文件夹
+PREVIEW_FLAGS = ("-p", "-f")
+
+def normalize_quality(quality):
+    """把质量名称 ("high") 或参数 ("-qh" / "qh" / "h") 转换为 manim 参数。
+
+    Raises:
+        ValueError: 无法识别的质量。
+    """
+    value = str(quality).strip().lower()
+    if value in QUALITY_FLAGS:
+        return QUALITY_FLAGS[value]
+    flag = "-q" + value.lstrip("-").removeprefix("q")
+    if flag in QUALITY_FLAGS.values():
+        return flag
+    raise ValueError(f"无法识别的渲染质量: {quality} (可选: {', '.join(QUALITY_FLAGS)})")
+
+def split_render_qualities(quality_flags):
+    """多质量导出：只渲染其中最高的质量，其余质量由渲染结果缩放得到。
+
+    Args:
+        quality_flags (list[str]): 需要导出的质量参数，例如 ["-ql", "-qh", "-qk"]。
+
+    Returns:
+        tuple[str, list[str]]: (实际渲染的质量, 由其派生的质量列表 (从高到低))。
+    """
+    order = list(QUALITY_FLAGS.values())
+    flags = sorted(set(quality_flags), key=order.index, reverse=True)
+    return flags[0], flags[1:]
+
+def quality_profile(quality_flag, overrides=None):
+    """返回质量参数实际对应的 (像素宽度, 像素高度, 帧率)。
+
+    Args:
+        quality_flag (str): 质量参数，例如 "-qh"。
+        overrides (dict | None): 脚本中模块级的 config 赋值 (见 script_parser.get_config_overrides)，
+            其中的 pixel_width、pixel_height、frame_rate 优先于质量参数。
+    """
+    width, height, frame_rate = QUALITY_PROFILES[quality_flag]
+    overrides = overrides or {}
+    return (overrides.get("pixel_width", width), overrides.get("pixel_height", height),
+            overrides.get("frame_rate", frame_rate))
+
+def quality_dir_name(pixel_height, frame_rate):
+    """manim 视频输出目录中表示质量的部分，例如 "1080p60"。"""
+    return f"{int(pixel_height)}p{frame_rate:g}"
+
+def build_manim_command(python_path, quality_flag="-qh", output_format="mp4", transparent=False,
+                        preview_flag=None, media_dir=None):
+    """构建脚本路径之前的 manim 命令部分。
+
+    GIF、PNG 和透明 MP4 (manim 输出 .mov) 无法直接播放，预览参数 -p 会改为
+    打开文件夹 -f。
+
+    Args:
+        python_path (str): 用于运行 manim 的 Python 解释器。
+        quality_flag (str): 质量参数，例如 "-qh"。
+        output_format (str): OUTPUT_FORMATS 之一。
+        transparent (bool): 是否使用透明背景 (-t)。
+        preview_flag (str | None): "-p"、"-f" 或 None (不预览)。
+        media_dir (str | None): 输出目录 (--media_dir)，为 None 时使用 manim 的默认目录。
+
+    Returns:
+        list[str]: 例如 [python, '-m', 'manim', '--media_dir', dir, '-qh', '-t', '-f']。
+
+    Raises:
+        ValueError: 无法识别的输出格式。
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"无法识别的输出格式: {output_format} (可选: {', '.join(OUTPUT_FORMATS)})")
+    command = [python_path, "-m", "manim"]
+    if media_dir:
+        command.extend(["--media_dir", media_dir])
+    command.append(quality_flag)
+
+    if output_format == "gif":
+        command.extend(["--format", "gif"]) # 指定 GIF 格式
+        if preview_flag == "-p": preview_flag = "-f"
+    elif output_format == "png_last":
+        command.append("-s") # 保存最后一帧为 PNG
+        if preview_flag == "-p": preview_flag = "-f"
+    elif transparent and preview_flag == "-p": # 透明 MP4 实际输出为 .mov
+        preview_flag = "-f"
+    if transparent:
+        command.append("-t")
+
+    if preview_flag in PREVIEW_FLAGS:
+        command.append(preview_flag)
+    return command
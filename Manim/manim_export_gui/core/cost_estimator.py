@@ -0,0 +1,276 @@
+# core/cost_estimator.py
+
+import ast
+import os
+from dataclasses import dataclass
+
+try:
+    from core.command_builder import QUALITY_PROFILES, quality_profile
+    from core.render_cache import parse_manim_command
+    from core.script_parser import (VALID_SCENE_BASE_NAMES, _dotted_name, _eval_number, _iter_class_defs,
+                                    get_config_overrides)
+except ImportError:
+    from command_builder import QUALITY_PROFILES, quality_profile
+    from render_cache import parse_manim_command
+    from script_parser import (VALID_SCENE_BASE_NAMES, _dotted_name, _eval_number, _iter_class_defs,
+                               get_config_overrides)
+
+# manim 中 self.play 和 self.wait 的默认时长 (秒)
+DEFAULT_RUN_TIME = 1.0
+DEFAULT_WAIT_TIME = 1.0
+# 无法确定次数的循环按该次数估计
+UNKNOWN_LOOP_COUNT = 1
+# 预计像素量 (帧数 × 每帧像素) 超过该值时提醒 (约为 4K60 渲染 10 秒)
+LONG_RENDER_PIXELS = 5e9
+
+@dataclass
+class SceneCost:
+    """根据场景源码静态估计的渲染成本。"""
+    scene: str
+    duration: float = 0.0          # 动画总时长 (秒)，即各 play 的 run_time 与 wait 时长之和
+    play_count: int = 0            # self.play 调用次数 (计入循环次数)
+    wait_count: int = 0            # self.wait 调用次数
+    unknown_run_times: int = 0     # 无法确定 run_time 而按默认值估计的调用次数
+    config_overrides: dict = None  # 模块级 config 赋值 (pixel_width、pixel_height、frame_rate)
+    has_construct: bool = True     # 类本身定义了 construct (否则 construct 来自基类，无法分析)
+    indirect_calls: bool = False   # 脚本中有不通过 self 的 play / wait 调用 (例如 scene.play)
+    custom_base: bool = False      # 继承自自定义基类 (基类的方法中可能有动画)
+
+    @property
+    def static(self):
+        """没有 play / wait 的场景只渲染一帧 (只 self.add)。
+
+        只在确定时为 True：construct 或其他方法继承自自定义基类、脚本中有其他对象的 play / wait 调用时为 False。
+        """
+        return self.has_construct and not self.indirect_calls and not self.custom_base \
+            and self.play_count == 0 and self.wait_count == 0
+
+    def profile(self, quality_flag):
+        """返回 (像素宽度, 像素高度, 帧率)，脚本中的 config 赋值优先于质量参数。"""
+        return quality_profile(quality_flag, self.config_overrides)
+
+    def frames(self, quality_flag):
+        """预计帧数 (静态场景为 1)。"""
+        if self.static:
+            return 1
+        return max(1, round(self.duration * self.profile(quality_flag)[2]))
+
+    def pixels(self, quality_flag):
+        """预计需要绘制和编码的像素总量 (帧数 × 每帧像素)。"""
+        width, height, _ = self.profile(quality_flag)
+        return self.frames(quality_flag) * width * height
+
+class _ConstructAnalyzer:
+    """遍历 construct (以及其中调用的 self.方法)，累计 play / wait 的次数和时长。"""
+
+    def __init__(self, class_node, constants):
+        self.methods = {node.name: node for node in class_node.body
+                        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        self.constants = constants
+        self.cost = None
+        self._stack = []
+
+    def value(self, node):
+        """计算数字表达式，支持类常量 (self.X / 类名.X) 和模块常量；无法计算时返回 None。"""
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.attr in self.constants:
+            return self.constants[node.attr]
+        if isinstance(node, ast.Name):
+            return self.constants.get(node.id)
+        if isinstance(node, ast.BinOp):
+            left, right = self.value(node.left), self.value(node.right)
+            if left is None or right is None:
+                return None
+            return _eval_number(ast.BinOp(ast.Constant(left), node.op, ast.Constant(right)))
+        return _eval_number(node)
+
+    def loop_count(self, node):
+        """for 循环的次数：支持 range(...) 和字面量列表/元组，其余按 UNKNOWN_LOOP_COUNT。"""
+        iterable = node.iter
+        if isinstance(iterable, (ast.List, ast.Tuple)):
+            return len(iterable.elts)
+        if isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name) and iterable.func.id == "range":
+            args = [self.value(arg) for arg in iterable.args]
+            if args and all(isinstance(arg, int) for arg in args):
+                return max(0, len(range(*args)))
+        return UNKNOWN_LOOP_COUNT
+
+    def analyze(self, scene):
+        self.cost = SceneCost(scene, has_construct="construct" in self.methods)
+        if "construct" in self.methods:
+            self._visit_method("construct", 1)
+        return self.cost
+
+    def _visit_method(self, name, multiplier):
+        if name in self._stack: # 避免递归调用
+            return
+        self._stack.append(name)
+        self._visit_body(self.methods[name].body, multiplier)
+        self._stack.pop()
+
+    def _visit_body(self, body, multiplier):
+        for statement in body:
+            self._visit_statement(statement, multiplier)
+
+    def _visit_statement(self, node, multiplier):
+        if isinstance(node, (ast.For, ast.AsyncFor)):
+            self._visit_body(node.body, multiplier * self.loop_count(node))
+            self._visit_body(node.orelse, multiplier)
+        elif isinstance(node, ast.While):
+            self._visit_body(node.body, multiplier * UNKNOWN_LOOP_COUNT)
+        elif isinstance(node, ast.If):
+            # 条件通常取决于类常量，按时长较长的分支估计
+            branches = []
+            for body in (node.body, node.orelse):
+                before = (self.cost.duration, self.cost.play_count, self.cost.wait_count, self.cost.unknown_run_times)
+                self._visit_body(body, multiplier)
+                after = (self.cost.duration, self.cost.play_count, self.cost.wait_count, self.cost.unknown_run_times)
+                branches.append(tuple(a - b for a, b in zip(after, before)))
+                (self.cost.duration, self.cost.play_count,
+                 self.cost.wait_count, self.cost.unknown_run_times) = before
+            longest = max(branches)
+            self.cost.duration += longest[0]
+            self.cost.play_count += longest[1]
+            self.cost.wait_count += longest[2]
+            self.cost.unknown_run_times += longest[3]
+        elif isinstance(node, (ast.With, ast.AsyncWith, ast.Try)):
+            for field in ("body", "orelse", "finalbody"):
+                self._visit_body(getattr(node, field, []), multiplier)
+            for handler in getattr(node, "handlers", []):
+                self._visit_body(handler.body, multiplier)
+        elif not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            for sub in ast.walk(node):
+                if isinstance(sub, ast.Call):
+                    self._visit_call(sub, multiplier)
+
+    def _visit_call(self, node, multiplier):
+        func = node.func
+        if not (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "self"):
+            return
+        keywords = {keyword.arg: keyword.value for keyword in node.keywords if keyword.arg}
+        if func.attr == "play":
+            run_time = self.value(keywords["run_time"]) if "run_time" in keywords else DEFAULT_RUN_TIME
+            if run_time is None:
+                run_time = DEFAULT_RUN_TIME
+                self.cost.unknown_run_times += multiplier
+            self.cost.play_count += multiplier
+            self.cost.duration += run_time * multiplier
+        elif func.attr == "wait":
+            duration_node = node.args[0] if node.args else keywords.get("duration")
+            duration = self.value(duration_node) if duration_node is not None else DEFAULT_WAIT_TIME
+            if duration is None:
+                duration = DEFAULT_WAIT_TIME
+                self.cost.unknown_run_times += multiplier
+            self.cost.wait_count += multiplier
+            self.cost.duration += duration * multiplier
+        elif func.attr in self.methods:
+            self._visit_method(func.attr, multiplier)
+
+def _numeric_assignments(body):
+    """收集语句列表中形如 NAME = <数字表达式> 的赋值。"""
+    constants = {}
+    for node in body:
+        if isinstance(node, ast.Assign):
+            value = _eval_number(node.value)
+            if value is None and isinstance(node.value, ast.Name):
+                value = constants.get(node.value.id)
+            if value is None:
+                continue
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    constants[target.id] = value
+    return constants
+
+def estimate_scene_costs(content, config_overrides=None):
+    """分析脚本源码，估计每个类的渲染成本 (不导入脚本、不运行 manim)。
+
+    Args:
+        content (str): 脚本源码。
+        config_overrides (dict | None): 模块级 config 赋值 (见 script_parser.get_config_overrides)。
+
+    Returns:
+        dict: {类名: SceneCost}。
+
+    Raises:
+        SyntaxError: 源码无法解析。
+    """
+    tree = ast.parse(content)
+    module_constants = _numeric_assignments(tree.body)
+    # 把场景传给辅助函数 (helper(self) 中调用 scene.play) 时无法确定场景是否有动画
+    indirect_calls = any(isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                         and node.func.attr in ("play", "wait")
+                         and not (isinstance(node.func.value, ast.Name) and node.func.value.id == "self")
+                         for node in ast.walk(tree))
+    costs = {}
+    for class_node in _iter_class_defs(tree.body):
+        constants = dict(module_constants)
+        constants.update(_numeric_assignments(class_node.body))
+        cost = _ConstructAnalyzer(class_node, constants).analyze(class_node.name)
+        cost.config_overrides = dict(config_overrides or {})
+        cost.indirect_calls = indirect_calls
+        cost.custom_base = any((_dotted_name(base) or "").split(".")[-1] not in VALID_SCENE_BASE_NAMES
+                               for base in class_node.bases)
+        costs[class_node.name] = cost
+    return costs
+
+def estimate_script(file_path):
+    """估计脚本中每个类的渲染成本；文件无法读取或解析时返回空字典。"""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        return estimate_scene_costs(content, get_config_overrides(file_path))
+    except (OSError, SyntaxError, ValueError) as e:
+        print(f"估计渲染成本时出错 {file_path}: {e}")
+        return {}
+
+def quality_of(flags):
+    """返回参数列表中的质量参数 (没有时为 manim 默认的 -qh)。"""
+    return next((flag for flag in reversed(flags) if flag in QUALITY_PROFILES), "-qh")
+
+def estimate_command(command_list):
+    """估计一条单场景 manim 命令的成本。
+
+    Returns:
+        tuple[SceneCost, str] | None: (场景成本, 质量参数)；无法估计时返回 None。
+    """
+    info = parse_manim_command(command_list)
+    if info is None or len(info["scenes"]) != 1:
+        return None
+    cost = estimate_script(info["script"]).get(info["scenes"][0])
+    return (cost, quality_of(info["flags"])) if cost else None
+
+def command_pixels(command_list):
+    """命令的预计像素量，无法估计时为 0 (用于排序)。"""
+    estimate = estimate_command(command_list)
+    return estimate[0].pixels(estimate[1]) if estimate else 0
+
+def order_longest_first(jobs, command_of=lambda job: job[1]):
+    """把任务按预计像素量从大到小排序 (并行渲染时最长的任务先开始，缩短整体耗时)。
+
+    Args:
+        jobs (list): 任务列表，默认为 (名称, 命令) 元组。
+        command_of (callable): 从任务中取出命令列表的函数。
+    """
+    return sorted(jobs, key=lambda job: command_pixels(command_of(job)), reverse=True)
+
+def is_static_scene(script_path, scene):
+    """场景是否确定从不播放动画 (只需导出单帧)。"""
+    cost = estimate_script(script_path).get(scene)
+    return bool(cost and cost.static)
+
+def format_cost(cost, quality_flag):
+    """把成本格式化为日志中显示的文本。"""
+    width, height, frame_rate = cost.profile(quality_flag)
+    if cost.static:
+        return f"静态场景 (只渲染一帧)，{width}x{height}"
+    unknown = f"，{cost.unknown_run_times} 处时长按默认值估计" if cost.unknown_run_times else ""
+    return (f"动画约 {cost.duration:g}s ({cost.play_count} 次 play，{cost.wait_count} 次 wait{unknown})，"
+            f"{width}x{height}@{frame_rate:g}，约 {cost.frames(quality_flag)} 帧 / "
+            f"{cost.pixels(quality_flag) / 1e9:.1f} G 像素")
+
+# 示例用法：python core/cost_estimator.py <脚本> [质量参数]
+if __name__ == '__main__':
+    import sys
+    script = sys.argv[1] if len(sys.argv) > 1 else os.path.join("..", "topic03_panal_data_.py")
+    quality = sys.argv[2] if len(sys.argv) > 2 else "-qk"
+    for name, scene_cost in estimate_script(script).items():
+        print(f"{name} {quality}: {format_cost(scene_cost, quality)}")
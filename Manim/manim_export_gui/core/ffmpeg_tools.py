@@ -0,0 +1,88 @@
+# core/ffmpeg_tools.py
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+try:
+    from core.manim_runner import _get_startupinfo
+    from core.render_events import LogLine
+    from core.render_job import KILL_GRACE_SECONDS, process_group_kwargs, kill_process_tree
+except ImportError:
+    from manim_runner import _get_startupinfo
+    from render_events import LogLine
+    from render_job import KILL_GRACE_SECONDS, process_group_kwargs, kill_process_tree
+
+def find_ffmpeg():
+    """返回 ffmpeg 可执行文件路径；找不到时返回 None。
+
+    优先使用环境变量 FFMPEG_BINARY 指定的路径，其次在 PATH 中查找。
+    """
+    candidate = os.environ.get("FFMPEG_BINARY")
+    if candidate and (os.path.isfile(candidate) or shutil.which(candidate)):
+        return shutil.which(candidate) or candidate
+    return shutil.which("ffmpeg")
+
+def run_ffmpeg(args, output_callback=None, ffmpeg=None, job=None):
+    """执行一次 ffmpeg 命令。
+
+    Args:
+        args (list[str]): ffmpeg 之后的参数列表。
+        output_callback (callable | None): 出错时接收 ffmpeg 输出 (LogLine 事件) 的函数。
+        ffmpeg (str | None): ffmpeg 路径，默认为 find_ffmpeg() 的结果。
+        job (RenderJob | None): 所属任务的句柄；取消时终止 ffmpeg 进程。
+
+    Returns:
+        int | None: ffmpeg 返回代码；找不到 ffmpeg 或任务已取消时返回 None。
+    """
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg:
+        if output_callback:
+            output_callback(LogLine("错误：找不到 ffmpeg，请安装 ffmpeg 并添加到系统 PATH。\n"))
+        return None
+    if job is not None and job.cancelled:
+        return None
+    process = subprocess.Popen(
+        [ffmpeg, "-hide_banner", "-loglevel", "error", "-y"] + list(args),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace',
+        startupinfo=_get_startupinfo(), **process_group_kwargs()
+    )
+    kill = lambda force=False: kill_process_tree(process, grace=0 if force else KILL_GRACE_SECONDS)
+    if job is not None:
+        job.attach(kill)
+    try:
+        _, stderr = process.communicate()
+    finally:
+        if job is not None:
+            job.detach(kill)
+    if process.returncode != 0 and output_callback:
+        output_callback(LogLine(f"ffmpeg 出错 (返回代码 {process.returncode}):\n{stderr}\n"))
+    return process.returncode
+
+def concat_copy(input_files, output_file, output_callback=None, ffmpeg=None, job=None):
+    """使用 ffmpeg concat demuxer 以流复制 (-c copy) 方式拼接视频，不重新编码。
+
+    MP4 / MOV 输出与 manim 自身的输出一样把 moov 放在文件开头 (-movflags +faststart)。
+
+    Args:
+        input_files (list[str]): 按播放顺序排列的输入视频 (编码参数必须一致)。
+        output_file (str): 输出视频路径。
+
+    Returns:
+        int | None: ffmpeg 返回代码；找不到 ffmpeg 时返回 None。
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    fd, list_path = tempfile.mkstemp(suffix=".txt", prefix="concat_")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for path in input_files:
+                escaped = os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        faststart = ["-movflags", "+faststart"] if output_file.lower().endswith((".mp4", ".mov")) else []
+        return run_ffmpeg(
+            ["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy"] + faststart + [output_file],
+            output_callback, ffmpeg, job
+        )
+    finally:
+        os.remove(list_path)
@@ -0,0 +1,61 @@
+# core/file_opener.py
+
+import os
+import subprocess
+import sys
+
+# manim 的预览参数: 播放输出文件 / 在文件管理器中显示
+PREVIEW_OPTIONS = {"-p": "preview", "--preview": "preview", "-f": "reveal", "--show_in_file_browser": "reveal"}
+# 预览时优先打开的输出文件类型
+_PREVIEW_EXTENSIONS = (".mp4", ".mov", ".webm", ".gif", ".png")
+
+def open_path(path):
+    """用系统默认程序打开文件或文件夹。"""
+    if sys.platform == "win32":
+        os.startfile(path)
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", path])
+    else:
+        subprocess.Popen(["xdg-open", path])
+
+def reveal_in_file_browser(path):
+    """在文件管理器中显示文件 (Linux 上打开所在的文件夹)。"""
+    if sys.platform == "win32":
+        subprocess.Popen(["explorer", "/select,", os.path.normpath(path)])
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", "-R", path])
+    else:
+        subprocess.Popen(["xdg-open", os.path.dirname(os.path.abspath(path))])
+
+def preview_action(command_list):
+    """命令中的预览参数对应的操作: "preview"、"reveal" 或 None。"""
+    for arg in command_list:
+        if arg in PREVIEW_OPTIONS:
+            return PREVIEW_OPTIONS[arg]
+    return None
+
+def apply_preview(command_list, output_files):
+    """代替 manim 执行命令中的 -p / -f (命中渲染缓存或拼接分段视频时 manim 没有处理输出文件)。
+
+    Returns:
+        str | None: 打开的文件；没有预览参数或输出文件时返回 None。
+    """
+    action = preview_action(command_list)
+    if action is None or not output_files:
+        return None
+    rank = lambda path: next((i for i, ext in enumerate(_PREVIEW_EXTENSIONS) if path.lower().endswith(ext)),
+                             len(_PREVIEW_EXTENSIONS))
+    path = min(output_files, key=rank)
+    try:
+        if action == "preview":
+            open_path(path)
+        else:
+            reveal_in_file_browser(path)
+    except OSError as e:
+        print(f"打开输出文件时出错 {path}: {e}")
+        return None
+    return path
+
+# 示例用法
+if __name__ == '__main__':
+    print(preview_action(["python", "-m", "manim", "-ql", "scene.py", "Demo", "-p"])) # 应该输出 preview
@@ -0,0 +1,161 @@
+# core/file_watcher.py
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify 事件 (linux/inotify.h)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+class _Inotify:
+    """通过 ctypes 调用 libc 的 inotify 接口，监视若干目录中的写入和替换。"""
+
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs = {}  # {wd: 目录}
+        # 监视目录而不是文件：许多编辑器保存时先写临时文件再替换原文件
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+            if wd < 0:
+                error = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(error, f"inotify_add_watch 失败: {directory}")
+            self._dirs[wd] = directory
+
+    def read(self, timeout):
+        """等待最多 timeout 秒，返回发生变化的文件路径集合。"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        paths = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, _, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if name and wd in self._dirs:
+                paths.add(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class FileWatcher:
+    """监视一组文件，文件被保存后 (合并 debounce 秒内的连续写入) 在后台线程中调用回调。
+
+    Linux 上使用 inotify，其他平台或 inotify 不可用时按 poll_interval 轮询修改时间和大小。
+    """
+
+    def __init__(self, paths, callback, debounce=0.3, poll_interval=0.5):
+        """
+        Args:
+            paths (list[str]): 要监视的文件。
+            callback (callable): callback(changed_paths)，changed_paths 为改变的文件集合 (绝对路径)。
+            debounce (float): 最后一次写入之后等待的秒数，期间的写入合并为一次回调。
+            poll_interval (float): 轮询模式的检查间隔 (秒)。
+        """
+        self.paths = {os.path.abspath(path) for path in paths}
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动监视线程，返回使用的方式 ("inotify" 或 "polling")。"""
+        inotify = None
+        if sys.platform.startswith("linux"):
+            try:
+                inotify = _Inotify(sorted({os.path.dirname(path) for path in self.paths}))
+            except (OSError, AttributeError) as e:
+                print(f"inotify 不可用，改为轮询: {e}")
+        self.backend = "inotify" if inotify else "polling"
+        target = (lambda: self._run_inotify(inotify)) if inotify else self._run_polling
+        self._thread = threading.Thread(target=target, name="file_watcher", daemon=True)
+        self._thread.start()
+        return self.backend
+
+    def stop(self):
+        """停止监视 (最多等待一个检查周期)。"""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _dispatch(self, changed):
+        try:
+            self.callback(changed)
+        except Exception as e:
+            print(f"文件监视回调出错: {e}")
+
+    def _run_inotify(self, inotify):
+        pending, last_event = set(), 0.0
+        try:
+            while not self._stop_event.is_set():
+                timeout = self.debounce if pending else 0.5
+                changed = inotify.read(timeout) & self.paths
+                now = time.monotonic()
+                if changed:
+                    pending |= changed
+                    last_event = now
+                elif pending and now - last_event >= self.debounce:
+                    batch, pending = pending, set()
+                    self._dispatch(batch)
+        finally:
+            inotify.close()
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _run_polling(self):
+        states = {path: self._stat(path) for path in self.paths}
+        pending, last_event = set(), 0.0
+        while not self._stop_event.wait(self.poll_interval):
+            now = time.monotonic()
+            for path in self.paths:
+                state = self._stat(path)
+                if state != states[path]:
+                    states[path] = state
+                    if state is not None:
+                        pending.add(path)
+                        last_event = now
+            if pending and now - last_event >= self.debounce:
+                batch, pending = pending, set()
+                self._dispatch(batch)
+
+# 示例用法：python core/file_watcher.py <文件>
+if __name__ == '__main__':
+    watcher = FileWatcher(sys.argv[1:], lambda changed: print(f"已保存: {', '.join(sorted(changed))}"))
+    print(f"正在监视 (方式: {watcher.start()})，按 Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        watcher.stop()
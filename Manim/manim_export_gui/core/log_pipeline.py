@@ -0,0 +1,166 @@
+# core/log_pipeline.py
+
+import collections
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+
+try:
+    from core.app_paths import get_app_cache_dir
+except ImportError:
+    from app_paths import get_app_cache_dir
+
+# 并行任务输出的前缀，例如 "[PanelData3D] " 或 "[片段 1/4] "
+_JOB_PREFIX_PATTERN = re.compile(r"^(\[[^\]\n]*\] )")
+
+def _progress_key(line):
+    """返回行所属任务的前缀 (没有前缀时为空字符串)，用于区分各任务的进度条。"""
+    match = _JOB_PREFIX_PATTERN.match(line)
+    return match.group(1) if match else ""
+
+def get_default_log_file():
+    """返回完整渲染日志的默认文件路径。"""
+    return get_app_cache_dir("logs", "render.log")
+
+class LogPipeline:
+    """合并并限制 GUI 日志输出的管道。
+
+    任意线程调用 write() 把文本放入待刷新队列，GUI 主线程按固定间隔调用 drain()
+    一次取出这段时间内的所有文本。每批最多保留最后 max_lines 行 (更早的行反正
+    会被文本框裁掉)，因此每次刷新的 UI 工作量有上限，每秒刷新次数也不超过
+    1 / flush_interval。完整日志同时写入按大小轮转的磁盘文件。
+
+    以 "\\r" 结尾的文本是进度条，不进入日志，而是按任务前缀各保留最新一条，
+    显示在文本框末尾并原地更新；同一任务输出新的完整行时其进度条被移除。
+    """
+
+    def __init__(self, flush_interval=0.05, max_lines=2000, log_file=None,
+                 max_bytes=5 * 1024 ** 2, backup_count=3):
+        """
+        Args:
+            flush_interval (float): 刷新间隔 (秒)。
+            max_lines (int): 文本框中保留的最大行数。
+            log_file (str | None): 完整日志文件路径，默认为 get_default_log_file()；
+                                   传入空字符串时不写文件。
+            max_bytes (int): 单个日志文件的大小上限。
+            backup_count (int): 保留的轮转文件数量。
+        """
+        self.flush_interval = flush_interval
+        self.max_lines = max_lines
+        self._pending = collections.deque()
+        self._pending_lines = 0
+        self._progress = {}                      # {任务前缀: 最新进度文本}
+        self._progress_dirty = False
+        self._lock = threading.Lock()
+        self._stats_window = collections.deque() # (刷新时间, 耗时, 行数)
+        self.dropped_lines = 0                   # 未进入文本框、只写入文件的行数
+        self.log_file = get_default_log_file() if log_file is None else log_file
+        self._file_logger = self._create_file_logger(max_bytes, backup_count) if self.log_file else None
+
+    def _create_file_logger(self, max_bytes, backup_count):
+        try:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                self.log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+            )
+        except OSError as e:
+            print(f"无法创建日志文件 {self.log_file}: {e}")
+            self.log_file = ""
+            return None
+        handler.terminator = "" # 文本自带换行
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.getLogger(f"manim_export_gui.render_log.{id(self)}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        return logger
+
+    def write(self, text):
+        """追加一段文本 (线程安全)。"""
+        if not text:
+            return
+        if text.endswith("\r"):
+            with self._lock:
+                self._progress[_progress_key(text)] = text.rstrip("\r")
+                self._progress_dirty = True
+            return
+        if self._file_logger is not None:
+            self._file_logger.info(text)
+        with self._lock:
+            if self._progress:
+                for line in text.splitlines():
+                    if line.strip() and self._progress.pop(_progress_key(line), None) is not None:
+                        self._progress_dirty = True
+            self._pending.append(text)
+            self._pending_lines += text.count("\n")
+            # 待刷新内容超过文本框容量时，丢弃最早的部分 (文件中仍有完整记录)
+            while self._pending_lines > self.max_lines and len(self._pending) > 1:
+                dropped = self._pending.popleft()
+                self._pending_lines -= dropped.count("\n")
+                self.dropped_lines += dropped.count("\n")
+
+    def drain(self):
+        """取出所有待刷新的文本和进度条 (由 GUI 主线程调用)。
+
+        Returns:
+            tuple[str, str | None]: (合并后的文本, 进度条文本)。没有新日志时文本为
+                空字符串；进度条未变化时为 None，已全部结束时为空字符串。
+        """
+        with self._lock:
+            text = "".join(self._pending)
+            self._pending.clear()
+            self._pending_lines = 0
+            progress = None
+            if self._progress_dirty:
+                progress = "\n".join(self._progress.values())
+                self._progress_dirty = False
+        lines = text.split("\n")
+        if len(lines) > self.max_lines + 1:
+            self.dropped_lines += len(lines) - self.max_lines - 1
+            text = "\n".join(lines[-(self.max_lines + 1):])
+        return text, progress
+
+    def discard_pending(self):
+        """丢弃尚未刷新的文本 (文件中仍有记录)。"""
+        with self._lock:
+            self._pending.clear()
+            self._pending_lines = 0
+            if self._progress:
+                self._progress.clear()
+                self._progress_dirty = True
+
+    def record_flush(self, seconds, line_count):
+        """记录一次 UI 刷新的耗时，用于统计主线程负载。"""
+        now = time.monotonic()
+        self._stats_window.append((now, seconds, line_count))
+        while self._stats_window and now - self._stats_window[0][0] > 1.0:
+            self._stats_window.popleft()
+
+    def stats(self):
+        """返回最近一秒内的 UI 刷新统计。
+
+        Returns:
+            dict: flushes_per_second (刷新次数)、ui_ms_per_second (主线程耗时)、
+                  max_flush_ms (单次最大耗时)、lines_per_second、dropped_lines，
+                  以及理论上限 max_flushes_per_second。
+        """
+        window = list(self._stats_window)
+        return {
+            "flushes_per_second": len(window),
+            "ui_ms_per_second": sum(item[1] for item in window) * 1000,
+            "max_flush_ms": max((item[1] for item in window), default=0.0) * 1000,
+            "lines_per_second": sum(item[2] for item in window),
+            "dropped_lines": self.dropped_lines,
+            "max_flushes_per_second": 1.0 / self.flush_interval,
+        }
+
+    def close(self):
+        """关闭日志文件。"""
+        if self._file_logger is not None:
+            for handler in list(self._file_logger.handlers):
+                handler.close()
+                self._file_logger.removeHandler(handler)
+            self._file_logger = None
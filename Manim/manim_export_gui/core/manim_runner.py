@@ -1,76 +1,717 @@
-# core/manim_runner.py
-
-import subprocess
-import threading
-import os
-import sys
-
-def run_manim_command(command_list, output_callback):
-    """在单独的线程中执行 Manim 命令并实时回传输出。
-
-    Args:
-        command_list (list[str]): 要执行的命令列表 (例如 ['manim', '-pql', 'scene.py', 'MyScene'])
-        output_callback (callable): 一个函数，接收解码后的输出行 (str) 作为参数。
-    """
-    def target():
-        try:
-            # 设置 Popen 以便实时读取输出
-            # 使用 text=True 让 Popen 处理解码
-            # stderr=subprocess.STDOUT 将错误流重定向到标准输出流
-            # bufsize=1 设置行缓冲
-            # universal_newlines=True 已经被 text=True 替代并弃用
-            # 在 Windows 上，可能需要设置 shell=True，但这有安全风险，尽量避免。
-            # 如果 manim 命令在 PATH 中，通常不需要 shell=True。
-            # 如果遇到问题，可以考虑提供 manim 的完整路径。
-            # 添加 startupinfo 来隐藏 Windows 上的控制台窗口
-            startupinfo = None
-            if sys.platform == "win32":
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                startupinfo.wShowWindow = subprocess.SW_HIDE
-
-            process = subprocess.Popen(
-                command_list,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                encoding='utf-8', # 显式指定编码
-                errors='replace', # 处理潜在的编码错误
-                bufsize=1,
-                startupinfo=startupinfo # 隐藏窗口
-            )
-
-            # 实时读取输出
-            if process.stdout:
-                for line in iter(process.stdout.readline, ''):
-                    output_callback(line)
-                process.stdout.close()
-
-            # 等待进程结束
-            return_code = process.wait()
-            output_callback(f"\n--- 渲染进程结束，返回代码: {return_code} ---")
-
-        except FileNotFoundError:
-            output_callback(f"错误：找不到 'manim' 命令。请确保 Manim 已正确安装并添加到系统 PATH。")
-        except Exception as e:
-            output_callback(f"执行 Manim 命令时出错: {e}")
-
-    # 在新线程中运行命令，避免阻塞 GUI
-    thread = threading.Thread(target=target)
-    thread.daemon = True # 允许主程序退出时子线程也退出
-    thread.start()
-
-# 示例用法
-if __name__ == '__main__':
-    def print_output(line):
-        print(line, end='') # end='' 避免重复换行
-
-    print("测试运行 Manim (需要安装 Manim 并能从命令行调用):")
-    # 注意：这个示例需要一个实际存在的 manim 脚本和场景
-    # 这里用 --help 作为示例，因为它不需要脚本文件
-    test_command = ['manim', '--help']
-    run_manim_command(test_command, print_output)
-
-    # 等待线程（通常在 GUI 应用中不需要手动等待，因为主循环会保持运行）
-    # import time
-    # time.sleep(5) 
\ No newline at end of file
+# core/manim_runner.py
+
+import subprocess
+import threading
+import codecs
+import itertools
+import json
+import os
+import queue
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from core.cost_estimator import is_static_scene
+    from core.file_opener import apply_preview
+    from core.render_cache import find_scene_outputs, parse_manim_command
+    from core.render_events import (LogLine, FileReady, ProcessStarted, RenderFinished, RenderEventParser,
+                                       tag_job)
+    from core.render_job import RenderJob, KILL_GRACE_SECONDS, process_group_kwargs, kill_process_tree
+    from core.tex_cache import wrap_command
+except ImportError:
+    from cost_estimator import is_static_scene
+    from file_opener import apply_preview
+    from render_cache import find_scene_outputs, parse_manim_command
+    from render_events import (LogLine, FileReady, ProcessStarted, RenderFinished, RenderEventParser,
+                               tag_job)
+    from render_job import RenderJob, KILL_GRACE_SECONDS, process_group_kwargs, kill_process_tree
+    from tex_cache import wrap_command
+
+# fork-server 脚本路径 (与本模块位于同一目录)
+WARM_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_worker.py")
+# 输出回调的最小间隔 (秒)：每个任务每个间隔最多回传一批完整行和一条进度
+OUTPUT_INTERVAL = 0.1
+# 每次从管道读取的最大字节数
+READ_CHUNK_SIZE = 65536
+
+def _get_startupinfo():
+    """返回用于隐藏 Windows 控制台窗口的 startupinfo（其他平台返回 None）。"""
+    startupinfo = None
+    if sys.platform == "win32":
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = subprocess.SW_HIDE
+    return startupinfo
+
+class OutputSplitter:
+    """把子进程的原始输出切分为行，并合并 \\r 刷新的进度条。
+
+    以 "\\n" (或 "\\r\\n") 结尾的文本作为完整行回传；tqdm 进度条只用 "\\r" 刷新
+    同一行，这些更新会被合并，只保留最新的一条，以 "\\r" 结尾单独回传。
+    回传频率受 min_interval 限制，close() 时回传剩余内容。
+    """
+
+    def __init__(self, output_callback, min_interval=OUTPUT_INTERVAL):
+        self.output_callback = output_callback
+        self.min_interval = min_interval
+        self._buffer = ""          # 尚未遇到换行符的文本
+        self._after_cr = False     # 缓冲区是否位于 "\\r" 之后 (即正在刷新的进度条)
+        self._lines = []           # 待回传的完整行
+        self._progress = None      # 最近一条已结束的进度文本
+        self._sent_progress = None # 上次回传的进度文本
+        self._last_emit = 0.0
+
+    def feed(self, text):
+        """追加一段已解码的文本，到达回传间隔时回传。"""
+        buffer = self._buffer + text
+        start = 0
+        while True:
+            cr = buffer.find("\r", start)
+            lf = buffer.find("\n", start)
+            if lf != -1 and (cr == -1 or lf < cr):
+                self._lines.append(buffer[start:lf + 1])
+                self._progress = None # 完整行之后，之前的进度已失效
+                self._after_cr = False
+                start = lf + 1
+            elif cr != -1:
+                if cr + 1 == len(buffer):
+                    break # 可能是 "\\r\\n" 的前半部分，等待更多数据
+                if buffer[cr + 1] == "\n":
+                    self._lines.append(buffer[start:cr] + "\n")
+                    self._progress = None
+                    self._after_cr = False
+                    start = cr + 2
+                else:
+                    segment = buffer[start:cr]
+                    if segment.strip():
+                        self._progress = segment
+                    self._after_cr = True
+                    start = cr + 1
+            else:
+                break
+        self._buffer = buffer[start:]
+        if time.monotonic() - self._last_emit >= self.min_interval:
+            self.flush()
+
+    def flush(self):
+        """立即回传积累的完整行和最新进度。"""
+        self._last_emit = time.monotonic()
+        if self._lines:
+            text = "".join(self._lines)
+            self._lines = []
+            self.output_callback(text)
+        progress = self._progress
+        if self._after_cr and self._buffer.strip() and not self._buffer.startswith("\r"):
+            progress = self._buffer.rstrip("\r")
+        if progress and progress != self._sent_progress:
+            self._sent_progress = progress
+            self.output_callback(progress + "\r")
+
+    def close(self):
+        """输出结束：剩余的未换行文本作为最后一行回传。"""
+        if self._buffer.strip() and not self._after_cr:
+            self._lines.append(self._buffer.rstrip("\r") + "\n")
+        self._buffer = ""
+        self._after_cr = False
+        self._progress = None
+        self.flush()
+
+def _read_pipe(pipe, chunks):
+    """后台线程：按块读取管道 (不等待换行)，读到 EOF 时放入 None。"""
+    try:
+        fd = pipe.fileno()
+        while True:
+            data = os.read(fd, READ_CHUNK_SIZE)
+            if not data:
+                break
+            chunks.put(data)
+    except OSError:
+        pass
+    finally:
+        chunks.put(None)
+
+def _stream_output(pipe, output_callback, min_interval=OUTPUT_INTERVAL):
+    """增量读取并解码子进程输出，经 OutputSplitter 以有限频率回传，直到 EOF。"""
+    chunks = queue.Queue()
+    reader = threading.Thread(target=_read_pipe, args=(pipe, chunks))
+    reader.daemon = True
+    reader.start()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace') # 处理潜在的编码错误
+    splitter = OutputSplitter(output_callback, min_interval)
+    while True:
+        try:
+            data = chunks.get(timeout=min_interval)
+        except queue.Empty:
+            splitter.flush() # 没有新数据时也按时回传积累的内容
+            continue
+        if data is None:
+            break
+        splitter.feed(decoder.decode(data))
+    splitter.feed(decoder.decode(b"", final=True))
+    splitter.close()
+
+def _child_env():
+    """子进程环境：关闭 Python 输出缓冲并统一使用 UTF-8，使输出实时到达管道。
+
+    同时加宽 rich 的输出宽度，避免输出文件路径被折行。
+    """
+    env = os.environ.copy()
+    env["PYTHONUNBUFFERED"] = "1"
+    env["PYTHONIOENCODING"] = "utf-8"
+    env.setdefault("COLUMNS", "400")
+    return env
+
+def _run_process(command_list, output_callback, job=None):
+    """在当前线程中阻塞执行 Manim 命令，实时回传渲染事件并返回进程的返回代码。
+
+    子进程在独立的进程组中运行，取消时连同其派生的 ffmpeg、latex 进程一起终止。
+
+    Args:
+        command_list (list[str]): 要执行的命令列表。
+        output_callback (callable): 接收 RenderEvent 的函数。输出行以 LogLine 回传
+            (可能一次包含多行)，进度条解析为 AnimationStarted / AnimationProgress /
+            AnimationFinished，输出文件为 FileReady；进程启动后回传 ProcessStarted，
+            最后回传一个 RenderFinished。
+        job (RenderJob | None): 所属任务的句柄，用于取消和超时。
+
+    Returns:
+        int | None: 进程返回代码；命令无法启动或任务已取消时返回 None。
+    """
+    start = time.monotonic()
+    return_code = None
+    if job is not None and job.cancelled:
+        output_callback(RenderFinished(None, 0.0, cancelled=True))
+        return None
+    try:
+        # 以字节方式读取输出，按块增量解码，
+        # 这样只用 \r 刷新的 tqdm 进度条也能实时显示，而不会阻塞在 readline 上
+        # stderr=subprocess.STDOUT 将错误流重定向到标准输出流
+        # 在 Windows 上，可能需要设置 shell=True，但这有安全风险，尽量避免。
+        # 如果 manim 命令在 PATH 中，通常不需要 shell=True。
+        # 如果遇到问题，可以考虑提供 manim 的完整路径。
+        # 添加 startupinfo 来隐藏 Windows 上的控制台窗口
+        process = subprocess.Popen(
+            command_list,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+            env=_child_env(),
+            startupinfo=_get_startupinfo(), # 隐藏窗口
+            **process_group_kwargs()
+        )
+        output_callback(ProcessStarted(process.pid))
+        kill = lambda force=False: kill_process_tree(process, grace=0 if force else KILL_GRACE_SECONDS)
+        if job is not None:
+            job.attach(kill)
+        try:
+            # 实时读取并解析输出
+            if process.stdout:
+                parser = RenderEventParser(output_callback)
+                _stream_output(process.stdout, parser.feed)
+                parser.close()
+                process.stdout.close()
+
+            # 等待进程结束
+            return_code = process.wait()
+        finally:
+            if job is not None:
+                job.detach(kill)
+
+    except FileNotFoundError:
+        output_callback(LogLine(f"错误：找不到 'manim' 命令。请确保 Manim 已正确安装并添加到系统 PATH。\n"))
+    except Exception as e:
+        output_callback(LogLine(f"执行 Manim 命令时出错: {e}\n"))
+    output_callback(RenderFinished(return_code, time.monotonic() - start,
+                                   cancelled=job is not None and job.cancelled))
+    return return_code
+
+def _run_with_cache(command_list, output_callback, cache, run=_run_process, job=None):
+    """先查询渲染缓存，未命中时执行命令并把成功的输出存入缓存。
+
+    Args:
+        command_list (list[str]): 要执行的命令列表。
+        output_callback (callable): 接收 RenderEvent 的函数。
+        cache (RenderCache | None): 渲染缓存；为 None 时直接执行命令。
+        run (callable): 实际执行命令的函数，签名与 _run_process 相同。
+        job (RenderJob | None): 所属任务的句柄，传给 run。
+
+    Returns:
+        int | None: 返回代码；命中缓存时为 0。
+    """
+    described = None
+    if cache is not None:
+        try:
+            described = cache.describe(command_list)
+        except OSError as e:
+            output_callback(LogLine(f"计算渲染缓存键时出错，跳过缓存: {e}\n"))
+    if described is None:
+        return run(command_list, output_callback, job=job)
+
+    key, info = described
+    hit = cache.lookup(key, info["media_dir"])
+    if hit:
+        output_callback(LogLine("--- 命中渲染缓存，跳过渲染 ---\n"))
+        for path in hit:
+            output_callback(LogLine(f"File ready at '{path}'\n"))
+            output_callback(FileReady(path))
+        # manim 没有运行，由这里执行 -p / -f
+        apply_preview(command_list, hit)
+        output_callback(RenderFinished(0, 0.0, cached=True))
+        return 0
+
+    start = time.time()
+    return_code = run(command_list, output_callback, job=job)
+    if return_code == 0:
+        scene = info["scenes"][0]
+        outputs = find_scene_outputs(info["media_dir"], scene, since=start)
+        if outputs:
+            cache.store(key, info["media_dir"], outputs, script=info["script"], scene=scene)
+    return return_code
+
+def run_manim_command(command_list, output_callback, cache=None, timeout=None, telemetry=None):
+    """在单独的线程中执行 Manim 命令并实时回传渲染事件。
+
+    Args:
+        command_list (list[str]): 要执行的命令列表 (例如 ['manim', '-pql', 'scene.py', 'MyScene'])
+        output_callback (callable): 一个函数，接收 RenderEvent (见 render_events) 作为参数。
+        cache (RenderCache | None): 提供时，未改变的单场景渲染直接复用缓存的输出文件。
+        timeout (float | None): 墙钟超时 (秒)，到期后终止渲染。
+        telemetry (TelemetryStore | None): 提供时把本次渲染的耗时和资源占用写入渲染记录。
+
+    Returns:
+        RenderJob: 任务句柄，可 cancel() 终止渲染，wait() 取得 RenderResult。
+    """
+    job = RenderJob(timeout)
+
+    def target():
+        def forward(event):
+            job.observe(event)
+            output_callback(event)
+
+        callback = telemetry.track(command_list, forward) if telemetry is not None else forward
+        return_code = None
+        try:
+            return_code = _run_with_cache(command_list, callback, cache, job=job)
+        finally:
+            job.finish(return_code)
+
+    # 在新线程中运行命令，避免阻塞 GUI
+    job.start_timer()
+    thread = threading.Thread(target=target)
+    thread.daemon = True # 允许主程序退出时子线程也退出
+    thread.start()
+    return job
+
+def split_manim_command(command_list):
+    """把 [python, '-m', 'manim', *args] 形式的命令拆分为 (python, args)。
+
+    Returns:
+        tuple[str, list[str]] | None: 命令不是该形式时返回 None。
+    """
+    if len(command_list) >= 3 and list(command_list[1:3]) == ["-m", "manim"]:
+        return command_list[0], list(command_list[3:])
+    return None
+
+class WarmWorkerPool:
+    """常驻的预热渲染进程池。
+
+    启动一个已导入 manim 的 fork-server 进程 (warm_worker.py)，每个渲染任务由它
+    fork 出一个子进程执行。回传的事件、返回代码与 _run_process 的子进程
+    路径一致，输出文件路径也相同。仅支持提供 os.fork 的 POSIX 平台。
+    """
+
+    def __init__(self, python_path, max_children=None, cwd=None):
+        """
+        Args:
+            python_path (str): 用于运行 fork-server 的 Python 解释器路径。
+            max_children (int | None): 同时运行的渲染子进程上限，默认为 CPU 核心数。
+            cwd (str | None): fork-server 的工作目录，默认为当前目录。
+        """
+        self.python_path = python_path
+        self.max_children = max_children or get_default_max_workers()
+        self.cwd = cwd or os.getcwd()
+        self.manim_version = None
+        self._process = None
+        self._ready = threading.Event()
+        self._error = None
+        self._jobs = {}                      # {任务 id: 任务状态}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def is_supported():
+        """当前平台是否支持 fork-server 模式。"""
+        return hasattr(os, "fork") and sys.platform != "win32"
+
+    def start(self):
+        """启动 fork-server 进程 (不等待其完成预热)。"""
+        if self.is_alive():
+            return
+        self._ready.clear()
+        self._error = None
+        self._process = subprocess.Popen(
+            [self.python_path, WARM_WORKER_SCRIPT, "--max-children", str(self.max_children)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1,
+            cwd=self.cwd,
+        )
+        reader = threading.Thread(target=self._read_messages, args=(self._process,))
+        reader.daemon = True
+        reader.start()
+
+    def is_alive(self):
+        """fork-server 进程是否仍在运行。"""
+        return self._process is not None and self._process.poll() is None
+
+    def wait_ready(self, timeout=None):
+        """等待预热完成。
+
+        Returns:
+            bool: 预热成功返回 True；超时、失败或进程已退出返回 False。
+        """
+        return self._ready.wait(timeout) and self._error is None and self.is_alive()
+
+    def accepts(self, command_list):
+        """该命令能否交给本进程池执行 (同一解释器的 python -m manim 命令)。"""
+        split = split_manim_command(command_list)
+        return split is not None and split[0] == self.python_path
+
+    def run_command(self, command_list, output_callback, cwd=None, ready_timeout=120, job=None):
+        """阻塞执行一个 [python, '-m', 'manim', ...] 命令，行为与 _run_process 一致。
+
+        Returns:
+            int | None: 渲染子进程的返回代码；无法执行时返回 None。
+        """
+        split = split_manim_command(command_list)
+        if split is None:
+            output_callback(LogLine(f"预热进程无法执行该命令: {command_list}\n"))
+            return None
+        return self.run(split[1], output_callback, cwd=cwd, ready_timeout=ready_timeout, job=job)
+
+    def run(self, manim_args, output_callback, cwd=None, ready_timeout=120, job=None):
+        """阻塞执行一次渲染，manim_args 为 'python -m manim' 之后的参数。
+
+        job (RenderJob) 被取消时，fork-server 终止该任务的渲染子进程组。
+
+        Returns:
+            int | None: 渲染子进程的返回代码；无法执行时返回 None。
+        """
+        if not self.wait_ready(ready_timeout):
+            output_callback(LogLine(f"预热进程不可用: {self._error or '启动超时或已退出'}\n"))
+            return None
+
+        job_id = str(next(self._ids))
+        parser = RenderEventParser(output_callback)
+        state = {"callback": output_callback, "parser": parser, "splitter": OutputSplitter(parser.feed),
+                 "done": threading.Event(), "code": None, "duration": 0.0, "pid": None}
+        with self._lock:
+            self._jobs[job_id] = state
+        try:
+            self._send({"op": "render", "id": job_id, "argv": list(manim_args), "cwd": cwd or os.getcwd()})
+        except (OSError, ValueError, AttributeError) as e:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            output_callback(LogLine(f"向预热进程提交任务时出错: {e}\n"))
+            return None
+
+        def kill(force=False):
+            # fork-server 自行终止其子进程 (SIGTERM，超时后 SIGKILL)
+            try:
+                self._send({"op": "cancel", "id": job_id})
+            except (OSError, ValueError, AttributeError):
+                pass
+            if force and state["pid"] and not state["done"].is_set():
+                # 立即强制终止渲染子进程组 (子进程自成会话，进程组号即其 pid)，由 fork-server 回收
+                try:
+                    os.killpg(state["pid"], signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+
+        if job is not None:
+            job.attach(kill)
+        try:
+            state["done"].wait()
+        finally:
+            if job is not None:
+                job.detach(kill)
+        output_callback(RenderFinished(state["code"], state["duration"],
+                                       cancelled=job is not None and job.cancelled))
+        return state["code"]
+
+    def close(self, timeout=5):
+        """关闭 fork-server；正在运行的渲染会被终止。
+
+        Args:
+            timeout (float): 等待 fork-server 退出的最长时间 (秒)，超时后强制终止。
+        """
+        process = self._process
+        if process is None:
+            return
+        try:
+            process.stdin.close() # 控制通道关闭后 fork-server 会终止子进程并退出
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        self._process = None
+
+    def _send(self, message):
+        with self._lock:
+            self._process.stdin.write(json.dumps(message, ensure_ascii=False) + "\n")
+            self._process.stdin.flush()
+
+    def _read_messages(self, process):
+        """后台线程：读取 fork-server 的协议消息并分发给对应任务。"""
+        for raw in iter(process.stdout.readline, ''):
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            kind = message.get("type")
+            if kind == "ready":
+                self.manim_version = message.get("manim_version")
+                self._ready.set()
+            elif kind == "error":
+                self._error = message.get("message")
+                self._ready.set()
+            elif kind == "started":
+                job = self._jobs.get(message.get("id"))
+                if job:
+                    job["pid"] = message.get("pid")
+                    job["callback"](ProcessStarted(message.get("pid")))
+            elif kind == "output":
+                job = self._jobs.get(message.get("id"))
+                if job:
+                    # 与子进程路径一致：切分行并合并进度条
+                    job["splitter"].feed(message.get("text", ""))
+            elif kind == "exit":
+                with self._lock:
+                    job = self._jobs.pop(message.get("id"), None)
+                if job:
+                    job["splitter"].close()
+                    job["parser"].close()
+                    job["code"] = message.get("code")
+                    job["duration"] = message.get("duration") or 0.0
+                    job["done"].set()
+
+        # fork-server 已退出：结束所有仍在等待的任务
+        if self._error is None:
+            self._error = "预热进程已退出"
+        self._ready.set()
+        with self._lock:
+            jobs, self._jobs = self._jobs, {}
+        for job in jobs.values():
+            job["splitter"].close()
+            job["parser"].close()
+            job["callback"](LogLine("预热进程意外退出，任务中止。\n"))
+            job["done"].set()
+
+def get_default_max_workers(job_count=None):
+    """返回并行渲染的默认并发数：CPU 核心数，且不超过任务数量。
+
+    Args:
+        job_count (int | None): 任务数量，提供时并发数不会超过它。
+
+    Returns:
+        int: 至少为 1 的并发数。
+    """
+    workers = os.cpu_count() or 1
+    if job_count:
+        workers = min(workers, job_count)
+    return max(1, workers)
+
+# 已经不是视频渲染的参数 (导出最后一帧、其他格式、全部场景)
+_NON_MOVIE_FLAGS = {"-s", "--save_last_frame", "--format", "-a", "--write_all"}
+
+def static_fast_path_command(command_list):
+    """场景从不播放动画 (只 self.add) 时，把视频渲染命令改为直接导出单帧 PNG (-s)。
+
+    跳过视频编码、分段文件和 ffmpeg，输出与视频最后一帧相同。预览参数 -p 改为 -f
+    (与 build_manim_command 中 png_last 的处理一致)。
+
+    Returns:
+        list[str] | None: 新命令；不是单场景视频渲染或场景可能有动画时返回 None。
+    """
+    info = parse_manim_command(command_list)
+    if info is None or len(info["scenes"]) != 1 or _NON_MOVIE_FLAGS.intersection(info["flags"]):
+        return None
+    if not is_static_scene(info["script"], info["scenes"][0]):
+        return None
+    # 与 parse_manim_command 相同：[python, -m, manim] 之后第一个 .py 参数为脚本
+    script_index = next(i for i, arg in enumerate(command_list) if i >= 3 and arg.endswith(".py")
+                        and not arg.startswith("-"))
+    prefix = ["-f" if arg in ("-p", "--preview") else arg for arg in command_list[:script_index]]
+    return prefix + ["-s"] + list(command_list[script_index:])
+
+def build_scene_jobs(base_command, script_path, scene_names, extra_args=None):
+    """把一个脚本拆分为每个场景一个渲染任务。
+
+    Args:
+        base_command (list[str]): 脚本路径之前的命令部分 (例如 [python, '-m', 'manim', '-qh'])。
+        script_path (str): Manim 脚本路径。
+        scene_names (list[str]): 场景名称列表 (通常来自 get_scene_names)。
+        extra_args (list[str] | None): 追加在场景名之后的参数。
+
+    Returns:
+        list[tuple[str, list[str]]]: (任务名称, 命令列表) 元组的列表。
+    """
+    extra_args = list(extra_args or [])
+    return [(scene, list(base_command) + [script_path, scene] + extra_args) for scene in scene_names]
+
+def run_manim_jobs(jobs, output_callback, max_workers=None, completion_callback=None, worker_pool=None,
+                   cache=None, chunked=False, timeout=None, telemetry=None, derived_qualities=None,
+                   derived_formats=None, encode_options=None, static_fast_path=False, tex_cache_dir=None,
+                   precompile_tex=False):
+    """在有界线程池中并行执行多个 Manim 渲染任务。
+
+    有多个任务时，每个事件的 job 属性被设为其任务名称 (显示时用 format_event
+    加上 "[任务名称] " 前缀)。所有任务结束后回传一行汇总信息，并以
+    {任务名称: 返回代码} 字典调用 completion_callback。
+
+    Args:
+        jobs (list[tuple[str, list[str]]]): (任务名称, 命令列表) 元组的列表。
+        output_callback (callable): 接收 RenderEvent 的函数，可能被多个线程同时调用。
+        max_workers (int | None): 最大并发数，默认为 CPU 核心数。
+        completion_callback (callable | None): 所有任务结束后调用，参数为结果字典。
+        worker_pool (WarmWorkerPool | None): 提供时，可由它执行的任务改为在预热进程中运行。
+        cache (RenderCache | None): 提供时，未改变的任务直接复用缓存的输出文件。
+        chunked (bool): 为 True 时每个场景按动画编号分段并行渲染后拼接 (见 chunked_render)。
+        timeout (float | None): 全部任务的墙钟超时 (秒)，到期后终止所有渲染。
+        telemetry (TelemetryStore | None): 提供时把每个任务的耗时和资源占用写入渲染记录。
+        derived_qualities (list[str] | None): 多质量导出：每个任务渲染完成后由输出视频缩放出这些
+            质量 (例如 ["-qh", "-ql"])，命令本身应使用最高质量 (见 transcode)。
+        derived_formats (list[str] | None): 每个任务渲染完成后由输出视频生成的其他格式
+            (transcode.DERIVED_FORMATS 中的 "png"、"gif"、"webp")，与派生质量并行执行。
+        encode_options (EncodeOptions | None): 派生 GIF / WebP 的帧率、宽度上限和目标大小。
+        static_fast_path (bool): 为 True 时从不播放动画的场景改为直接导出单帧 PNG
+            (见 static_fast_path_command)，派生格式由该 PNG 生成单帧图片。
+        tex_cache_dir (str | None): 提供时渲染进程通过 tex_cache_launcher 启动，Tex / MathTex / Text 的
+            SVG 缓存在该共享目录中 (与 --media_dir 无关)。预热进程中的任务不使用共享缓存。
+        precompile_tex (bool): 与 tex_cache_dir 一起使用：开始渲染前把各脚本中的 LaTeX 字符串
+            并行编译到共享缓存 (见 tex_precompile)；渲染缓存命中的任务不预编译。
+
+    Returns:
+        RenderJob: 任务句柄。cancel() 终止所有正在运行的渲染进程组并跳过排队中的任务，
+            wait() 返回 RenderResult (job_results 为各任务的返回代码)。
+    """
+    jobs = list(jobs)
+    workers = max_workers or get_default_max_workers(len(jobs))
+    handle = RenderJob(timeout)
+
+    def run_job(job_name, command_list):
+        def job_callback(event):
+            handle.observe(event)
+            # 标记所属任务，保证并行任务的事件和日志可以区分
+            output_callback(tag_job(event, job_name) if len(jobs) > 1 else event)
+
+        still_command = static_fast_path_command(command_list) if static_fast_path else None
+        if still_command is not None:
+            command_list = still_command
+        if telemetry is not None:
+            # 在标记任务名称之前记录，分段渲染的片段事件已带有片段名称，不会被当作整个任务结束
+            job_callback = telemetry.track(command_list, job_callback)
+        if handle.cancelled:
+            job_callback(RenderFinished(None, 0.0, cancelled=True))
+            return None
+
+        if still_command is not None:
+            job_callback(LogLine("--- 静态场景 (没有 play / wait)：快速路径，直接导出单帧 PNG，跳过视频编码 ---\n"))
+
+        run = _run_process
+        if tex_cache_dir:
+            # 缓存键、渲染记录等仍使用原命令，只在启动进程时改为共享缓存入口
+            run = lambda cmd, cb, job=None: _run_process(wrap_command(cmd, tex_cache_dir), cb, job=job)
+        if worker_pool is not None and worker_pool.accepts(command_list):
+            run = worker_pool.run_command
+        if chunked and still_command is None:
+            try:
+                from core.chunked_render import run_chunked_render
+            except ImportError:
+                from chunked_render import run_chunked_render
+            # 多个场景并行时平分 CPU 核心给各场景的片段
+            chunk_workers = max(1, get_default_max_workers() // max(1, min(workers, len(jobs))))
+            process_run = run
+            run = lambda cmd, cb, job=None: run_chunked_render(cmd, cb, max_workers=chunk_workers,
+                                                               run=process_run, job=job)
+        if derived_qualities or derived_formats:
+            try:
+                from core.transcode import run_with_derived_outputs
+            except ImportError:
+                from transcode import run_with_derived_outputs
+            # 缓存命中时同样由缓存的输出派生
+            render_run = run
+            cached_run = lambda cmd, cb, job=None: _run_with_cache(cmd, cb, cache, run=render_run, job=job)
+            return run_with_derived_outputs(command_list, job_callback, derived_qualities, derived_formats,
+                                            run=cached_run, job=handle, encode_options=encode_options)
+        return _run_with_cache(command_list, job_callback, cache, run=run, job=handle)
+
+    def precompile():
+        try:
+            from core.tex_precompile import precompile_jobs
+        except ImportError:
+            from tex_precompile import precompile_jobs
+        commands = [command_list for _, command_list in jobs
+                    if not (worker_pool is not None and worker_pool.accepts(command_list))
+                    and not (cache is not None and cache.is_fresh(command_list))]
+        precompile_jobs(commands, tex_cache_dir, output_callback, job=handle)
+
+    def scheduler():
+        results = {}
+        if tex_cache_dir and precompile_tex:
+            try:
+                precompile()
+            except Exception as e:
+                output_callback(LogLine(f"预编译 LaTeX 时出错: {e}\n"))
+        if len(jobs) > 1:
+            output_callback(LogLine(f"--- 并行渲染 {len(jobs)} 个任务，并发数: {workers} ---\n"))
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="manim_job") as executor:
+                futures = {job_name: executor.submit(run_job, job_name, command_list)
+                           for job_name, command_list in jobs}
+                for job_name, future in futures.items():
+                    results[job_name] = future.result()
+        except Exception as e:
+            output_callback(LogLine(f"调度渲染任务时出错: {e}\n"))
+
+        succeeded = [name for name, code in results.items() if code == 0]
+        failed = [name for name in results if name not in succeeded]
+        summary = f"\n--- 全部渲染任务结束: 成功 {len(succeeded)}/{len(jobs)}"
+        if failed:
+            summary += f"，失败: {', '.join(failed)}"
+        if handle.timed_out:
+            summary += f"，已超时 ({timeout}s)"
+        elif handle.cancelled:
+            summary += "，已取消"
+        output_callback(LogLine(summary + " ---\n"))
+        return_code = next((results[name] for name in failed), 0 if results else None)
+        handle.finish(return_code, results)
+        if completion_callback:
+            completion_callback(results)
+
+    handle.start_timer()
+    thread = threading.Thread(target=scheduler)
+    thread.daemon = True
+    thread.start()
+    return handle
+
+# 示例用法
+if __name__ == '__main__':
+    def print_output(event):
+        print(event.text, end='') # end='' 避免重复换行
+
+    print("测试运行 Manim (需要安装 Manim 并能从命令行调用):")
+    # 注意：这个示例需要一个实际存在的 manim 脚本和场景
+    # 这里用 --help 作为示例，因为它不需要脚本文件
+    test_command = ['manim', '--help']
+    render_job = run_manim_command(test_command, print_output, timeout=60)
+
+    # 等待任务结束（通常在 GUI 应用中不需要手动等待，因为主循环会保持运行）
+    print(render_job.wait())
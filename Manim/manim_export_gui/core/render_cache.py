@@ -0,0 +1,390 @@
+# core/render_cache.py
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from core.app_paths import get_app_cache_dir
+    from core.scene_fingerprint import get_scene_fingerprint
+    from core.tex_cache import FileLock
+except ImportError:
+    from app_paths import get_app_cache_dir
+    from scene_fingerprint import get_scene_fingerprint
+    from tex_cache import FileLock
+
+# 不影响输出内容的参数 (预览/打开文件夹)，不参与缓存键计算
+_NON_OUTPUT_FLAGS = {"-p", "--preview", "-f", "--show_in_file_browser"}
+# 带一个取值的参数中，只影响输出位置的参数 (恢复缓存时使用调用方的目录)
+_LOCATION_OPTIONS = {"--media_dir"}
+# 输出文件所在的 media 子目录
+_OUTPUT_SUBDIRS = ("videos", "images")
+# 输出文件扩展名
+_OUTPUT_EXTENSIONS = {".mp4", ".mov", ".gif", ".webm", ".png"}
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3 # 默认缓存容量: 2 GiB
+
+_manim_versions = {}             # {解释器路径: manim 版本号}
+_manim_versions_lock = threading.Lock()
+
+def get_default_cache_dir():
+    """返回默认的缓存目录 (按平台放在用户缓存目录下)。"""
+    return get_app_cache_dir("renders")
+
+def get_manim_version(python_path):
+    """查询指定解释器中安装的 manim 版本 (结果按解释器缓存)。
+
+    Returns:
+        str: 版本号；无法获取时返回 "unknown"。
+    """
+    with _manim_versions_lock:
+        if python_path in _manim_versions:
+            return _manim_versions[python_path]
+    manim_version = "unknown"
+    try:
+        result = subprocess.run(
+            [python_path, "-c", "import importlib.metadata as m; print(m.version('manim'))"],
+            capture_output=True, text=True, timeout=20, encoding='utf-8', errors='ignore'
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            manim_version = result.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    with _manim_versions_lock:
+        _manim_versions[python_path] = manim_version
+    return manim_version
+
+def parse_manim_command(command_list):
+    """从 [python, '-m', 'manim', ...] 命令中提取缓存所需的信息。
+
+    Returns:
+        dict | None: 包含 python、script、scenes、flags、media_dir 的字典；
+                     命令不是该形式或找不到脚本时返回 None。
+    """
+    if len(command_list) < 4 or list(command_list[1:3]) != ["-m", "manim"]:
+        return None
+    args = list(command_list[3:])
+    flags = []
+    media_dir = None
+    script = None
+    scenes = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if script is None and arg.endswith(".py") and not arg.startswith("-"):
+            script = arg
+        elif script is not None and not arg.startswith("-"):
+            scenes.append(arg)
+        elif arg in _LOCATION_OPTIONS and i + 1 < len(args):
+            media_dir = args[i + 1]
+            i += 1
+        elif arg in _NON_OUTPUT_FLAGS:
+            pass
+        elif arg.startswith("--") and "=" not in arg and i + 1 < len(args) \
+                and not args[i + 1].startswith("-") and not args[i + 1].endswith(".py"):
+            # 形如 --format gif 的带值参数
+            flags.extend([arg, args[i + 1]])
+            i += 1
+        else:
+            flags.append(arg)
+        i += 1
+    if script is None:
+        return None
+    return {
+        "python": command_list[0],
+        "script": os.path.abspath(script),
+        "scenes": scenes,
+        "flags": flags,
+        "media_dir": os.path.abspath(media_dir) if media_dir else os.path.join(os.getcwd(), "media"),
+    }
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _cfg_sha256(script_path):
+    """脚本目录中 manim.cfg 的哈希 (manim 读取它覆盖分辨率、帧率等设置)；没有该文件时返回 None。"""
+    try:
+        return _file_sha256(os.path.join(os.path.dirname(os.path.abspath(script_path)), "manim.cfg"))
+    except OSError:
+        return None
+
+def make_cache_key(python_path, script_path, scene, flags, manim_version=None):
+    """计算一次单场景渲染的缓存键。
+
+    键覆盖场景的 AST 指纹 (场景类、它用到的模块级常量和辅助函数以及模块级 config 赋值，
+    见 scene_fingerprint)、脚本目录中的 manim.cfg、场景名、质量/格式等输出参数、解释器路径和 manim 版本。
+    修改同一脚本中的其他场景、注释或格式不会使缓存失效；无法计算指纹时使用整个脚本的哈希。
+
+    Returns:
+        str: 十六进制 SHA-256 字符串。
+    """
+    fingerprint = get_scene_fingerprint(script_path, scene)
+    payload = {
+        "scene_fingerprint": fingerprint,
+        "script_sha256": None if fingerprint else _file_sha256(script_path),
+        "manim_cfg": _cfg_sha256(script_path),
+        "scene": scene,
+        "flags": list(flags),
+        "python": os.path.normcase(os.path.abspath(python_path)) if os.path.exists(python_path) else python_path,
+        "manim_version": manim_version or get_manim_version(python_path),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+def find_scene_outputs(media_dir, scene, since=None):
+    """在 media 目录中查找某个场景的输出文件 (视频、GIF、PNG 等)。
+
+    Args:
+        media_dir (str): manim 的 media 目录。
+        scene (str): 场景名称。
+        since (float | None): 只返回修改时间不早于该时间戳的文件。
+
+    Returns:
+        list[str]: 输出文件的绝对路径列表。
+    """
+    found = []
+    for subdir in _OUTPUT_SUBDIRS:
+        root = os.path.join(media_dir, subdir)
+        for dirpath, dirnames, filenames in os.walk(root):
+            # 跳过分段视频等中间文件
+            dirnames[:] = [d for d in dirnames if d not in ("partial_movie_files", "sections")]
+            for filename in filenames:
+                stem, ext = os.path.splitext(filename)
+                if ext.lower() not in _OUTPUT_EXTENSIONS:
+                    continue
+                if stem != scene and not stem.startswith(scene + "_ManimCE"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                if since is not None and os.path.getmtime(path) < since - 1:
+                    continue
+                found.append(path)
+    return sorted(found)
+
+def _copy_file(src, dst):
+    """原子地复制文件。
+
+    不使用硬链接：manim 重新渲染时会原地覆盖输出文件，硬链接会连带改写缓存内容。
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = dst + f".{os.getpid()}.tmp"
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+def _matches(path, item):
+    """media 目录中的文件是否与缓存条目中的文件内容相同 (大小相同的文件可能来自同一场景的另一次渲染)。"""
+    try:
+        return (os.path.getsize(path) == item["size"] and "sha256" in item
+                and _file_sha256(path) == item["sha256"])
+    except OSError:
+        return False
+
+class RenderCache:
+    """基于内容寻址的渲染结果缓存。
+
+    每个条目以 make_cache_key 计算的键存放在 <cache_dir>/objects/<key>/ 下，
+    记录相对于 media 目录的输出路径。命中时把文件恢复到调用方的 media 目录
+    (已存在且大小一致的文件直接复用)。超过容量上限时按最近使用时间淘汰。
+
+    界面和 batch_render.py 可能同时使用同一个缓存目录：每次读写索引都持有跨进程的文件锁，
+    并在锁内重新读取磁盘上的索引，不会覆盖其他进程写入的条目。
+    """
+
+    INDEX_FILE = "index.json"
+    LOCK_FILE = "index.lock"
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir (str | None): 缓存目录，默认为 get_default_cache_dir()。
+            max_bytes (int): 缓存容量上限 (字节)。
+        """
+        self.cache_dir = cache_dir or get_default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None
+
+    # --- 索引读写 --- #
+    def _index_path(self):
+        return os.path.join(self.cache_dir, self.INDEX_FILE)
+
+    def _object_dir(self, key):
+        return os.path.join(self.cache_dir, "objects", key)
+
+    @contextmanager
+    def _locked(self):
+        """持有线程锁和跨进程文件锁，并从磁盘重新读取索引。"""
+        with self._lock, FileLock(os.path.join(self.cache_dir, self.LOCK_FILE)):
+            try:
+                with open(self._index_path(), 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            yield self._index
+
+    def _save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._index_path() + f".{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._index_path())
+
+    # --- 公共接口 --- #
+    def describe(self, command_list):
+        """计算命令对应的缓存键。
+
+        Returns:
+            tuple[str, dict] | None: (缓存键, parse_manim_command 的结果)；
+                                     命令不是单场景渲染时返回 None。
+        """
+        info = parse_manim_command(command_list)
+        if info is None or len(info["scenes"]) != 1 or "-a" in info["flags"] \
+                or not os.path.isfile(info["script"]):
+            return None
+        key = make_cache_key(info["python"], info["script"], info["scenes"][0], info["flags"])
+        return key, info
+
+    def is_fresh(self, command_list):
+        """命令对应的场景是否未改变 (缓存中有可用的输出)，不恢复文件。"""
+        described = self.describe(command_list)
+        if described is None:
+            return False
+        key = described[0]
+        with self._locked() as index:
+            entry = index.get(key)
+            return entry is not None and all(
+                os.path.isfile(os.path.join(self._object_dir(key), item["relpath"])) for item in entry["files"])
+
+    def lookup(self, key, media_dir):
+        """查找缓存条目，命中时把输出文件恢复到 media_dir。
+
+        Returns:
+            list[str] | None: 恢复后的输出文件路径；未命中时返回 None。
+        """
+        with self._locked() as index:
+            entry = index.get(key)
+            if entry is None:
+                return None
+            restored = []
+            try:
+                for item in entry["files"]:
+                    src = os.path.join(self._object_dir(key), item["relpath"])
+                    dst = os.path.join(media_dir, item["relpath"])
+                    if not _matches(dst, item):
+                        _copy_file(src, dst)
+                    restored.append(dst)
+            except OSError:
+                # 缓存文件已损坏或被删除：丢弃该条目
+                self._remove_entry(key)
+                self._save()
+                return None
+            entry["last_used"] = time.time()
+            self._save()
+            return restored
+
+    def store(self, key, media_dir, output_files, script=None, scene=None):
+        """把一次成功渲染的输出文件存入缓存，并按容量上限淘汰旧条目。"""
+        files = []
+        with self._locked() as index:
+            object_dir = self._object_dir(key)
+            try:
+                for path in output_files:
+                    relpath = os.path.relpath(path, media_dir)
+                    if relpath.startswith(".."):
+                        continue
+                    _copy_file(path, os.path.join(object_dir, relpath))
+                    files.append({"relpath": relpath, "size": os.path.getsize(path), "sha256": _file_sha256(path)})
+            except OSError as e:
+                print(f"写入渲染缓存时出错: {e}")
+                shutil.rmtree(object_dir, ignore_errors=True)
+                return
+            if not files:
+                return
+            now = time.time()
+            index[key] = {
+                "script": script,
+                "scene": scene,
+                "files": files,
+                "size": sum(item["size"] for item in files),
+                "created": now,
+                "last_used": now,
+            }
+            self._evict_locked()
+            self._save()
+
+    def invalidate(self, key=None, script_path=None, scene=None):
+        """显式删除缓存条目。
+
+        Args:
+            key (str | None): 要删除的缓存键。
+            script_path (str | None): 删除该脚本的所有条目。
+            scene (str | None): 与 script_path 一起使用时只删除该场景的条目。
+
+        Returns:
+            int: 删除的条目数量。
+        """
+        script_path = os.path.abspath(script_path) if script_path else None
+        with self._locked() as index:
+            keys = []
+            for entry_key, entry in index.items():
+                if key is not None and entry_key == key:
+                    keys.append(entry_key)
+                elif script_path is not None and entry.get("script") == script_path \
+                        and (scene is None or entry.get("scene") == scene):
+                    keys.append(entry_key)
+            for entry_key in keys:
+                self._remove_entry(entry_key)
+            if keys:
+                self._save()
+            return len(keys)
+
+    def evict(self, max_bytes=None):
+        """按最近使用时间淘汰条目，直到总大小不超过容量上限。"""
+        with self._locked():
+            removed = self._evict_locked(max_bytes)
+            if removed:
+                self._save()
+            return removed
+
+    def total_size(self):
+        """返回缓存中所有条目的总大小 (字节)。"""
+        with self._locked() as index:
+            return sum(entry.get("size", 0) for entry in index.values())
+
+    def _evict_locked(self, max_bytes=None):
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        index = self._index
+        total = sum(entry.get("size", 0) for entry in index.values())
+        removed = 0
+        for key in sorted(index, key=lambda k: index[k].get("last_used", 0)):
+            if total <= budget:
+                break
+            total -= index[key].get("size", 0)
+            self._remove_entry(key)
+            removed += 1
+        # 清理索引中没有记录的对象目录 (例如旧版本并发写入索引时丢失的条目)
+        objects_dir = os.path.join(self.cache_dir, "objects")
+        try:
+            orphans = [name for name in os.listdir(objects_dir) if name not in index]
+        except OSError:
+            orphans = []
+        for name in orphans:
+            shutil.rmtree(os.path.join(objects_dir, name), ignore_errors=True)
+        return removed + len(orphans)
+
+    def _remove_entry(self, key):
+        self._index.pop(key, None)
+        shutil.rmtree(self._object_dir(key), ignore_errors=True)
+
+# 示例用法
+if __name__ == '__main__':
+    cache = RenderCache()
+    print(f"缓存目录: {cache.cache_dir}")
+    print(f"当前缓存大小: {cache.total_size() / 1024 ** 2:.1f} MiB")
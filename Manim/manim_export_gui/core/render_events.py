@@ -0,0 +1,263 @@
+# core/render_events.py
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+# tqdm 进度条，例如:
+# "Animation 3: Create(ThreeDAxes), etc.:  45%|####5     | 27/60 [00:01<00:01, 25.30it/s]"
+_PROGRESS_PATTERN = re.compile(r"Animation\s+(\d+):\s*(.*?):\s+(\d+)%\|")
+_FRAMES_PATTERN = re.compile(r"\|\s*(\d+)/(\d+)")
+_RATE_PATTERN = re.compile(r"([\d.]+)\s*(it/s|s/it)")
+_REMAINING_PATTERN = re.compile(r"<\s*((?:\d+:)?\d+:\d+)")
+# manim 的输出文件提示: "File ready at '/path/to/Scene.mp4'" (路径可能在下一行)
+_FILE_READY_PATTERN = re.compile(r"File ready at\s*'([^']+)'", re.S)
+# manim 在场景结束时输出的动画数量: "Played 7 animations"
+_PLAYED_PATTERN = re.compile(r"Played\s+(\d+)\s+animations?")
+
+def _parse_clock(value):
+    """把 "01:23" 或 "1:02:03" 转换为秒数。"""
+    seconds = 0
+    for part in value.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+@dataclass
+class RenderEvent:
+    """渲染事件基类。job 为所属任务名称 (由调度器填写，单任务时为 None)。"""
+    job: Optional[str] = field(default=None, kw_only=True)
+
+    @property
+    def text(self):
+        """用于日志显示的文本；空字符串表示该事件不产生日志。"""
+        return ""
+
+@dataclass
+class LogLine(RenderEvent):
+    """普通日志文本 (一行或多行，以换行结尾)。"""
+    line: str
+
+    @property
+    def text(self):
+        return self.line
+
+@dataclass
+class AnimationStarted(RenderEvent):
+    """开始渲染第 index 个动画 (从 0 开始)；total 未知时为 None。"""
+    index: int
+    name: str
+    total: Optional[int] = None
+
+@dataclass
+class AnimationProgress(RenderEvent):
+    """当前动画的帧进度。"""
+    index: int
+    total: Optional[int]              # 动画总数 (未知时为 None)
+    percent: int                      # 当前动画的帧百分比
+    frame: Optional[int] = None
+    frame_total: Optional[int] = None
+    it_per_sec: Optional[float] = None
+    remaining_seconds: Optional[int] = None
+    raw: str = ""
+
+    @property
+    def text(self):
+        return self.raw + "\r" # 以 \r 结尾表示原地刷新的进度条
+
+@dataclass
+class AnimationFinished(RenderEvent):
+    """第 index 个动画渲染完毕，用于统计每个动画的吞吐量。"""
+    index: int
+    frames: Optional[int]
+    duration: float
+    it_per_sec: Optional[float] = None
+
+@dataclass
+class FileReady(RenderEvent):
+    """manim 报告的输出文件路径。"""
+    path: str
+
+@dataclass
+class ScenePlayed(RenderEvent):
+    """场景结束时 manim 报告的动画总数。"""
+    animation_count: int
+
+@dataclass
+class ProcessStarted(RenderEvent):
+    """渲染进程已启动 (用于采样进程树的资源占用)。"""
+    pid: int
+
+@dataclass
+class RenderFinished(RenderEvent):
+    """渲染进程结束。return_code 为 None 表示进程未能启动。"""
+    return_code: Optional[int]
+    duration: float
+    cached: bool = False
+    cancelled: bool = False
+
+    @property
+    def text(self):
+        if self.cancelled:
+            return f"\n--- 渲染已取消，返回代码: {self.return_code} ---"
+        return f"\n--- 渲染进程结束，返回代码: {self.return_code} ---"
+
+def prefix_lines(prefix, text):
+    """给文本中的每个非空行加上前缀，用于区分并行任务的输出。"""
+    if not prefix:
+        return text
+    lines = text.splitlines(keepends=True) or [text]
+    return "".join(prefix + line if line.strip() else line for line in lines)
+
+def tag_job(event, job_name):
+    """把事件标记为属于 job_name 的任务 (嵌套任务的名称依次拼接)，返回该事件。"""
+    event.job = job_name if event.job is None else f"{job_name} {event.job}"
+    return event
+
+def format_event(event):
+    """返回事件的显示文本，属于某个任务时逐行加上 "[任务名称] " 前缀。"""
+    text = event.text
+    if not text or event.job is None:
+        return text
+    return prefix_lines(f"[{event.job}] ", text)
+
+class RenderEventParser:
+    """把 OutputSplitter 回传的文本解析为事件。
+
+    完整行原样作为 LogLine 回传，同时识别动画开始/结束、帧进度、输出文件路径
+    和动画总数；以 "\\\\r" 结尾的进度条只产生 AnimationProgress 事件。
+    """
+
+    def __init__(self, event_callback, total_animations=None):
+        """
+        Args:
+            event_callback (callable): 接收 RenderEvent 的函数。
+            total_animations (int | None): 已知的动画总数 (例如静态估算或 --dry_run 的结果)。
+        """
+        self.event_callback = event_callback
+        self.total_animations = total_animations
+        self._current = None              # 当前动画: (编号, 开始时间, 最近一次进度)
+        self._file_tail = ""              # "File ready at" 之后尚未出现路径的文本
+
+    def feed(self, text):
+        """解析一段输出文本。"""
+        if text.endswith("\r"):
+            self._parse_progress(text.rstrip("\r"))
+            return
+        self.event_callback(LogLine(text))
+        for line in text.splitlines():
+            # tqdm 结束时以换行输出最终的进度条，表示该动画已完成
+            if "Animation" in line and self._parse_progress(line):
+                self._finish_current()
+        self._parse_file_ready(text)
+        for match in _PLAYED_PATTERN.finditer(text):
+            self.event_callback(ScenePlayed(int(match.group(1))))
+
+    def close(self):
+        """输出结束：结束当前动画。"""
+        self._finish_current()
+
+    def _parse_progress(self, line):
+        """解析一条进度条文本，成功时返回 True。"""
+        match = _PROGRESS_PATTERN.search(line)
+        if not match:
+            return False
+        index = int(match.group(1))
+        if self._current is None or self._current[0] != index:
+            self._finish_current()
+            self._current = [index, time.monotonic(), None]
+            self.event_callback(AnimationStarted(index, match.group(2).strip(), self.total_animations))
+
+        frames = _FRAMES_PATTERN.search(line, match.end())
+        rate = _RATE_PATTERN.search(line)
+        remaining = _REMAINING_PATTERN.search(line)
+        it_per_sec = None
+        if rate:
+            value = float(rate.group(1))
+            it_per_sec = value if rate.group(2) == "it/s" else (1.0 / value if value else None)
+        progress = AnimationProgress(
+            index=index,
+            total=self.total_animations,
+            percent=int(match.group(3)),
+            frame=int(frames.group(1)) if frames else None,
+            frame_total=int(frames.group(2)) if frames else None,
+            it_per_sec=it_per_sec,
+            remaining_seconds=_parse_clock(remaining.group(1)) if remaining else None,
+            raw=line,
+        )
+        self._current[2] = progress
+        self.event_callback(progress)
+        return True
+
+    def _finish_current(self):
+        if self._current is None:
+            return
+        index, started, last = self._current
+        self._current = None
+        self.event_callback(AnimationFinished(
+            index=index,
+            frames=last.frame_total if last else None,
+            duration=time.monotonic() - started,
+            it_per_sec=last.it_per_sec if last else None,
+        ))
+
+    def _parse_file_ready(self, text):
+        text = self._file_tail + text
+        self._file_tail = ""
+        matches = list(_FILE_READY_PATTERN.finditer(text))
+        for match in matches:
+            # rich 在窄终端下可能把路径折行，去掉换行和缩进
+            path = re.sub(r"\s*\n\s*", "", match.group(1))
+            self.event_callback(FileReady(path))
+        rest = text[matches[-1].end():] if matches else text
+        if "File ready at" in rest:
+            self._file_tail = rest[rest.index("File ready at"):]
+
+class ProgressTracker:
+    """根据事件估算单个渲染任务的完成比例和剩余时间 (ETA)。"""
+
+    def __init__(self, total_animations=None):
+        self.total_animations = total_animations
+        self.completed_durations = [] # 已完成动画的耗时
+        self.current = None           # 最近一次 AnimationProgress
+        self.finished = False
+        self.return_code = None
+
+    def handle(self, event):
+        """更新状态。"""
+        if isinstance(event, AnimationProgress):
+            self.current = event
+            if event.total:
+                self.total_animations = event.total
+        elif isinstance(event, AnimationFinished):
+            self.completed_durations.append(event.duration)
+        elif isinstance(event, ScenePlayed):
+            self.total_animations = event.animation_count
+        elif isinstance(event, RenderFinished):
+            self.finished = True
+            self.return_code = event.return_code
+
+    def fraction(self):
+        """完成比例 (0~1)；动画总数未知时返回当前动画的帧比例。"""
+        if self.finished:
+            return 1.0
+        current_fraction = self.current.percent / 100 if self.current else 0.0
+        if self.total_animations:
+            index = self.current.index if self.current else len(self.completed_durations)
+            return min(1.0, (index + current_fraction) / self.total_animations)
+        return current_fraction
+
+    def eta_seconds(self):
+        """剩余时间估计 (秒)；无法估计时返回 None。
+
+        当前动画使用 tqdm 的剩余时间，之后的动画按已完成动画的平均耗时估算。
+        """
+        if self.finished:
+            return 0
+        if self.current is None:
+            return None
+        remaining = self.current.remaining_seconds or 0
+        if self.total_animations and self.completed_durations:
+            average = sum(self.completed_durations) / len(self.completed_durations)
+            remaining += average * max(0, self.total_animations - self.current.index - 1)
+        return remaining
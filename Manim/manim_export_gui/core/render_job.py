@@ -0,0 +1,192 @@
+# core/render_job.py
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    from core.render_events import FileReady
+except ImportError:
+    from render_events import FileReady
+
+# 终止进程组时，从 SIGTERM 到 SIGKILL 的等待时间 (秒)
+KILL_GRACE_SECONDS = 3.0
+
+def process_group_kwargs():
+    """返回让子进程成为新进程组组长的 Popen 参数。
+
+    这样取消时可以连同它派生的 ffmpeg、latex 等进程一起终止。
+    """
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+def _has_exited(process):
+    """进程是否已退出 (支持 subprocess.Popen 和 asyncio 的 Process)。"""
+    poll = getattr(process, "poll", None)
+    return (poll() if poll is not None else process.returncode) is not None
+
+def kill_process_tree(process, grace=KILL_GRACE_SECONDS):
+    """终止以 process 为组长的整个进程组 (Windows 上为整个进程树)。
+
+    POSIX 上先发送 SIGTERM，grace 秒后仍未退出则发送 SIGKILL。
+    """
+    if _has_exited(process):
+        return
+    if sys.platform == "win32":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                       capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+
+    def force_kill():
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    if grace:
+        timer = threading.Timer(grace, lambda: not _has_exited(process) and force_kill())
+        timer.daemon = True
+        timer.start()
+    else:
+        force_kill()
+
+@dataclass
+class RenderResult:
+    """渲染任务的结果。"""
+    return_code: Optional[int]          # 返回代码；多个任务时为第一个失败任务的代码
+    duration: float                     # 墙钟耗时 (秒)
+    cancelled: bool = False
+    timed_out: bool = False
+    output_files: list = field(default_factory=list)  # FileReady 报告的输出文件
+    job_results: dict = field(default_factory=dict)   # {任务名称: 返回代码}
+
+    @property
+    def ok(self):
+        return self.return_code == 0 and not self.cancelled
+
+class RenderJob:
+    """正在运行的渲染任务的句柄。
+
+    执行渲染的代码通过 attach() 登记终止函数 (例如终止子进程组)，cancel() 时
+    逐个调用；之后启动的进程在 attach() 时会被立即终止。timeout 为墙钟超时，
+    到期后自动取消。wait() 返回 RenderResult。
+
+    终止函数接受一个可选参数 force：为 True 时立即强制终止 (POSIX 上直接发送 SIGKILL)。
+    """
+
+    def __init__(self, timeout=None):
+        """
+        Args:
+            timeout (float | None): 墙钟超时 (秒)，为 None 时不限制。
+        """
+        self.timeout = timeout
+        self.cancelled = False
+        self.timed_out = False
+        self._killers = set()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._result = None
+        self._timer = None
+        self._start = time.monotonic()
+        self._output_files = []
+
+    def start_timer(self):
+        """开始计时 (在任务启动时调用)。"""
+        self._start = time.monotonic()
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expire(self):
+        self.timed_out = True
+        self.cancel()
+
+    def cancel(self, force=False):
+        """取消任务：终止所有正在运行的进程，尚未启动的进程不再启动。
+
+        Args:
+            force (bool): 为 True 时立即强制终止，不等待 SIGTERM 的宽限时间。
+        """
+        with self._lock:
+            self.cancelled = True
+            killers = list(self._killers)
+        for kill in killers:
+            try:
+                kill(force=True) if force else kill()
+            except Exception as e:
+                print(f"终止渲染进程时出错: {e}")
+
+    def shutdown(self, grace=KILL_GRACE_SECONDS):
+        """取消任务并同步等待结束，grace 秒后仍在运行的进程组被立即强制终止 (程序退出前调用)。
+
+        cancel() 的 SIGKILL 由后台定时器发送，程序退出时定时器线程可能来不及执行，
+        忽略 SIGTERM 的 manim / ffmpeg 进程会残留。
+
+        Returns:
+            bool: 任务是否已结束。
+        """
+        self.cancel()
+        if self._done.wait(grace):
+            return True
+        self.cancel(force=True)
+        return self._done.wait(1.0)
+
+    def attach(self, kill):
+        """登记一个终止函数；任务已被取消时立即调用它。"""
+        with self._lock:
+            if not self.cancelled:
+                self._killers.add(kill)
+                return
+        kill()
+
+    def detach(self, kill):
+        """进程结束后注销其终止函数。"""
+        with self._lock:
+            self._killers.discard(kill)
+
+    def observe(self, event):
+        """记录事件中的输出文件路径。"""
+        if isinstance(event, FileReady):
+            with self._lock:
+                self._output_files.append(event.path)
+
+    def finish(self, return_code, job_results=None):
+        """标记任务结束 (由执行线程调用)。"""
+        if self._timer is not None:
+            self._timer.cancel()
+        with self._lock:
+            output_files = list(self._output_files)
+        self._result = RenderResult(
+            return_code=return_code,
+            duration=time.monotonic() - self._start,
+            cancelled=self.cancelled,
+            timed_out=self.timed_out,
+            output_files=output_files,
+            job_results=dict(job_results or {}),
+        )
+        self._done.set()
+
+    def done(self):
+        """任务是否已结束。"""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """等待任务结束。
+
+        Returns:
+            RenderResult | None: 任务结果；timeout 秒内未结束时返回 None。
+        """
+        if not self._done.wait(timeout):
+            return None
+        return self._result
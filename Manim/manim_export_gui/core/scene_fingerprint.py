@@ -0,0 +1,212 @@
+# core/scene_fingerprint.py
+
+import ast
+import hashlib
+import os
+import threading
+
+try:
+    from core.script_parser import _iter_class_defs
+except ImportError:
+    from script_parser import _iter_class_defs
+
+# 指纹缓存 {绝对路径: (各文件的 (路径, mtime_ns, 文件大小), {类名: 指纹})}，包括导入的同目录脚本
+_fingerprint_cache = {}
+_fingerprint_cache_lock = threading.Lock()
+
+def _is_docstring(node):
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+def _is_main_guard(node):
+    """是否为 if __name__ == '__main__': 块 (manim 导入脚本时不会执行)。"""
+    test = node.test if isinstance(node, ast.If) else None
+    return isinstance(test, ast.Compare) and isinstance(test.left, ast.Name) and test.left.id == "__name__"
+
+def _normalize(tree):
+    """去掉模块、类和函数的文档字符串 (只修改文档不影响渲染结果)。"""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) \
+                and node.body and _is_docstring(node.body[0]):
+            node.body = node.body[1:] or [ast.Pass()]
+    return tree
+
+def _local_module_path(node, base_dir):
+    """导入语句导入的是 base_dir 中的脚本时返回该文件的路径，否则返回 None。"""
+    if base_dir is None:
+        return None
+    if isinstance(node, ast.ImportFrom):
+        names = [node.module] if node.module else []
+    else:
+        names = [alias.name for alias in node.names]
+    for name in names:
+        path = os.path.join(base_dir, *name.split(".")) + ".py"
+        if os.path.isfile(path):
+            return path
+    return None
+
+def _file_digest(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return ""
+
+def _statement_dump(node, base_dir, dependencies=None):
+    """语句的规范化表示；导入同目录的脚本时包括该脚本的内容摘要 (其中的辅助函数改变时指纹也改变)。"""
+    dump = _dump(node)
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        local_path = _local_module_path(node, base_dir)
+        if local_path:
+            dump += "@" + _file_digest(local_path)
+            if dependencies is not None:
+                dependencies.add(local_path)
+    return dump
+
+def _defined_names(node):
+    """返回模块级语句定义的名称 (函数、类、赋值目标、导入的名称)。"""
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return {node.name}
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return {(alias.asname or alias.name).split(".")[0] for alias in node.names if alias.name != "*"}
+    targets = []
+    if isinstance(node, ast.Assign):
+        targets = node.targets
+    elif isinstance(node, (ast.AnnAssign, ast.AugAssign)):
+        targets = [node.target]
+    names = set()
+    for target in targets:
+        for sub in ast.walk(target):
+            if isinstance(sub, ast.Name) and isinstance(sub.ctx, ast.Store):
+                names.add(sub.id)
+    return names
+
+def _referenced_names(node):
+    """返回语句中读取的所有名称。"""
+    return {sub.id for sub in ast.walk(node) if isinstance(sub, ast.Name) and isinstance(sub.ctx, ast.Load)}
+
+def _dump(node):
+    # ast.dump 默认不包含行号，只改变空行、注释或位置时指纹不变
+    return ast.dump(node)
+
+def compute_scene_fingerprints(content, base_dir=None, dependencies=None):
+    """计算脚本中每个类的指纹，只在类本身或它用到的模块级符号改变时变化。
+
+    指纹覆盖:
+        类定义本身 (包括基类、方法和类体)
+        类中 (间接) 引用的模块级函数、类、常量和导入
+        不定义名称的模块级语句 (例如 config.pixel_height = 1080、from manim import *)，它们影响所有场景
+        导入的同目录脚本的内容
+    注释、空行、格式和文档字符串的改变以及 if __name__ == '__main__': 块不影响指纹。
+
+    Args:
+        content (str): 脚本源码。
+        base_dir (str | None): 脚本所在目录，用于找出导入的同目录脚本。
+        dependencies (set | None): 提供时加入指纹用到的同目录脚本路径。
+
+    Returns:
+        dict: {类名: 十六进制 SHA-256 指纹}。
+
+    Raises:
+        SyntaxError: 源码无法解析。
+    """
+    tree = _normalize(ast.parse(content))
+    definitions = {} # {名称: [定义该名称的模块级语句]}
+    shared = []      # 不定义名称的模块级语句
+    for node in tree.body:
+        names = _defined_names(node)
+        if names:
+            for name in names:
+                definitions.setdefault(name, []).append(node)
+        elif not isinstance(node, ast.Pass) and not _is_main_guard(node):
+            shared.append(node)
+    shared_dump = "\n".join(_statement_dump(node, base_dir, dependencies) for node in shared)
+
+    fingerprints = {}
+    for class_node in _iter_class_defs(tree.body):
+        # 沿引用关系收集类用到的模块级语句
+        statements, seen_ids = [], set()
+        pending = list(_referenced_names(class_node))
+        visited = set()
+        while pending:
+            name = pending.pop()
+            if name in visited:
+                continue
+            visited.add(name)
+            for node in definitions.get(name, ()):
+                if id(node) in seen_ids or node is class_node:
+                    continue
+                seen_ids.add(id(node))
+                statements.append(node)
+                pending.extend(_referenced_names(node))
+        # 按源码顺序排列，保证结果与遍历顺序无关
+        statements.sort(key=lambda node: (node.lineno, node.col_offset))
+        digest = hashlib.sha256()
+        digest.update(_dump(class_node).encode("utf-8"))
+        for node in statements:
+            digest.update(b"\0" + _statement_dump(node, base_dir, dependencies).encode("utf-8"))
+        digest.update(b"\0" + shared_dump.encode("utf-8"))
+        fingerprints[class_node.name] = digest.hexdigest()
+    return fingerprints
+
+def get_scene_fingerprints(file_path):
+    """读取脚本并计算各个类的指纹；文件无法读取或解析时返回 None。
+
+    结果按脚本及其导入的同目录脚本的 (路径, 修改时间, 文件大小) 缓存。
+    """
+    path = os.path.abspath(file_path)
+    try:
+        with _fingerprint_cache_lock:
+            cached = _fingerprint_cache.get(path)
+        if cached is not None and all(_stat_key(dependency) == state for dependency, state in cached[0]):
+            return dict(cached[1])
+        state = _stat_key(path)
+        dependencies = set()
+        with open(path, "r", encoding="utf-8") as f:
+            fingerprints = compute_scene_fingerprints(f.read(), os.path.dirname(path), dependencies)
+    except (OSError, SyntaxError, ValueError) as e:
+        print(f"计算场景指纹时出错 {file_path}: {e}")
+        return None
+    states = [(path, state)] + [(dependency, _stat_key(dependency)) for dependency in sorted(dependencies)]
+    with _fingerprint_cache_lock:
+        _fingerprint_cache[path] = (states, dict(fingerprints))
+    return fingerprints
+
+def _stat_key(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def get_scene_fingerprint(file_path, scene):
+    """返回单个场景的指纹；找不到场景或无法解析时返回 None。"""
+    fingerprints = get_scene_fingerprints(file_path)
+    return fingerprints.get(scene) if fingerprints else None
+
+def clear_fingerprint_cache():
+    with _fingerprint_cache_lock:
+        _fingerprint_cache.clear()
+
+def changed_scenes(old, new, scene_names):
+    """比较两次指纹，返回 scene_names 中新增或指纹改变的场景 (保持 scene_names 的顺序)。"""
+    return [name for name in scene_names if name in new and old.get(name) != new[name]]
+
+# 示例用法
+if __name__ == '__main__':
+    before = """
+from manim import *
+SPEED = 1
+def helper():
+    return Circle()
+class A(Scene):
+    def construct(self):
+        self.play(Create(helper()), run_time=SPEED)
+class B(Scene):
+    def construct(self):
+        self.wait()
+"""
+    after = before.replace("SPEED = 1", "SPEED = 2").replace("self.wait()", "self.wait()  # 注释不影响指纹")
+    old, new = compute_scene_fingerprints(before), compute_scene_fingerprints(after)
+    print(changed_scenes(old, new, ["A", "B"])) # 应该输出 ['A']
+    documented = after.replace("def construct(self):", 'def construct(self):\n        """文档字符串不影响指纹"""')
+    print(changed_scenes(new, compute_scene_fingerprints(documented), ["A", "B"])) # 应该输出 []
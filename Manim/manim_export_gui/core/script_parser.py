@@ -2,15 +2,113 @@
 
 import re
 import ast
+import glob
 import inspect
+import os
+import threading
 
 # 定义所有有效的 Manim 场景基类名称（不含 'manim.' 前缀）
 VALID_SCENE_BASE_NAMES = {"Scene", "ThreeDScene", "MovingCameraScene", "ZoomedScene"} 
 # 可以根据需要添加更多 Manim 的场景基类
 
+# 场景列表缓存 {绝对路径: (mtime_ns, 文件大小, 场景名称列表)}，文件未改变时直接返回上次的结果
+_scene_cache = {}
+_scene_cache_lock = threading.Lock()
+
+def _dotted_name(node):
+    """把 Name / Attribute 表达式转换为点分名称 (例如 "manim.Scene")；其他写法返回 None。"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+def _iter_class_defs(body):
+    """只遍历模块顶层和类内部嵌套的 ClassDef 节点 (不进入函数体和其他语句)。"""
+    for node in body:
+        if isinstance(node, ast.ClassDef):
+            yield node
+            yield from _iter_class_defs(node.body)
+
+def parse_module_summary(content):
+    """提取模块中的类定义和模块级导入，用于解析场景的继承关系。
+
+    Args:
+        content (str): 脚本源码。
+
+    Returns:
+        dict: classes 为 {类名: [基类的点分名称]}，imports 为 {本地名称: 导入目标}
+            (例如 from manim import Scene as S 得到 {"S": "manim.Scene"}，相对导入保留前导的 "."),
+            star_imports 为 from X import * 的模块列表。
+
+    Raises:
+        SyntaxError: 源码无法解析。
+    """
+    tree = ast.parse(content)
+    imports, star_imports = {}, []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    imports[alias.asname] = alias.name
+                else: # import a.b 绑定的是顶层包 a
+                    head = alias.name.split(".")[0]
+                    imports[head] = head
+        elif isinstance(node, ast.ImportFrom):
+            module = "." * node.level + (node.module or "")
+            for alias in node.names:
+                if alias.name == "*":
+                    star_imports.append(module)
+                else:
+                    separator = "" if module.endswith(".") else "."
+                    imports[alias.asname or alias.name] = f"{module}{separator}{alias.name}"
+    classes = {}
+    for node in _iter_class_defs(tree.body):
+        classes[node.name] = [name for name in (_dotted_name(base) for base in node.bases) if name]
+    return {"classes": classes, "imports": imports, "star_imports": star_imports}
+
+def is_manim_scene_base(target):
+    """点分名称是否指向 manim 的场景基类 (例如 "manim.Scene"、"manim.scene.scene.Scene")。"""
+    parts = target.split(".")
+    return parts[0] == "manim" and parts[-1] in VALID_SCENE_BASE_NAMES
+
+def _local_scene_names(summary):
+    """只根据本文件的信息找出场景类 (包括间接继承和 from manim import Scene as S 这样的别名)。"""
+    classes, imports = summary["classes"], summary["imports"]
+
+    def base_is_scene(base, seen):
+        head, _, rest = base.partition(".")
+        if head in imports:
+            return is_manim_scene_base(imports[head] + ("." + rest if rest else ""))
+        if not rest and head in VALID_SCENE_BASE_NAMES: # from manim import * 后直接使用基类名
+            return True
+        if not rest and head in classes:
+            return class_is_scene(head, seen)
+        return is_manim_scene_base(base)
+
+    def class_is_scene(name, seen):
+        if name in seen: # 避免循环继承
+            return False
+        seen = seen | {name}
+        return any(base_is_scene(base, seen) for base in classes[name])
+
+    # 确保不是基类本身
+    return [name for name in classes if name not in VALID_SCENE_BASE_NAMES and class_is_scene(name, frozenset())]
+
+def _parse_scene_names(content):
+    """从源码中找出 (直接或间接) 继承有效场景基类的类名。"""
+    return _local_scene_names(parse_module_summary(content))
+
 def get_scene_names(file_path):
     """解析 Python 文件以查找继承自 Manim 场景基类的类名。
 
+    只使用本文件中的信息：同一文件内的间接继承和导入别名可以识别，
+    基类来自其他脚本的场景需要使用 class_index.ClassIndex。
+    结果按 (路径, 修改时间, 文件大小) 缓存，文件未改变时不再重新解析。
+
     Args:
         file_path (str): Python 脚本的路径。
 
@@ -19,35 +117,17 @@ def get_scene_names(file_path):
                    如果文件不存在或无法解析，返回空列表。
                    如果解析出错，也返回空列表并打印错误。
     """
-    scene_names = []
+    path = os.path.abspath(file_path)
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        stat = os.stat(path)
+        with _scene_cache_lock:
+            cached = _scene_cache.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return list(cached[2])
 
         # 使用 AST (Abstract Syntax Trees)
-        tree = ast.parse(content)
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ClassDef):
-                # 检查是否继承自有效的 Manim 场景基类
-                is_manim_scene = False
-                for base in node.bases:
-                    base_name = None
-                    # 情况 1: 直接继承，如 class MyScene(Scene):
-                    if isinstance(base, ast.Name):
-                        base_name = base.id
-                    # 情况 2: 带 manim 前缀，如 class MyScene(manim.Scene):
-                    elif isinstance(base, ast.Attribute) and isinstance(base.value, ast.Name) and base.value.id == 'manim':
-                        base_name = base.attr
-                    
-                    # 检查获取到的基类名是否在我们的有效列表中
-                    if base_name and base_name in VALID_SCENE_BASE_NAMES:
-                        is_manim_scene = True
-                        break # 找到一个有效基类即可
-
-                # 确保不是基类本身，并且是我们识别的场景类
-                if is_manim_scene and node.name not in VALID_SCENE_BASE_NAMES:
-                    scene_names.append(node.name)
-
+        with open(path, 'r', encoding='utf-8') as f:
+            scene_names = _parse_scene_names(f.read())
     except FileNotFoundError:
         print(f"错误：文件未找到 {file_path}")
         return []
@@ -55,8 +135,87 @@ def get_scene_names(file_path):
         print(f"解析文件时出错 {file_path}: {e}")
         return []
 
+    with _scene_cache_lock:
+        _scene_cache[path] = (stat.st_mtime_ns, stat.st_size, list(scene_names))
     return scene_names
 
+def get_scene_names_in_directory(directory, pattern="*.py", recursive=False):
+    """一次解析目录中的多个脚本。
+
+    Args:
+        directory (str): 目录路径。
+        pattern (str): 文件名匹配模式。
+        recursive (bool): 是否包含子目录。
+
+    Returns:
+        dict: {脚本绝对路径: 场景名称列表}，按路径排序，包括没有场景的脚本。
+    """
+    root = os.path.abspath(directory)
+    pattern_path = os.path.join(root, "**", pattern) if recursive else os.path.join(root, pattern)
+    return {path: get_scene_names(path)
+            for path in sorted(glob.glob(pattern_path, recursive=recursive)) if os.path.isfile(path)}
+
+def clear_scene_cache(file_path=None):
+    """清除某个脚本 (或全部脚本) 的场景列表缓存。"""
+    with _scene_cache_lock:
+        if file_path is None:
+            _scene_cache.clear()
+        else:
+            _scene_cache.pop(os.path.abspath(file_path), None)
+
+def _eval_number(node):
+    """计算只包含数字常量和四则运算的表达式 (例如 1080 * (8/9))；无法计算时返回 None。"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _eval_number(node.operand)
+        if value is not None:
+            return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp):
+        left, right = _eval_number(node.left), _eval_number(node.right)
+        if left is None or right is None:
+            return None
+        operators = {ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b, ast.Mult: lambda a, b: a * b,
+                     ast.Div: lambda a, b: a / b, ast.FloorDiv: lambda a, b: a // b}
+        operator = operators.get(type(node.op))
+        try:
+            return operator(left, right) if operator else None
+        except ZeroDivisionError:
+            return None
+    return None
+
+def get_config_overrides(file_path):
+    """查找脚本中模块级的数值型 config 赋值，例如 config.pixel_height = 1080。
+
+    这些赋值在导入脚本时执行，会覆盖命令行的质量参数 (包括输出目录中的 "1080p60" 部分)。
+    支持 config.key = ... 和 config["key"] = ... 两种写法。
+
+    Returns:
+        dict: {配置名: 数值}；文件无法解析时返回空字典。
+    """
+    overrides = {}
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError) as e:
+        print(f"解析文件时出错 {file_path}: {e}")
+        return overrides
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        value = _eval_number(node.value)
+        if value is None:
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) \
+                    and target.value.id == "config":
+                overrides[target.attr] = value
+            elif isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name) \
+                    and target.value.id == "config" and isinstance(target.slice, ast.Constant) \
+                    and isinstance(target.slice.value, str):
+                overrides[target.slice.value] = value
+    return overrides
+
 # 示例用法
 if __name__ == '__main__':
     # 创建一个临时的测试文件
@@ -80,7 +239,7 @@ class NotAScene:
     pass
 
 class DerivedFromMyScene(MyScene1):
-    pass # 这个不会被直接找到，因为它不直接继承有效的基类
+    pass # 间接继承 Scene，同样是场景
 
 class Scene: # 基类本身应该被忽略
     pass 
@@ -92,8 +251,9 @@ class ThreeDScene: # 基类本身应该被忽略
         f.write(test_content)
 
     scenes = get_scene_names(test_file)
-    print(f"找到的场景: {scenes}") # 应该输出 ['MyScene1', 'AnotherScene', 'My3DScene', 'MyMovingScene']
+    print(f"找到的场景: {scenes}") # 应该输出 ['MyScene1', 'AnotherScene', 'My3DScene', 'MyMovingScene', 'DerivedFromMyScene']
+
+    print(f"目录中的场景: {get_scene_names_in_directory('.', '_temp_test_*.py')}") # 第二次调用命中缓存
 
     # 清理临时文件
-    import os
     os.remove(test_file) 
\ No newline at end of file
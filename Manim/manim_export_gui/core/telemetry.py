@@ -0,0 +1,379 @@
+# core/telemetry.py
+
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+try:
+    from core.app_paths import get_app_cache_dir
+    from core.render_cache import parse_manim_command, _file_sha256
+    from core.render_events import ProcessStarted, FileReady, RenderFinished
+except ImportError:
+    from app_paths import get_app_cache_dir
+    from render_cache import parse_manim_command, _file_sha256
+    from render_events import ProcessStarted, FileReady, RenderFinished
+
+# 进程树采样间隔 (秒)
+SAMPLE_INTERVAL = 0.2
+# 估算耗时时参考的最近记录数量
+HISTORY_LIMIT = 20
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS renders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    script TEXT,
+    script_hash TEXT,
+    scene TEXT,
+    quality TEXT,
+    format TEXT,
+    flags TEXT,
+    wall_seconds REAL,
+    cpu_seconds REAL,
+    peak_rss_bytes INTEGER,
+    output_bytes INTEGER,
+    return_code INTEGER,
+    cached INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS renders_scene ON renders (scene, quality, format);
+"""
+
+def get_default_db_path():
+    """返回渲染记录数据库的默认路径。"""
+    return get_app_cache_dir("telemetry.sqlite3")
+
+def describe_command(command_list):
+    """从 manim 命令中提取记录所需的字段。
+
+    Returns:
+        dict | None: 包含 script、script_hash、scene、quality、format、flags 的字典；
+            不是单场景的 python -m manim 命令时返回 None。
+    """
+    info = parse_manim_command(command_list)
+    if info is None or len(info["scenes"]) != 1:
+        return None
+    flags = info["flags"]
+    quality = next((flag for flag in flags if flag.startswith("-q") and len(flag) == 3), "-qh")
+    output_format = "mp4"
+    if "--format" in flags and flags.index("--format") + 1 < len(flags):
+        output_format = flags[flags.index("--format") + 1]
+    elif "-s" in flags or "--save_last_frame" in flags:
+        output_format = "png"
+    elif "-t" in flags or "--transparent" in flags:
+        output_format = "mov"
+    try:
+        script_hash = _file_sha256(info["script"])
+    except OSError:
+        script_hash = None
+    return {
+        "script": info["script"],
+        "script_hash": script_hash,
+        "scene": info["scenes"][0],
+        "quality": quality,
+        "format": output_format,
+        "flags": " ".join(flags),
+    }
+
+def _read_proc_stat(pid):
+    """读取 /proc/<pid>/stat，返回 (父进程 id, 累计 CPU 秒数, RSS 字节数)；进程不存在时返回 None。"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # 进程名可能包含空格，从最后一个 ")" 之后开始解析
+    fields = data[data.rindex(")") + 2:].split()
+    ppid = int(fields[1])
+    # utime、stime 与已回收子进程的 cutime、cstime
+    cpu_ticks = int(fields[11]) + int(fields[12]) + int(fields[13]) + int(fields[14])
+    rss_bytes = int(fields[21]) * _PAGE_SIZE
+    return ppid, cpu_ticks / _CLOCK_TICKS, rss_bytes
+
+def _proc_children(pid):
+    """从 /proc/<pid>/task/*/children 读取直接子进程 (进程已退出时返回空列表)。"""
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return []
+    children = []
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                children.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue # 线程已退出
+    return children
+
+def _children_file_supported():
+    """内核是否提供 /proc/<pid>/task/<tid>/children (CONFIG_PROC_CHILDREN)。"""
+    return os.path.exists(f"/proc/self/task/{os.getpid()}/children")
+
+class ProcessTreeSampler:
+    """在后台线程中定时采样若干进程及其全部子孙进程的 RSS 和 CPU 时间 (基于 /proc)。
+
+    峰值 RSS 为同一时刻整棵进程树 RSS 之和的最大值 (包括 ffmpeg、latex 等子进程)。
+    最后一次采样之后的 CPU 时间不计入，结果略偏小。
+    没有 /proc 的平台上不采样，结果为 None。
+
+    每次采样只从根进程沿 /proc/<pid>/task/*/children 向下遍历，开销与进程树大小成正比，
+    并行任务较多时不会每个任务都扫描整个 /proc；内核不提供 children 文件时才扫描全部进程。
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.supported = os.path.isdir("/proc/self")
+        self._walk_children = self.supported and _children_file_supported()
+        self.peak_rss_bytes = None
+        self._roots = set()
+        self._cpu_seconds = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, pid):
+        """开始采样以 pid 为根的进程树。"""
+        if not self.supported:
+            return
+        with self._lock:
+            self._roots.add(pid)
+        self.sample()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def _tree_stats(self, roots):
+        """返回 {pid: (ppid, CPU 秒, RSS 字节)}，包括 roots 及其全部子孙进程。"""
+        stats = {}
+        if self._walk_children:
+            pending = list(roots)
+            while pending:
+                pid = pending.pop()
+                if pid in stats:
+                    continue
+                stat = _read_proc_stat(pid)
+                if stat is None:
+                    continue
+                stats[pid] = stat
+                pending.extend(_proc_children(pid))
+            return stats
+        for name in os.listdir("/proc"):
+            if name.isdigit():
+                stat = _read_proc_stat(int(name))
+                if stat is not None:
+                    stats[int(name)] = stat
+        tree = set(pid for pid in roots if pid in stats)
+        # 按父进程关系扩展到全部子孙进程
+        changed = True
+        while changed:
+            changed = False
+            for pid, (ppid, _, _) in stats.items():
+                if ppid in tree and pid not in tree:
+                    tree.add(pid)
+                    changed = True
+        return {pid: stats[pid] for pid in tree}
+
+    def sample(self):
+        """采样一次。"""
+        with self._lock:
+            roots = set(self._roots)
+        stats = self._tree_stats(roots)
+        with self._lock:
+            tree = set(stats)
+            if not tree:
+                return
+            rss = sum(stats[pid][2] for pid in tree)
+            cpu = sum(stats[pid][1] for pid in tree)
+            self.peak_rss_bytes = max(self.peak_rss_bytes or 0, rss)
+            self._cpu_seconds = max(self._cpu_seconds or 0.0, cpu)
+
+    @property
+    def cpu_seconds(self):
+        """采样到的整棵进程树的 CPU 时间 (秒)；未采样时为 None。
+
+        已回收子进程的 CPU 时间计入父进程的 cutime/cstime，因此取各次采样之和的最大值。
+        """
+        with self._lock:
+            return self._cpu_seconds
+
+    def stop(self):
+        """停止采样。"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+class TelemetryStore:
+    """保存渲染记录的本地 SQLite 数据库，并根据历史估算渲染耗时。"""
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path (str | None): 数据库文件路径，默认为 get_default_db_path()。
+        """
+        self.db_path = db_path or get_default_db_path()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, fields):
+        """保存一条渲染记录。
+
+        Args:
+            fields (dict): describe_command 的结果加上 started、wall_seconds、cpu_seconds、
+                peak_rss_bytes、output_bytes、return_code、cached。
+        """
+        columns = ["started", "script", "script_hash", "scene", "quality", "format", "flags",
+                   "wall_seconds", "cpu_seconds", "peak_rss_bytes", "output_bytes", "return_code", "cached"]
+        values = [fields.get(column) for column in columns]
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    conn.execute(f"INSERT INTO renders ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                                 values)
+            except sqlite3.Error as e:
+                print(f"写入渲染记录时出错: {e}")
+
+    def track(self, command_list, output_callback):
+        """返回包装后的事件回调：渲染结束时把本次渲染写入数据库。
+
+        命令不是单场景的 manim 命令时原样返回 output_callback。
+        """
+        described = describe_command(command_list)
+        if described is None:
+            return output_callback
+        return TelemetryRecorder(self, described, output_callback)
+
+    def expected(self, command_list):
+        """根据历史记录估算命令的渲染耗时。
+
+        优先使用脚本内容未变时的记录，其次使用同一脚本、场景、质量和格式的记录。
+        只参考成功且未命中缓存的渲染。
+
+        Returns:
+            dict | None: seconds (中位数)、samples (记录数)、peak_rss_bytes (最大峰值内存)、
+                same_source (是否基于相同的脚本内容)；没有记录时返回 None。
+        """
+        described = describe_command(command_list)
+        if described is None:
+            return None
+        query = ("SELECT wall_seconds, peak_rss_bytes FROM renders WHERE return_code = 0 AND cached = 0 "
+                 "AND scene = ? AND quality = ? AND format = ? AND {} ORDER BY started DESC LIMIT ?")
+        attempts = [("script_hash = ?", described["script_hash"], True),
+                    ("script = ?", described["script"], False)]
+        try:
+            with self._connect() as conn:
+                for condition, value, same_source in attempts:
+                    if value is None:
+                        continue
+                    rows = conn.execute(query.format(condition),
+                                        (described["scene"], described["quality"], described["format"],
+                                         value, HISTORY_LIMIT)).fetchall()
+                    if rows:
+                        peaks = [row["peak_rss_bytes"] for row in rows if row["peak_rss_bytes"]]
+                        return {
+                            "seconds": statistics.median(row["wall_seconds"] for row in rows),
+                            "samples": len(rows),
+                            "peak_rss_bytes": max(peaks) if peaks else None,
+                            "same_source": same_source,
+                        }
+        except sqlite3.Error as e:
+            print(f"读取渲染记录时出错: {e}")
+        return None
+
+    def quality_stats(self):
+        """按质量统计历史渲染 (用于估算一台机器能同时运行多少个任务)。
+
+        Returns:
+            list[dict]: quality、renders、median_seconds、median_cpu_seconds、max_peak_rss_bytes。
+        """
+        stats = []
+        with self._connect() as conn:
+            rows = conn.execute("SELECT quality, wall_seconds, cpu_seconds, peak_rss_bytes FROM renders "
+                                "WHERE return_code = 0 AND cached = 0").fetchall()
+        groups = {}
+        for row in rows:
+            groups.setdefault(row["quality"], []).append(row)
+        for quality, items in sorted(groups.items()):
+            cpu = [row["cpu_seconds"] for row in items if row["cpu_seconds"] is not None]
+            peaks = [row["peak_rss_bytes"] for row in items if row["peak_rss_bytes"]]
+            stats.append({
+                "quality": quality,
+                "renders": len(items),
+                "median_seconds": statistics.median(row["wall_seconds"] for row in items),
+                "median_cpu_seconds": statistics.median(cpu) if cpu else None,
+                "max_peak_rss_bytes": max(peaks) if peaks else None,
+            })
+        return stats
+
+class TelemetryRecorder:
+    """包装事件回调，在渲染期间采样进程树，结束时写入一条记录。"""
+
+    def __init__(self, store, described, output_callback):
+        self.store = store
+        self.described = described
+        self.output_callback = output_callback
+        self.started = time.time()
+        self.sampler = ProcessTreeSampler()
+        self.output_files = []
+
+    def __call__(self, event):
+        if isinstance(event, ProcessStarted):
+            self.sampler.add(event.pid)
+        elif isinstance(event, FileReady) and event.job is None:
+            self.output_files.append(event.path)
+        elif isinstance(event, RenderFinished) and event.job is None and event.return_code is not None:
+            self._finish(event) # 进程未能启动或排队时已取消的任务不记录
+        self.output_callback(event)
+
+    def _finish(self, event):
+        self.sampler.stop()
+        output_bytes = 0
+        for path in set(self.output_files):
+            try:
+                output_bytes += os.path.getsize(path)
+            except OSError:
+                pass
+        self.store.record(dict(
+            self.described,
+            started=self.started,
+            wall_seconds=event.duration,
+            cpu_seconds=self.sampler.cpu_seconds,
+            peak_rss_bytes=self.sampler.peak_rss_bytes,
+            output_bytes=output_bytes,
+            return_code=event.return_code,
+            cached=int(event.cached),
+        ))
+
+def format_expected(expected):
+    """把 TelemetryStore.expected() 的结果格式化为一行提示文本。"""
+    if not expected:
+        return "无历史记录"
+    text = f"约 {expected['seconds']:.1f}s (基于 {expected['samples']} 次历史渲染"
+    if not expected["same_source"]:
+        text += "，脚本已修改"
+    text += ")"
+    if expected["peak_rss_bytes"]:
+        text += f"，峰值内存约 {expected['peak_rss_bytes'] / 1024 ** 2:.0f} MiB"
+    return text
+
+# 示例用法：打印各质量的历史统计
+if __name__ == '__main__':
+    store = TelemetryStore()
+    print(f"渲染记录数据库: {store.db_path}")
+    for item in store.quality_stats():
+        peak = f"{item['max_peak_rss_bytes'] / 1024 ** 2:.0f} MiB" if item["max_peak_rss_bytes"] else "未知"
+        print(f"{item['quality']}: {item['renders']} 次, 中位耗时 {item['median_seconds']:.1f}s, "
+              f"峰值内存 {peak}")
@@ -0,0 +1,167 @@
+# core/tex_cache.py
+#
+# 只依赖标准库：tex_cache_launcher.py 在渲染用的解释器中导入本模块。
+
+import hashlib
+import os
+import sys
+import time
+
+try:
+    from core.app_paths import get_app_cache_dir
+except ImportError:
+    from app_paths import get_app_cache_dir
+
+LAUNCHER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tex_cache_launcher.py")
+DEFAULT_MAX_BYTES = 1024 ** 3  # 默认容量上限: 1 GiB
+# 淘汰时保留最近使用过的文件，避免删除其他渲染进程正在使用的 SVG
+MIN_EVICT_AGE = 3600           # 秒
+# 缓存内容所在的子目录 (对应 manim 的 config.tex_dir、config.text_dir)
+TEX_SUBDIR = "Tex"
+TEXT_SUBDIR = "texts"
+LOCK_SUBDIR = "locks"
+
+def get_default_tex_cache_dir():
+    """返回共享的 LaTeX / Text 缓存目录 (与脚本和输出目录无关)。"""
+    return get_app_cache_dir("tex")
+
+class FileLock:
+    """跨进程的排他文件锁 (POSIX 使用 fcntl.flock，Windows 使用 msvcrt.locking)。
+
+    用法:
+        with FileLock(path):
+            ...
+    """
+
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self._file = None
+
+    def acquire(self):
+        """获取锁；非阻塞模式下锁被占用时返回 False。"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "a+b")
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                self._file.seek(0)
+                mode = msvcrt.LK_LOCK if self.blocking else msvcrt.LK_NBLCK
+                msvcrt.locking(self._file.fileno(), mode, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | (0 if self.blocking else fcntl.LOCK_NB))
+        except OSError:
+            self._file.close()
+            self._file = None
+            if self.blocking:
+                raise
+            return False
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+def lock_path(cache_dir, *parts):
+    """返回按内容 (例如 LaTeX 字符串和模板) 区分的锁文件路径。"""
+    digest = hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir, LOCK_SUBDIR, f"{digest}.lock")
+
+def touch(path):
+    """更新文件的修改时间，作为 LRU 淘汰时的最近使用时间。"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _entries(cache_dir):
+    """按文件名 (不含扩展名，即 manim 的内容哈希) 分组，返回 [(最近使用时间, 大小, [路径])]。"""
+    groups = {}
+    for subdir in (TEX_SUBDIR, TEXT_SUBDIR):
+        root = os.path.join(cache_dir, subdir)
+        try:
+            names = os.listdir(root)
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            group = groups.setdefault(os.path.join(root, name.split(".", 1)[0]), [0.0, 0, []])
+            group[0] = max(group[0], stat.st_mtime)
+            group[1] += stat.st_size
+            group[2].append(path)
+    return [tuple(group) for group in groups.values()]
+
+def cache_size(cache_dir=None):
+    """返回缓存的总大小 (字节)。"""
+    return sum(size for _, size, _ in _entries(cache_dir or get_default_tex_cache_dir()))
+
+def evict(cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, min_age=MIN_EVICT_AGE):
+    """按最近使用时间删除最旧的条目，直到总大小不超过 max_bytes。
+
+    只有一个进程执行淘汰 (其他进程同时调用时直接返回)；min_age 秒内用过的条目不删除。
+
+    Returns:
+        int: 删除的条目数。
+    """
+    cache_dir = cache_dir or get_default_tex_cache_dir()
+    lock = FileLock(os.path.join(cache_dir, LOCK_SUBDIR, "evict.lock"), blocking=False)
+    if not lock.acquire():
+        return 0
+    try:
+        entries = sorted(_entries(cache_dir))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        now = time.time()
+        for used, size, paths in entries:
+            if total <= max_bytes or now - used < min_age:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+    finally:
+        lock.release()
+
+def wrap_command(command_list, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+    """把 [python, -m, manim, 参数...] 改为通过 tex_cache_launcher.py 启动 manim。
+
+    启动器把 config.tex_dir / text_dir 指向共享缓存目录，其他参数不变；
+    其他形式的命令原样返回。
+    """
+    if len(command_list) < 3 or list(command_list[1:3]) != ["-m", "manim"]:
+        return list(command_list)
+    return [command_list[0], LAUNCHER_PATH, "--cache-dir", cache_dir or get_default_tex_cache_dir(),
+            "--max-bytes", str(int(max_bytes)), "--"] + list(command_list[3:])
+
+# 示例用法
+if __name__ == '__main__':
+    directory = get_default_tex_cache_dir()
+    print(f"LaTeX / Text 缓存目录: {directory}")
+    print(f"当前大小: {cache_size(directory) / 1024 ** 2:.1f} MiB")
@@ -0,0 +1,184 @@
+# core/tex_cache_launcher.py - 使用共享 LaTeX / Text 缓存的 manim 入口
+#
+# 由 manim_runner 使用目标 Python 解释器启动 (只依赖标准库和 manim)，见 tex_cache.wrap_command:
+#     python tex_cache_launcher.py --cache-dir ~/.cache/manim_export_gui/tex --max-bytes 1073741824 -- -ql scene.py MyScene
+#
+# manim 把编译好的 Tex / MathTex SVG 和 Text 字形 SVG 放在 --media_dir 下，文件名为内容哈希。
+# 本入口把 config.tex_dir / text_dir 指向与脚本和输出目录无关的共享目录，并且:
+#   - 按 LaTeX 字符串和模板加锁，多个渲染进程不会同时编译同一个字符串 (后到的进程直接复用结果)
+#   - 每次使用时更新 SVG 的修改时间，渲染结束后按容量上限淘汰最久未使用的条目
+#
+# 使用 --precompile 时不运行 manim，而是在进程池中预先编译 tex_precompile 收集的 LaTeX 字符串。
+
+import argparse
+import json
+import os
+import runpy
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tex_cache import TEX_SUBDIR, TEXT_SUBDIR, FileLock, lock_path, touch, evict
+
+# 本进程中使用过的 SVG 文件 (预编译完成标记中记录，用于判断是否被淘汰)
+_used_svg_files = []
+# 预编译进程中导入的脚本的全局变量 (用于取得自定义的 TexTemplate 等对象)
+_script_globals = {}
+
+def _install_tex_lock(cache_dir, missing):
+    """替换 tex_to_svg_file (包括已经用 from ... import 导入它的 manim 模块)。"""
+    from manim import config
+    from manim.utils import tex_file_writing
+    original = getattr(tex_file_writing, "tex_to_svg_file", None)
+    if original is None:
+        missing.append("tex_to_svg_file")
+        return
+
+    def locked_tex_to_svg_file(expression, environment=None, tex_template=None, *args, **kwargs):
+        template = tex_template or config.tex_template
+        with FileLock(lock_path(cache_dir, "tex", expression, environment, getattr(template, "body", repr(template)))):
+            svg_file = original(expression, environment, tex_template, *args, **kwargs)
+        touch(svg_file)
+        _used_svg_files.append(str(svg_file))
+        return svg_file
+
+    for module_name, module in list(sys.modules.items()):
+        if module_name.startswith("manim") and getattr(module, "tex_to_svg_file", None) is original:
+            module.tex_to_svg_file = locked_tex_to_svg_file
+
+def _install_text_lock(cache_dir, missing):
+    """Text / MarkupText 生成 SVG 很快，所有进程共用一把锁。"""
+    from manim.mobject.text import text_mobject
+    for class_name in ("Text", "MarkupText"):
+        cls = getattr(text_mobject, class_name, None)
+        original = getattr(cls, "_text2svg", None)
+        if original is None:
+            missing.append(f"{class_name}._text2svg")
+            continue
+
+        def locked_text2svg(self, *args, _original=original, **kwargs):
+            with FileLock(lock_path(cache_dir, "text")):
+                svg_file = _original(self, *args, **kwargs)
+            touch(svg_file)
+            return svg_file
+
+        cls._text2svg = locked_text2svg
+
+def _configure(cache_dir):
+    """把 manim 的 LaTeX / Text 缓存目录指向共享目录并安装锁。"""
+    from manim import config
+    config.tex_dir = os.path.join(cache_dir, TEX_SUBDIR)
+    config.text_dir = os.path.join(cache_dir, TEXT_SUBDIR)
+    missing = []
+    _install_tex_lock(cache_dir, missing)
+    _install_text_lock(cache_dir, missing)
+    return missing
+
+def _init_precompile_worker(cache_dir, script_path):
+    """预编译进程的初始化：读取脚本目录中的 manim.cfg，导入脚本以应用模块级 config 设置。"""
+    from manim import config
+    cfg_path = os.path.join(os.path.dirname(script_path), "manim.cfg")
+    if os.path.isfile(cfg_path):
+        config.digest_file(cfg_path)
+    _configure(cache_dir)
+    sys.path.insert(0, os.path.dirname(script_path))
+    try:
+        _script_globals.update(runpy.run_path(script_path, run_name="__manim_precompile__"))
+    except Exception as e:
+        print(f"导入脚本时出错 (使用默认模板预编译): {e}")
+
+def _resolve(value):
+    if isinstance(value, dict):
+        if set(value) == {"global"}:
+            return _script_globals[value["global"]]
+        return {key: _resolve(element) for key, element in value.items()}
+    if isinstance(value, list):
+        return [_resolve(element) for element in value]
+    return value
+
+def _compile_item(item):
+    """按原参数创建 mobject，触发 (加锁的) LaTeX 编译；返回用到的 SVG 文件。"""
+    import manim
+    start = len(_used_svg_files)
+    getattr(manim, item["kind"])(*item["args"], **_resolve(item["kwargs"]))
+    return _used_svg_files[start:]
+
+def _describe(item):
+    if item["kind"] == "NumberLine":
+        return f"刻度数值 {item['kwargs']['x_range']}"
+    return f"{item['kind']}({', '.join(repr(arg) for arg in item['args'])})"
+
+def precompile(items, cache_dir, script_path, workers=1, marker=None):
+    """编译全部条目；全部成功时写入完成标记。返回失败的条目数。"""
+    svg_files, failed = [], 0
+
+    def report(index, item, result=None, error=None):
+        nonlocal failed
+        if error is None:
+            svg_files.extend(result)
+            print(f"预编译 {index}/{len(items)}: {_describe(item)}")
+        else:
+            failed += 1
+            print(f"预编译失败 {_describe(item)}: {error}")
+
+    if workers > 1 and len(items) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_precompile_worker,
+                                 initargs=(cache_dir, script_path)) as executor:
+            futures = {executor.submit(_compile_item, item): item for item in items}
+            for index, future in enumerate(as_completed(futures), 1):
+                try:
+                    report(index, futures[future], result=future.result())
+                except Exception as e:
+                    report(index, futures[future], error=e)
+    else:
+        _init_precompile_worker(cache_dir, script_path)
+        for index, item in enumerate(items, 1):
+            try:
+                report(index, item, result=_compile_item(item))
+            except Exception as e:
+                report(index, item, error=e)
+    if marker and not failed:
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, "w", encoding="utf-8") as f:
+            json.dump({"svg_files": sorted(set(svg_files))}, f, ensure_ascii=False)
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description="使用共享 LaTeX / Text 缓存的 manim 入口")
+    parser.add_argument("--cache-dir", required=True, help="共享缓存目录")
+    parser.add_argument("--max-bytes", type=int, default=None, help="缓存容量上限 (字节)，渲染结束后淘汰")
+    parser.add_argument("--precompile", help="只预编译该 JSON 文件中的条目 (见 tex_precompile)，不运行 manim")
+    parser.add_argument("--script", help="预编译时导入的场景脚本")
+    parser.add_argument("--workers", type=int, default=1, help="预编译进程数")
+    parser.add_argument("--marker", help="预编译全部成功后写入的完成标记")
+    argv = sys.argv[1:]
+    manim_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+
+    if args.precompile:
+        with open(args.precompile, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        return 1 if precompile(items, args.cache_dir, os.path.abspath(args.script), args.workers, args.marker) else 0
+
+    from manim.__main__ import main as manim_main
+
+    missing = _configure(args.cache_dir)
+    if missing:
+        print(f"警告: 当前 manim 版本缺少 {', '.join(missing)}，对应缓存不加锁")
+
+    sys.argv = ["manim"] + manim_args
+    code = 1
+    try:
+        manim_main.main(args=manim_args, prog_name="manim", standalone_mode=True)
+        code = 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        if args.max_bytes is not None:
+            try:
+                evict(args.cache_dir, args.max_bytes)
+            except OSError as e:
+                print(f"淘汰 LaTeX 缓存时出错: {e}")
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,357 @@
+# core/tex_precompile.py
+
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+
+try:
+    from core.manim_runner import _child_env, _get_startupinfo, _stream_output, get_default_max_workers
+    from core.render_cache import parse_manim_command
+    from core.render_events import LogLine
+    from core.render_job import KILL_GRACE_SECONDS, process_group_kwargs, kill_process_tree
+    from core.script_parser import _eval_number, _iter_class_defs
+    from core.tex_cache import LAUNCHER_PATH
+except ImportError:
+    from manim_runner import _child_env, _get_startupinfo, _stream_output, get_default_max_workers
+    from render_cache import parse_manim_command
+    from render_events import LogLine
+    from render_job import KILL_GRACE_SECONDS, process_group_kwargs, kill_process_tree
+    from script_parser import _eval_number, _iter_class_defs
+    from tex_cache import LAUNCHER_PATH
+
+# 由 LaTeX 编译的 mobject (在渲染解释器中按相同参数创建，生成的 SVG 与渲染时完全一致)
+TEX_MOBJECTS = {"Tex", "MathTex", "SingleStringMathTex", "Title", "BulletedList"}
+# 影响编译内容的关键字参数；其余参数 (颜色、字号等) 不影响 SVG
+COMPILE_KWARGS = {"tex_environment", "arg_separator", "substrings_to_isolate", "tex_template"}
+# 坐标系及其数轴参数的位置 (位置参数依次为各轴的范围)
+AXES_CLASSES = {"NumberLine": ("x",), "Axes": ("x", "y"), "NumberPlane": ("x", "y"), "ThreeDAxes": ("x", "y", "z")}
+MARKER_SUBDIR = "precompiled"
+
+_UNKNOWN = object()
+
+class _Resolver:
+    """计算由字面量、模块常量和类常量 (self.X / 类名.X) 组成的表达式。"""
+
+    def __init__(self, constants, module_names=()):
+        self.constants = constants
+        self.module_names = set(module_names)
+
+    def value(self, node):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id in self.constants:
+                return self.constants[node.id]
+            if node.id in self.module_names:
+                # 模块级对象 (例如自定义的 TexTemplate)，在渲染解释器中导入脚本后取得
+                return {"global": node.id}
+            return _UNKNOWN
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.attr in self.constants:
+            return self.constants[node.attr]
+        if isinstance(node, (ast.List, ast.Tuple)):
+            values = [self.value(element) for element in node.elts]
+            return _UNKNOWN if any(value is _UNKNOWN for value in values) else values
+        if isinstance(node, ast.Dict):
+            if any(key is None for key in node.keys):
+                return _UNKNOWN
+            keys = [self.value(key) for key in node.keys]
+            if any(not isinstance(key, str) for key in keys):
+                return _UNKNOWN
+            return {key: self.value(value) for key, value in zip(keys, node.values)}
+        if isinstance(node, (ast.UnaryOp, ast.BinOp)):
+            operands = [node.operand] if isinstance(node, ast.UnaryOp) else [node.left, node.right]
+            values = [self.value(operand) for operand in operands]
+            if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                return _UNKNOWN
+            if isinstance(node, ast.UnaryOp):
+                result = _eval_number(ast.UnaryOp(node.op, ast.Constant(values[0])))
+            else:
+                result = _eval_number(ast.BinOp(ast.Constant(values[0]), node.op, ast.Constant(values[1])))
+            return _UNKNOWN if result is None else result
+        return _UNKNOWN
+
+def _literal_assignments(body, resolver):
+    """收集语句列表中形如 NAME = <可计算的字面量> 的赋值。"""
+    constants = {}
+    for node in body:
+        if not isinstance(node, ast.Assign):
+            continue
+        value = resolver.value(node.value)
+        if value is _UNKNOWN or _contains_unknown(value):
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                constants[target.id] = value
+                resolver.constants[target.id] = value
+    return constants
+
+def _contains_unknown(value):
+    if value is _UNKNOWN:
+        return True
+    if isinstance(value, list):
+        return any(_contains_unknown(element) for element in value)
+    if isinstance(value, dict):
+        return any(_contains_unknown(element) for element in value.values())
+    return False
+
+def _call_name(node):
+    func = node.func
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+def _tex_item(node, kind, resolver):
+    """Tex / MathTex 等调用；字符串或影响编译的参数无法确定时返回 None。"""
+    args = [resolver.value(arg) for arg in node.args]
+    if not args or any(not isinstance(arg, str) for arg in args):
+        return None
+    kwargs = {}
+    for keyword in node.keywords:
+        if keyword.arg == "tex_to_color_map":
+            # 只有键 (被单独拆分的子串) 影响编译
+            value = resolver.value(keyword.value)
+            if not isinstance(value, dict):
+                return None
+            kwargs.setdefault("substrings_to_isolate", []).extend(value)
+        elif keyword.arg in COMPILE_KWARGS:
+            value = resolver.value(keyword.value)
+            if _contains_unknown(value):
+                return None
+            if keyword.arg == "substrings_to_isolate":
+                kwargs.setdefault("substrings_to_isolate", []).extend(value)
+            else:
+                kwargs[keyword.arg] = value
+        elif keyword.arg is None:
+            return None # **kwargs
+    return {"kind": kind, "args": args, "kwargs": kwargs}
+
+def _axes_items(node, kind, resolver, force_numbers):
+    """坐标系中显示刻度数值的数轴，按范围生成 NumberLine(include_numbers=True)。"""
+    keywords = {keyword.arg: keyword.value for keyword in node.keywords if keyword.arg}
+    axis_config = resolver.value(keywords["axis_config"]) if "axis_config" in keywords else {}
+    if not isinstance(axis_config, dict):
+        axis_config = {}
+    items = []
+    for index, axis in enumerate(AXES_CLASSES[kind]):
+        range_node = keywords.get(f"{axis}_range")
+        if range_node is None and index < len(node.args):
+            range_node = node.args[index]
+        if range_node is None:
+            continue
+        config = dict(axis_config)
+        if kind == "NumberLine":
+            config.update((name, resolver.value(value)) for name, value in keywords.items() if name != "x_range")
+        elif f"{axis}_axis_config" in keywords:
+            specific = resolver.value(keywords[f"{axis}_axis_config"])
+            if isinstance(specific, dict):
+                config.update(specific)
+        if not (force_numbers or config.get("include_numbers") is True):
+            continue
+        x_range = resolver.value(range_node)
+        if not (isinstance(x_range, list) and len(x_range) in (2, 3)
+                and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in x_range)):
+            continue
+        line_kwargs = {"x_range": x_range, "include_numbers": True}
+        decimal_config = config.get("decimal_number_config")
+        if isinstance(decimal_config, dict) and not _contains_unknown(decimal_config):
+            line_kwargs["decimal_number_config"] = decimal_config
+        items.append({"kind": "NumberLine", "args": [], "kwargs": line_kwargs})
+    return items
+
+def _label_items(node, resolver):
+    """get_axis_labels / get_x_axis_label 等生成的 MathTex 标签。"""
+    name = _call_name(node)
+    labels = [resolver.value(arg) for arg in node.args]
+    labels += [resolver.value(keyword.value) for keyword in node.keywords if keyword.arg and keyword.arg.endswith("label")]
+    if name == "get_axis_labels" and not node.args and not node.keywords:
+        labels = ["x", "y"] # manim 的默认标签
+    return [{"kind": "MathTex", "args": [label], "kwargs": {}} for label in labels if isinstance(label, str)]
+
+def _collect_from(nodes, resolver):
+    items = []
+    calls = [node for root in nodes for node in ast.walk(root) if isinstance(node, ast.Call)]
+    # 调用 axes.add_coordinates() 时坐标系的刻度数值同样需要编译
+    force_numbers = any(_call_name(call) == "add_coordinates" for call in calls)
+    for call in calls:
+        name = _call_name(call)
+        if name in TEX_MOBJECTS:
+            item = _tex_item(call, name, resolver)
+            if item:
+                items.append(item)
+        elif name in AXES_CLASSES:
+            items.extend(_axes_items(call, name, resolver, force_numbers))
+        elif name in ("get_axis_labels", "get_x_axis_label", "get_y_axis_label", "get_z_axis_label"):
+            items.extend(_label_items(call, resolver))
+    return items
+
+def collect_tex_items(content, scene_names=None):
+    """用 AST 找出脚本中会被 LaTeX 编译的内容 (不导入脚本、不运行 manim)。
+
+    收集:
+        Tex / MathTex / Title 等调用中由字面量和常量组成的字符串
+        include_numbers=True (或调用了 add_coordinates) 的坐标系中各轴的刻度数值，
+        范围来自字面量或常量 (例如 x_range=self.X_RANGE)
+        get_axis_labels 等生成的坐标轴标签
+    只分析 scene_names 中的场景类和模块级函数；无法确定的字符串跳过 (渲染时照常编译)。
+
+    Args:
+        content (str): 脚本源码。
+        scene_names (list[str] | None): 要渲染的场景，为 None 时分析所有类。
+
+    Returns:
+        list[dict]: 去重后的条目 {"kind": 类名, "args": [...], "kwargs": {...}}，可序列化为 JSON。
+
+    Raises:
+        SyntaxError: 源码无法解析。
+    """
+    tree = ast.parse(content)
+    module_names = set()
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            module_names.update(target.id for target in node.targets if isinstance(target, ast.Name))
+    resolver = _Resolver({}, module_names)
+    module_constants = _literal_assignments(tree.body, resolver)
+
+    items, seen = [], set()
+    sources = [(node, module_constants) for node in tree.body
+               if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    for class_node in _iter_class_defs(tree.body):
+        if scene_names is None or class_node.name in scene_names:
+            class_resolver = _Resolver(dict(module_constants), module_names)
+            _literal_assignments(class_node.body, class_resolver)
+            sources.append((class_node, class_resolver.constants))
+    for node, constants in sources:
+        for item in _collect_from([node], _Resolver(constants, module_names)):
+            key = json.dumps(item, sort_keys=True, ensure_ascii=False)
+            if key not in seen:
+                seen.add(key)
+                items.append(item)
+    return items
+
+def _module_statements_digest(content):
+    """模块级语句 (不含类和函数) 的摘要，脚本修改 config.tex_template 等设置时改变。"""
+    tree = ast.parse(content)
+    statements = [ast.dump(node) for node in tree.body
+                  if not isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))]
+    return hashlib.sha256("\n".join(statements).encode("utf-8")).hexdigest()
+
+def marker_path(cache_dir, python_path, script_path, items, content):
+    """预编译完成标记的路径；内容、解释器或模块级设置改变时路径随之改变。"""
+    cfg_path = os.path.join(os.path.dirname(os.path.abspath(script_path)), "manim.cfg")
+    try:
+        with open(cfg_path, "rb") as f:
+            cfg = hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        cfg = ""
+    key = json.dumps({"python": python_path, "items": items, "module": _module_statements_digest(content),
+                      "cfg": cfg}, sort_keys=True, ensure_ascii=False)
+    return os.path.join(cache_dir, MARKER_SUBDIR, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".json")
+
+def is_precompiled(marker):
+    """标记存在且其中记录的 SVG 都还在缓存中 (没有被淘汰)。"""
+    try:
+        with open(marker, "r", encoding="utf-8") as f:
+            svg_files = json.load(f).get("svg_files", [])
+    except (OSError, ValueError, AttributeError):
+        return False
+    return all(os.path.exists(path) for path in svg_files)
+
+def precompile_script(python_path, script_path, scene_names, cache_dir, output_callback, job=None,
+                      max_workers=None):
+    """在渲染前把脚本中的 LaTeX 字符串并行编译到共享缓存。
+
+    由 python_path 以 tex_cache_launcher.py --precompile 执行：导入脚本 (应用模块级 config 设置，
+    例如 xelatex 模板) 后在进程池中按原参数创建各个 mobject。已经预编译过且 SVG 仍在缓存中时直接返回。
+
+    Args:
+        python_path (str): 渲染使用的 Python 解释器。
+        script_path (str): 场景脚本。
+        scene_names (list[str] | None): 要渲染的场景。
+        cache_dir (str): 共享缓存目录 (见 tex_cache)。
+        output_callback (callable): 接收 LogLine 的函数。
+        job (RenderJob | None): 所属任务的句柄，取消时终止预编译进程。
+        max_workers (int | None): 编译进程数，默认为 CPU 核心数。
+
+    Returns:
+        int | None: 预编译进程的返回代码；没有需要编译的内容时返回 None。
+    """
+    try:
+        with open(script_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        items = collect_tex_items(content, scene_names)
+    except (OSError, SyntaxError, ValueError) as e:
+        output_callback(LogLine(f"分析 LaTeX 字符串时出错 {script_path}: {e}\n"))
+        return None
+    if not items:
+        return None
+    marker = marker_path(cache_dir, python_path, script_path, items, content)
+    if is_precompiled(marker):
+        return None
+
+    workers = min(max_workers or get_default_max_workers(), len(items))
+    output_callback(LogLine(f"--- 预编译 LaTeX: {os.path.basename(script_path)} 中 {len(items)} 项，"
+                            f"进程数: {workers} ---\n"))
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False)
+        items_path = f.name
+    command = [python_path, LAUNCHER_PATH, "--cache-dir", cache_dir, "--precompile", items_path,
+               "--script", os.path.abspath(script_path), "--workers", str(workers), "--marker", marker]
+    return_code = None
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0,
+                                   cwd=os.path.dirname(os.path.abspath(script_path)), env=_child_env(),
+                                   startupinfo=_get_startupinfo(), **process_group_kwargs())
+        kill = lambda force=False: kill_process_tree(process, grace=0 if force else KILL_GRACE_SECONDS)
+        if job is not None:
+            job.attach(kill)
+        try:
+            _stream_output(process.stdout, lambda text: output_callback(LogLine(text)))
+            process.stdout.close()
+            return_code = process.wait()
+        finally:
+            if job is not None:
+                job.detach(kill)
+    except OSError as e:
+        output_callback(LogLine(f"启动 LaTeX 预编译时出错: {e}\n"))
+    finally:
+        try:
+            os.remove(items_path)
+        except OSError:
+            pass
+    if return_code not in (0, None) and not (job is not None and job.cancelled):
+        output_callback(LogLine(f"--- LaTeX 预编译未全部完成 (返回代码 {return_code})，渲染时照常编译 ---\n"))
+    return return_code
+
+def precompile_jobs(commands, cache_dir, output_callback, job=None, max_workers=None):
+    """按 (解释器, 脚本) 合并多条 manim 命令的场景，依次预编译各个脚本。"""
+    groups = {}
+    for command_list in commands:
+        info = parse_manim_command(command_list)
+        if info is None:
+            continue
+        scenes = groups.setdefault((info["python"], os.path.abspath(info["script"])), [])
+        scenes.extend(scene for scene in info["scenes"] if scene not in scenes)
+    for (python_path, script_path), scenes in groups.items():
+        if job is not None and job.cancelled:
+            return
+        precompile_script(python_path, script_path, scenes or None, cache_dir, output_callback,
+                          job=job, max_workers=max_workers)
+
+# 示例用法
+if __name__ == '__main__':
+    example = '''
+from manim import *
+class Demo(ThreeDScene):
+    X_RANGE = [-0.5, 5.5, 1]
+    AXIS_CONFIG = {"include_numbers": True, "font_size": 18}
+    def construct(self):
+        axes = ThreeDAxes(x_range=self.X_RANGE, z_range=[-0.5, 2.5, 1], axis_config=self.AXIS_CONFIG)
+        self.add(axes, MathTex("t").scale(1.2), MathTex(r"\\alpha", color=BLUE))
+'''
+    for item in collect_tex_items(example):
+        print(json.dumps(item, ensure_ascii=False))
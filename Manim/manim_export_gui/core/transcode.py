@@ -0,0 +1,372 @@
+# core/transcode.py
+
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Optional
+
+try:
+    from core.command_builder import QUALITY_PROFILES, quality_profile, quality_dir_name
+    from core.ffmpeg_tools import run_ffmpeg
+    from core.manim_runner import _run_process
+    from core.render_cache import parse_manim_command
+    from core.render_events import LogLine, FileReady, RenderFinished
+    from core.script_parser import get_config_overrides
+except ImportError:
+    from command_builder import QUALITY_PROFILES, quality_profile, quality_dir_name
+    from ffmpeg_tools import run_ffmpeg
+    from manim_runner import _run_process
+    from render_cache import parse_manim_command
+    from render_events import LogLine, FileReady, RenderFinished
+    from script_parser import get_config_overrides
+
+# 可以缩放派生的视频格式及其编码参数 (透明视频保持 manim 使用的编码器)
+_VIDEO_CODECS = {
+    ".mp4": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+             "-movflags", "+faststart"],
+    ".mov": ["-c:v", "qtrle"],
+    ".webm": ["-c:v", "libvpx-vp9", "-pix_fmt", "yuva420p", "-b:v", "0", "-crf", "30"],
+}
+
+def derived_output_path(source_path, pixel_height, frame_rate):
+    """返回 manim 以该分辨率和帧率渲染时使用的输出路径。
+
+    manim 的视频路径为 <media_dir>/videos/<模块名>/<高度>p<帧率>/<场景>.<扩展名>，
+    派生文件放在与渲染结果同级的质量目录中。
+    """
+    module_dir = os.path.dirname(os.path.dirname(os.path.abspath(source_path)))
+    return os.path.join(module_dir, quality_dir_name(pixel_height, frame_rate), os.path.basename(source_path))
+
+def scale_video(source_path, output_path, width, height, frame_rate, output_callback=None, job=None):
+    """用 ffmpeg 把视频缩放到指定分辨率和帧率 (保留音轨)。
+
+    Returns:
+        int | None: ffmpeg 返回代码；找不到 ffmpeg、格式不支持或任务已取消时返回 None。
+    """
+    codec = _VIDEO_CODECS.get(os.path.splitext(source_path)[1].lower())
+    if codec is None:
+        if output_callback:
+            output_callback(LogLine(f"不支持缩放该格式: {source_path}\n"))
+        return None
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    video_filter = f"fps={frame_rate:g},scale={int(width)}:{int(height)}:flags=lanczos"
+    return run_ffmpeg(["-i", source_path, "-map", "0", "-vf", video_filter] + codec + ["-c:a", "copy", output_path],
+                      output_callback, job=job)
+
+# 可以由视频派生的其他格式: 最后一帧 PNG、调色板 GIF、动态 WebP
+DERIVED_FORMATS = ("png", "gif", "webp")
+
+def derived_format_path(source_path, output_format):
+    """返回派生格式的输出路径。
+
+    GIF 和 WebP 与视频放在同一目录 (与 manim --format gif 的位置相同)；
+    最后一帧 PNG 放在 manim -s 使用的 <media_dir>/images/<模块名>/ 目录。
+    """
+    base, _ = os.path.splitext(os.path.abspath(source_path))
+    if output_format != "png":
+        return f"{base}.{output_format}"
+    quality_dir = os.path.dirname(base)
+    module_dir = os.path.dirname(quality_dir)
+    videos_dir = os.path.dirname(module_dir)
+    if os.path.basename(videos_dir) != "videos":
+        return f"{base}.png"
+    return os.path.join(os.path.dirname(videos_dir), "images", os.path.basename(module_dir),
+                        os.path.basename(base) + ".png")
+
+def extract_last_frame(source_path, output_path, output_callback=None, job=None):
+    """把视频的最后一帧保存为 PNG (只解码最后几秒，逐帧覆盖输出文件)。
+
+    Returns:
+        int | None: ffmpeg 返回代码。
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    return run_ffmpeg(["-sseof", "-3", "-i", source_path, "-update", "1", "-an", output_path],
+                      output_callback, job=job)
+
+@dataclass
+class EncodeOptions:
+    """GIF / WebP 编码参数。"""
+    max_fps: Optional[float] = 15            # 帧率上限 (源帧率更低时保持不变)
+    max_width: Optional[int] = 720           # 宽度上限 (像素，保持宽高比)
+    target_bytes: Optional[int] = None       # 目标文件大小，超出时逐步降低宽度、帧率和颜色数后重新编码
+    colors: int = 256                        # GIF 调色板颜色数
+    dither: str = "sierra2_4a"               # GIF 抖动算法 (bayer、sierra2_4a、none 等)
+    webp_quality: int = 75                   # WebP 质量 (0-100)
+
+# GUI 中的动图大小预设
+ENCODE_PRESETS = {
+    "卡片 (720px, 15fps, 5MB)": EncodeOptions(max_fps=15, max_width=720, target_bytes=5 * 1024 ** 2),
+    "缩略图 (480px, 12fps, 2MB)": EncodeOptions(max_fps=12, max_width=480, target_bytes=2 * 1024 ** 2),
+    "原始尺寸": EncodeOptions(max_fps=None, max_width=None),
+}
+# 超出目标大小时最多重新编码的次数
+_MAX_SIZE_ATTEMPTS = 4
+
+def _source_frame_rate(source_path):
+    """从 manim 的输出目录名 (例如 "1080p60") 推断源视频帧率；无法推断时返回 None。"""
+    match = re.fullmatch(r"\d+p(\d+(?:\.\d+)?)", os.path.basename(os.path.dirname(os.path.abspath(source_path))))
+    return float(match.group(1)) if match else None
+
+def _prepare_filter(source_path, options):
+    """帧率和宽度上限对应的 ffmpeg 滤镜。"""
+    filters = []
+    source_fps = _source_frame_rate(source_path)
+    if options.max_fps and (source_fps is None or options.max_fps < source_fps):
+        filters.append(f"fps={options.max_fps:g}")
+    if options.max_width:
+        filters.append(f"scale='min({int(options.max_width)},iw)':-2:flags=lanczos")
+    return ",".join(filters) or "null"
+
+def _encode_once(source_path, output_path, options, output_callback, job):
+    prepare = _prepare_filter(source_path, options)
+    if not output_path.lower().endswith(".gif"):
+        return run_ffmpeg(["-i", source_path, "-an", "-vf", prepare, "-c:v", "libwebp_anim", "-loop", "0",
+                           "-q:v", str(options.webp_quality), output_path], output_callback, job=job)
+    # 两遍编码：先统计整段视频生成调色板，再用调色板映射每一帧
+    fd, palette_path = tempfile.mkstemp(suffix=".png", prefix="palette_")
+    os.close(fd)
+    try:
+        code = run_ffmpeg(["-i", source_path, "-vf", f"{prepare},palettegen=max_colors={options.colors}"
+                           ":stats_mode=diff", "-update", "1", palette_path], output_callback, job=job)
+        if code != 0:
+            return code
+        return run_ffmpeg(["-i", source_path, "-i", palette_path, "-lavfi",
+                           f"{prepare}[x];[x][1:v]paletteuse=dither={options.dither}:diff_mode=rectangle",
+                           "-loop", "0", output_path], output_callback, job=job)
+    finally:
+        os.remove(palette_path)
+
+def encode_animation(source_path, output_path, options=None, output_callback=None, job=None):
+    """把视频编码为 GIF (两遍调色板编码) 或动态 WebP，按扩展名选择格式。
+
+    有目标大小时，输出超出目标会依次缩小宽度、降低帧率 (以及 GIF 颜色数 / WebP 质量) 后重新编码。
+
+    Args:
+        source_path (str): 输入视频。
+        output_path (str): 输出 .gif 或 .webp 路径。
+        options (EncodeOptions | None): 编码参数，默认为 EncodeOptions()。
+        output_callback (callable | None): 接收 RenderEvent 的函数。
+        job (RenderJob | None): 所属任务的句柄，取消时终止 ffmpeg。
+
+    Returns:
+        int | None: ffmpeg 返回代码。
+    """
+    options = replace(options or EncodeOptions())
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    code = _encode_once(source_path, output_path, options, output_callback, job)
+    for _ in range(_MAX_SIZE_ATTEMPTS):
+        if code != 0 or not options.target_bytes or not os.path.exists(output_path):
+            break
+        size = os.path.getsize(output_path)
+        if size <= options.target_bytes:
+            break
+        # 文件大小近似与像素数和帧数成正比
+        scale = max(0.5, min(0.9, (options.target_bytes / size) ** 0.5))
+        options = replace(
+            options,
+            max_width=max(160, int((options.max_width or 1920) * scale) // 2 * 2),
+            max_fps=max(8, round((options.max_fps or 30) * scale)),
+            colors=max(32, options.colors // 2),
+            webp_quality=max(30, options.webp_quality - 10),
+        )
+        if output_callback:
+            output_callback(LogLine(f"{os.path.basename(output_path)} 为 {size / 1024 ** 2:.1f}MB，超过目标大小，"
+                                    f"以 {options.max_width}px / {options.max_fps}fps 重新编码\n"))
+        code = _encode_once(source_path, output_path, options, output_callback, job)
+    return code
+
+def encode_still(source_path, output_path, options=None, output_callback=None, job=None):
+    """把单帧图片 (静态场景的 PNG) 转换为单帧 WebP 或 GIF，按扩展名选择格式。
+
+    只使用 options 中的宽度上限、GIF 颜色数 / 抖动和 WebP 质量。
+
+    Returns:
+        int | None: ffmpeg 返回代码。
+    """
+    options = options or EncodeOptions()
+    scale = f"scale='min({int(options.max_width)},iw)':-2:flags=lanczos" if options.max_width else "null"
+    if output_path.lower().endswith(".gif"):
+        # 单帧只需一遍：同一滤镜图中生成调色板并映射
+        codec = ["-lavfi", f"{scale},split[a][b];[a]palettegen=max_colors={options.colors}[p];"
+                           f"[b][p]paletteuse=dither={options.dither}"]
+    else:
+        codec = ["-vf", scale, "-c:v", "libwebp", "-q:v", str(options.webp_quality)]
+    return run_ffmpeg(["-i", source_path, "-frames:v", "1"] + codec + [output_path], output_callback, job=job)
+
+def encode_animations(sources, formats=("gif",), options=None, output_callback=None, max_workers=None, job=None):
+    """把多个场景的视频并行编码为 GIF / WebP。
+
+    Args:
+        sources (list[str]): 输入视频列表。
+        formats (tuple[str]): "gif" 和 / 或 "webp"。
+        max_workers (int | None): 同时运行的编码任务数，默认为 CPU 核心数。
+
+    Returns:
+        dict: {输出路径: ffmpeg 返回代码}。
+    """
+    tasks = [(source, derived_format_path(source, output_format)) for source in sources for output_format in formats]
+    if not tasks:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers or min(len(tasks), os.cpu_count() or 1),
+                            thread_name_prefix="encode") as executor:
+        futures = {output: executor.submit(encode_animation, source, output, options, output_callback, job)
+                   for source, output in tasks}
+        return {output: future.result() for output, future in futures.items()}
+
+def _run_tasks(tasks, max_workers=None):
+    """并行执行 {名称: (输出路径, 函数)}，返回 {名称: 输出路径 (失败时为 None)}。"""
+    results = {}
+    if not tasks:
+        return results
+    with ThreadPoolExecutor(max_workers=max_workers or len(tasks), thread_name_prefix="transcode") as executor:
+        futures = {name: executor.submit(function) for name, (_, function) in tasks.items()}
+        for name, future in futures.items():
+            results[name] = tasks[name][0] if future.result() == 0 else None
+    return results
+
+def _quality_tasks(source_path, quality_flags, overrides, output_callback, job):
+    """返回缩放任务 {质量参数: (输出路径, 函数)} 和与渲染结果相同而无需缩放的质量列表。"""
+    tasks, unchanged = {}, []
+    for flag in quality_flags:
+        width, height, frame_rate = quality_profile(flag, overrides)
+        output_path = derived_output_path(source_path, height, frame_rate)
+        if os.path.abspath(output_path) == os.path.abspath(source_path):
+            # 脚本固定了像素尺寸和帧率时，不同质量的输出相同
+            unchanged.append(flag)
+            continue
+        tasks[flag] = (output_path, lambda output_path=output_path, width=width, height=height,
+                       frame_rate=frame_rate: scale_video(source_path, output_path, width, height, frame_rate,
+                                                          output_callback, job))
+    return tasks, unchanged
+
+def _format_tasks(source_path, formats, output_callback, job, encode_options=None):
+    """返回派生格式任务 {格式: (输出路径, 函数)}。"""
+    tasks = {}
+    for output_format in formats:
+        output_path = derived_format_path(source_path, output_format)
+        if output_format == "png":
+            function = lambda output_path=output_path: extract_last_frame(source_path, output_path,
+                                                                          output_callback, job)
+        else:
+            function = lambda output_path=output_path: encode_animation(source_path, output_path, encode_options,
+                                                                        output_callback, job)
+        tasks[output_format] = (output_path, function)
+    return tasks
+
+def _still_tasks(source_path, formats, output_callback, job, encode_options=None):
+    """静态场景 (快速路径输出的 PNG) 的派生格式任务 {格式: (输出路径, 函数)}，PNG 本身无需派生。"""
+    base, _ = os.path.splitext(os.path.abspath(source_path))
+    return {output_format: (f"{base}.{output_format}",
+                            lambda output_path=f"{base}.{output_format}": encode_still(
+                                source_path, output_path, encode_options, output_callback, job))
+            for output_format in formats if output_format != "png"}
+
+def derive_quality_outputs(source_path, quality_flags, overrides=None, output_callback=None, max_workers=None,
+                           job=None):
+    """由一个高质量渲染结果并行缩放出其他质量的视频。
+
+    Args:
+        source_path (str): 最高质量的渲染结果。
+        quality_flags (list[str]): 需要派生的质量参数。
+        overrides (dict | None): 脚本中模块级的 config 赋值 (例如固定的像素尺寸)。
+        output_callback (callable | None): 接收 RenderEvent 的函数。
+        max_workers (int | None): 同时运行的 ffmpeg 进程数，默认每个质量一个。
+        job (RenderJob | None): 所属任务的句柄，取消时终止 ffmpeg。
+
+    Returns:
+        dict: {质量参数: 输出路径}，失败的质量为 None；与渲染结果相同的质量为 source_path。
+    """
+    tasks, unchanged = _quality_tasks(source_path, quality_flags, overrides, output_callback, job)
+    results = _run_tasks(tasks, max_workers)
+    results.update((flag, source_path) for flag in unchanged)
+    return results
+
+def derive_format_outputs(source_path, formats, output_callback=None, max_workers=None, job=None,
+                          encode_options=None):
+    """由渲染出的视频并行生成其他格式 (DERIVED_FORMATS 中的 png / gif / webp)。
+
+    Returns:
+        dict: {格式: 输出路径}，失败的格式为 None。
+    """
+    return _run_tasks(_format_tasks(source_path, formats, output_callback, job, encode_options), max_workers)
+
+def run_with_derived_outputs(command_list, output_callback, quality_flags=(), formats=(), run=_run_process,
+                             job=None, encode_options=None):
+    """执行渲染，成功后由输出视频并行派生 quality_flags 中的其他质量和 formats 中的其他格式。
+
+    命令本身应使用需要的最高质量，GIF / WebP 按 encode_options (EncodeOptions) 编码。
+    静态场景走快速路径 (只输出 PNG) 时，GIF / WebP 由该 PNG 生成单帧图片，不派生其他质量。
+    派生文件同样以 FileReady 事件回传；RenderFinished 在全部派生完成后回传，
+    耗时包括派生，任一派生失败时返回代码为 1。
+
+    Returns:
+        int | None: 返回代码。
+    """
+    quality_flags, formats = list(quality_flags or []), list(formats or [])
+    info = parse_manim_command(command_list)
+    if info is None or not (quality_flags or formats):
+        return run(command_list, output_callback, job=job)
+
+    start = time.monotonic()
+    outputs = []
+    finished = []
+
+    def collect(event):
+        if event.job is None and isinstance(event, RenderFinished):
+            finished.append(event) # 全部派生完成后再回传
+            return
+        if event.job is None and isinstance(event, FileReady):
+            outputs.append(event.path)
+        output_callback(event)
+
+    return_code = run(command_list, collect, job=job)
+    cached = bool(finished) and finished[-1].cached
+    videos = [path for path in outputs if os.path.splitext(path)[1].lower() in _VIDEO_CODECS]
+    stills = [] if videos else [path for path in outputs if path.lower().endswith(".png")]
+    if return_code == 0 and not (job is not None and job.cancelled):
+        if not videos and not stills:
+            output_callback(LogLine("渲染结果中没有视频，跳过派生导出。\n"))
+        if stills and quality_flags:
+            output_callback(LogLine(f"静态场景只导出单帧，不派生 {', '.join(quality_flags)}。\n"))
+        overrides = get_config_overrides(info["script"]) if quality_flags else None
+        for source_path in dict.fromkeys(videos or stills):
+            if videos:
+                output_callback(LogLine(f"--- 由渲染结果派生 {', '.join(quality_flags + formats)}: {source_path} ---\n"))
+                # 缩放和格式转换在同一个线程池中并行执行
+                tasks, unchanged = _quality_tasks(source_path, quality_flags, overrides, output_callback, job)
+                tasks.update(_format_tasks(source_path, formats, output_callback, job, encode_options))
+            else:
+                tasks, unchanged = _still_tasks(source_path, formats, output_callback, job, encode_options), []
+                if tasks:
+                    output_callback(LogLine(f"--- 由单帧图片生成 {', '.join(tasks)}: {source_path} ---\n"))
+            for flag in unchanged:
+                output_callback(LogLine(f"{flag} 与渲染结果的分辨率和帧率相同，直接使用: {source_path}\n"))
+            for name, path in _run_tasks(tasks).items():
+                if path is None:
+                    return_code = 1
+                    output_callback(LogLine(f"派生 {name} 失败。\n"))
+                else:
+                    output_callback(LogLine(f"File ready at '{path}'\n"))
+                    output_callback(FileReady(path))
+    output_callback(RenderFinished(return_code, time.monotonic() - start, cached=cached,
+                                   cancelled=job is not None and job.cancelled))
+    return return_code
+
+# 示例用法：
+#     python core/transcode.py media/videos/scene/2160p60/MyScene.mp4 -qh -ql png webp
+#     python core/transcode.py --encode media/videos/scene/1080p60/*.mp4   # 并行编码 GIF 和 WebP
+if __name__ == '__main__':
+    import sys
+    print_event = lambda event: print(event.text, end='')
+    if sys.argv[1] == "--encode":
+        preset = ENCODE_PRESETS["卡片 (720px, 15fps, 5MB)"]
+        print(encode_animations(sys.argv[2:], ("gif", "webp"), preset, output_callback=print_event))
+        sys.exit(0)
+    source = sys.argv[1]
+    flags = [arg for arg in sys.argv[2:] if arg in QUALITY_PROFILES]
+    formats = [arg for arg in sys.argv[2:] if arg in DERIVED_FORMATS]
+    print(derive_quality_outputs(source, flags, output_callback=print_event))
+    print(derive_format_outputs(source, formats, output_callback=print_event))
@@ -0,0 +1,259 @@
+# core/warm_worker.py - 预热的 Manim fork-server 进程
+#
+# 由 manim_runner.WarmWorkerPool 使用目标 Python 解释器启动:
+#     python warm_worker.py --max-children 4
+# 启动时预先导入 manim (以及 numpy、cairo、pango 等依赖)，之后每个渲染任务
+# fork 出一个子进程执行，子进程继承已导入的模块和未被修改过的全局 config，
+# 因此省去了每次渲染的解释器启动和导入开销。
+#
+# 通信协议 (每行一个 JSON 对象):
+#   stdin  <- {"op": "render", "id": "...", "argv": [...], "cwd": "..."}
+#             {"op": "cancel", "id": "..."}
+#             {"op": "shutdown"}
+#   stdout -> {"type": "ready", "manim_version": "...", "import_seconds": 1.23}
+#             {"type": "started", "id": "...", "pid": 1234}
+#             {"type": "output", "id": "...", "text": "..."}
+#             {"type": "exit", "id": "...", "code": 0, "duration": 1.23}
+#             {"type": "error", "message": "..."}
+
+import argparse
+import codecs
+import collections
+import json
+import os
+import selectors
+import signal
+import sys
+import time
+import traceback
+
+# 取消任务时，从 SIGTERM 到 SIGKILL 的等待时间 (秒)
+KILL_GRACE_SECONDS = 3.0
+# 协议输出使用的文件描述符，在 main() 中从原始 stdout 复制得到
+_protocol_fd = None
+
+def _send(message):
+    """向客户端发送一条协议消息。"""
+    data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+    while data:
+        written = os.write(_protocol_fd, data)
+        data = data[written:]
+
+def _preload():
+    """预先导入 manim 及其命令行入口，返回 manim 版本号。"""
+    import manim
+    from manim.__main__ import main as _manim_main # noqa: F401 预热 CLI 模块
+    return getattr(manim, "__version__", "unknown")
+
+def _reload_config():
+    """按当前工作目录重新读取 manim.cfg，得到与新进程一致的全局 config。"""
+    from manim import config
+    from manim._config.utils import make_config_parser
+    config.digest_parser(make_config_parser())
+
+def _run_child(job, out_fd):
+    """在 fork 出的子进程中执行一次 manim 命令，结束时直接退出进程。"""
+    code = 1
+    try:
+        # 子进程不读取控制通道，stdout/stderr 都写入该任务的管道
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        os.dup2(out_fd, 1)
+        os.dup2(out_fd, 2)
+        os.close(out_fd)
+        os.close(_protocol_fd)
+        sys.stdout = open(1, "w", encoding="utf-8", errors="replace", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", encoding="utf-8", errors="replace", buffering=1, closefd=False)
+
+        cwd = job.get("cwd")
+        if cwd and os.path.abspath(cwd) != os.getcwd():
+            os.chdir(cwd)
+        # 每个任务都重新读取 manim.cfg：预热后修改的配置也要生效
+        _reload_config()
+
+        from manim.__main__ import main as manim_main
+        argv = list(job.get("argv", []))
+        sys.argv = ["manim"] + argv
+        try:
+            manim_main.main(args=argv, prog_name="manim", standalone_mode=True)
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(code)
+
+def _fork_job(job, children):
+    """为任务 fork 一个子进程，返回 (读取端 fd, 子进程信息)。"""
+    read_fd, write_fd = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        # 每个渲染子进程自成一个会话，取消时可以连同 ffmpeg、latex 进程一起终止
+        os.setsid()
+        os.close(read_fd)
+        for fd in list(children):
+            os.close(fd)
+        _run_child(job, write_fd) # 不会返回
+    os.close(write_fd)
+    os.set_blocking(read_fd, False)
+    child = {
+        "id": job["id"],
+        "pid": pid,
+        "decoder": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+        "start": time.monotonic(),
+        "kill_at": None,
+    }
+    return read_fd, child
+
+def _terminate_child(child):
+    """向子进程所在的进程组发送 SIGTERM，超时后由主循环发送 SIGKILL。"""
+    try:
+        os.killpg(child["pid"], signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    child["kill_at"] = time.monotonic() + KILL_GRACE_SECONDS
+
+def _finish_child(fd, child):
+    """回收子进程并发送退出消息。"""
+    tail = child["decoder"].decode(b"", final=True)
+    if tail:
+        _send({"type": "output", "id": child["id"], "text": tail})
+    os.close(fd)
+    _, status = os.waitpid(child["pid"], 0)
+    _send({
+        "type": "exit",
+        "id": child["id"],
+        "code": os.waitstatus_to_exitcode(status),
+        "duration": time.monotonic() - child["start"],
+    })
+
+def serve(max_children):
+    """fork-server 主循环：读取控制消息、派生子进程并转发其输出。"""
+    selector = selectors.DefaultSelector()
+    selector.register(0, selectors.EVENT_READ, data=None)
+    children = {}                     # {读取端 fd: 子进程信息}
+    pending = collections.deque()     # 等待空闲槽位的任务
+    control_buffer = b""
+    accepting = True                  # 是否仍接受新任务
+    terminate = False                 # 控制通道关闭时终止正在运行的子进程
+
+    while accepting or children:
+        for key, _ in selector.select(timeout=0.5):
+            fd = key.fd
+            if key.data is None: # 控制通道
+                data = os.read(fd, 65536)
+                if not data:
+                    # 客户端已退出：不再留下孤儿渲染进程
+                    selector.unregister(fd)
+                    accepting = False
+                    terminate = True
+                    pending.clear()
+                    continue
+                control_buffer += data
+                while b"\n" in control_buffer:
+                    raw, control_buffer = control_buffer.split(b"\n", 1)
+                    if not raw.strip():
+                        continue
+                    try:
+                        message = json.loads(raw.decode("utf-8"))
+                    except ValueError as e:
+                        _send({"type": "error", "message": f"无法解析控制消息: {e}"})
+                        continue
+                    op = message.get("op")
+                    if op == "render" and accepting:
+                        pending.append(message)
+                    elif op == "cancel":
+                        job_id = message.get("id")
+                        for job in [job for job in pending if job.get("id") == job_id]:
+                            pending.remove(job)
+                            _send({"type": "exit", "id": job_id, "code": -signal.SIGTERM, "duration": 0.0})
+                        for child in children.values():
+                            if child["id"] == job_id and child["kill_at"] is None:
+                                _terminate_child(child)
+                    elif op == "shutdown":
+                        accepting = False
+                        pending.clear()
+                        selector.unregister(fd)
+                        break
+            else:
+                child = key.data
+                try:
+                    data = os.read(fd, 65536)
+                except BlockingIOError:
+                    continue
+                if data:
+                    text = child["decoder"].decode(data)
+                    if text:
+                        _send({"type": "output", "id": child["id"], "text": text})
+                else:
+                    selector.unregister(fd)
+                    del children[fd]
+                    _finish_child(fd, child)
+
+        if terminate:
+            for child in children.values():
+                _terminate_child(child)
+            terminate = False
+
+        now = time.monotonic()
+        for child in children.values():
+            if child["kill_at"] is not None and now >= child["kill_at"]:
+                try:
+                    os.killpg(child["pid"], signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                child["kill_at"] = float("inf")
+
+        while pending and len(children) < max_children:
+            job = pending.popleft()
+            try:
+                read_fd, child = _fork_job(job, children)
+            except OSError as e:
+                _send({"type": "output", "id": job.get("id"), "text": f"无法派生渲染进程: {e}\n"})
+                _send({"type": "exit", "id": job.get("id"), "code": 1, "duration": 0.0})
+                continue
+            children[read_fd] = child
+            _send({"type": "started", "id": child["id"], "pid": child["pid"]})
+            selector.register(read_fd, selectors.EVENT_READ, data=child)
+
+def main():
+    global _protocol_fd
+    parser = argparse.ArgumentParser(description="预热的 Manim fork-server 渲染进程")
+    parser.add_argument("--max-children", type=int, default=os.cpu_count() or 1,
+                        help="同时运行的渲染子进程数量上限")
+    args = parser.parse_args()
+
+    # 复制一份原始 stdout 专用于协议，并把 fd 1 指向 stderr，
+    # 避免导入 manim 时的任何打印破坏协议输出
+    _protocol_fd = os.dup(1)
+    os.dup2(2, 1)
+
+    start = time.monotonic()
+    try:
+        manim_version = _preload()
+    except Exception as e:
+        _send({"type": "error", "message": f"预加载 manim 失败: {e}"})
+        return 1
+    _send({"type": "ready", "manim_version": manim_version, "import_seconds": time.monotonic() - start})
+
+    serve(max(1, args.max_children))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,8 +8,8 @@ import threading
 import os
 import sys
 import shutil # 用于查找 python 解释器
-import glob # 用于查找文件
 import re # 用于解析版本号
+import time # 用于统计日志刷新耗时
 from packaging import version # 新增：用于更健壮的版本比较
 
 # 确保 core 目录在 Python 路径中
@@ -28,8 +28,19 @@ if core_dir not in sys.path:
 
 try:
     # 尝试导入，如果失败，则打印更详细的错误信息
-    from core.script_parser import get_scene_names
-    from core.manim_runner import run_manim_command
+    from core.class_index import find_scene_names, get_index
+    from core.cost_estimator import LONG_RENDER_PIXELS, estimate_script, format_cost, order_longest_first
+    from core.file_watcher import FileWatcher
+    from core.scene_fingerprint import get_scene_fingerprints, changed_scenes
+    from core.manim_runner import run_manim_jobs, build_scene_jobs, WarmWorkerPool
+    from core.render_cache import RenderCache
+    from core.telemetry import TelemetryStore, format_expected
+    from core.log_pipeline import LogPipeline
+    from core.command_builder import build_manim_command, split_render_qualities
+    from core.transcode import ENCODE_PRESETS
+    from core.file_opener import open_path
+    from core.tex_cache import get_default_tex_cache_dir
+    from core.render_events import ProgressTracker, RenderFinished, format_event
 except ImportError as e:
     print(f"导入 core 模块时出错: {e}")
     print("当前的 Python 搜索路径 (sys.path):")
@@ -42,6 +53,8 @@ except ImportError as e:
     # 抛出更具体的错误，以便用户知道问题所在
     raise ImportError(f"无法导入 core 模块。请检查上述路径和运行方式。原始错误: {e}")
 
+# 关闭窗口时等待渲染进程自行退出的时间 (秒)，超时后立即强制终止
+CLOSE_GRACE_SECONDS = 0.5
 
 class ManimGUI(ctk.CTk):
     def __init__(self):
@@ -56,13 +69,29 @@ class ManimGUI(ctk.CTk):
         self.selected_scene = ctk.StringVar(value="选择场景") # 当前选择的场景名称
         self.selected_quality = ctk.StringVar(value="高质量 (-qh)") # 当前选择的渲染质量
         self.selected_format = ctk.StringVar(value="MP4 (视频)")   # 当前选择的输出格式
+        self.encode_preset = ctk.StringVar(value=next(iter(ENCODE_PRESETS))) # GIF / WebP 的尺寸、帧率和大小预设
         self.transparent_bg = ctk.BooleanVar(value=False)     # 是否使用透明背景
+        self.use_warm_worker = ctk.BooleanVar(value=False)    # 是否使用预热的常驻渲染进程
+        self.use_render_cache = ctk.BooleanVar(value=True)    # 是否复用未改变场景的渲染结果
+        self.use_chunked_render = ctk.BooleanVar(value=False) # 是否把单个场景分段并行渲染
+        self.watch_mode = ctk.BooleanVar(value=False)         # 是否在脚本保存后自动以草稿质量重新渲染改变的场景
         self.preview_action = ctk.StringVar(value="播放视频/图片 (-p)") # 渲染后的预览操作
         self.python_path = ctk.StringVar()         # 当前选择的 Python 解释器路径
         self.output_dir = ctk.StringVar()          # 当前选择的输出目录路径
         self._internal_output_dir = ""             # 内部使用的输出目录路径（命令行调用时使用）
         self.is_rendering = False                    # 标记当前是否正在渲染
-        self.parent_dir_scripts = {}                 # 存储扫描到的父目录脚本 {显示名: 路径}
+        self.scene_names = []                        # 当前脚本解析到的场景名称列表
+        self.warm_pool = None                        # 预热的常驻渲染进程 (WarmWorkerPool)
+        self.render_job = None                       # 正在运行的渲染任务句柄 (RenderJob)
+        self.file_watcher = None                     # 监视模式的文件监视器 (FileWatcher)
+        self.watch_fingerprints = {}                 # 监视模式下各场景上次渲染时的指纹 {类名: 指纹}
+        self.watch_pending = set()                   # 渲染进行中时保存的场景，渲染结束后再处理
+        self.render_cache = RenderCache()            # 渲染结果缓存
+        self.telemetry = TelemetryStore()            # 渲染记录 (耗时、CPU 时间、峰值内存)
+        self.log_pipeline = LogPipeline()            # 合并刷新、限制行数并写入轮转文件的日志管道
+        self.progress_trackers = {}                  # 各渲染任务的进度 {任务名称: ProgressTracker}
+        self._progress_dirty = False                 # 进度是否有未显示的更新
+        self.parent_dir_scripts = {}                 # 存储扫描到的父目录 (含子目录) 场景脚本 {显示名: 路径}
         self.BROWSE_FILES_OPTION = "浏览文件..."      # 脚本下拉菜单的浏览选项文本
         self.python_interpreters = {}                # 存储扫描到的 Python 解释器 {显示名: 路径}
         self.BROWSE_PYTHON_OPTION = "浏览解释器..."   # Python 下拉菜单的浏览选项文本
@@ -80,8 +109,10 @@ class ManimGUI(ctk.CTk):
         # 初始化时显示占位符
         self.output_dir.set("[脚本同级media目录]") 
         self._initialize_paths() # 初始化路径 (会设置 python_path 的初始值)
-        self._scan_parent_directory_scripts() # 启动时扫描父目录脚本
+        self._scan_parent_directory_scripts() # 启动时在后台扫描父目录脚本
         self._scan_python_interpreters() # 新增：启动时扫描 Python 解释器
+        self.protocol("WM_DELETE_WINDOW", self._on_close) # 关闭窗口时清理常驻渲染进程
+        self._schedule_log_flush() # 启动日志定时刷新
 
     def _create_widgets(self):
         # --- 配置区域 ---
@@ -206,6 +237,44 @@ class ManimGUI(ctk.CTk):
         )
         self.format_menu.grid(row=0, column=5, padx=5, pady=5, sticky="ew")
         self.format_map = format_options
+
+        # 多质量导出：勾选的质量与上面的渲染质量一起导出，只渲染其中最高的质量，其余由 ffmpeg 缩放得到
+        extra_quality_label = ctk.CTkLabel(scene_frame, text="同时导出:", anchor="w")
+        extra_quality_label.grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        extra_quality_frame = ctk.CTkFrame(scene_frame, fg_color="transparent")
+        extra_quality_frame.grid(row=1, column=1, columnspan=5, padx=0, pady=0, sticky="w")
+        self.extra_quality_vars = {}
+        self.extra_output_checkboxes = []
+        for column, (quality_text, quality_flag) in enumerate(quality_options.items()):
+            variable = ctk.BooleanVar(value=False)
+            checkbox = ctk.CTkCheckBox(extra_quality_frame, text=quality_text, variable=variable)
+            checkbox.grid(row=0, column=column, padx=5, pady=5, sticky="w")
+            self.extra_quality_vars[quality_flag] = variable
+            self.extra_output_checkboxes.append(checkbox)
+
+        # 多格式导出：由渲染出的 MP4 生成最后一帧 PNG、GIF 和 WebP，不再为每种格式单独渲染
+        extra_format_label = ctk.CTkLabel(scene_frame, text="同时生成:", anchor="w")
+        extra_format_label.grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        extra_format_frame = ctk.CTkFrame(scene_frame, fg_color="transparent")
+        extra_format_frame.grid(row=2, column=1, columnspan=5, padx=0, pady=0, sticky="w")
+        extra_format_options = {"PNG (最后一帧)": "png", "GIF (调色板)": "gif", "WebP (动图)": "webp"}
+        self.extra_format_vars = {}
+        for column, (format_text, extra_format) in enumerate(extra_format_options.items()):
+            variable = ctk.BooleanVar(value=False)
+            checkbox = ctk.CTkCheckBox(extra_format_frame, text=format_text, variable=variable)
+            checkbox.grid(row=0, column=column, padx=5, pady=5, sticky="w")
+            self.extra_format_vars[extra_format] = variable
+            self.extra_output_checkboxes.append(checkbox)
+        encode_preset_label = ctk.CTkLabel(extra_format_frame, text="动图:", anchor="w")
+        encode_preset_label.grid(row=0, column=len(extra_format_options), padx=5, pady=5, sticky="w")
+        self.encode_preset_menu = ctk.CTkOptionMenu(
+            extra_format_frame,
+            variable=self.encode_preset,
+            values=list(ENCODE_PRESETS.keys()),
+            width=180
+        )
+        self.encode_preset_menu.grid(row=0, column=len(extra_format_options) + 1, padx=5, pady=5, sticky="w")
+        self.extra_output_checkboxes.append(self.encode_preset_menu)
         
         current_row += 1
 
@@ -214,9 +283,13 @@ class ManimGUI(ctk.CTk):
         render_options_frame = ctk.CTkFrame(config_frame)
         render_options_frame.grid(row=current_row, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
         render_options_frame.grid_columnconfigure(0, weight=0, minsize=100)  # 透明背景复选框
-        render_options_frame.grid_columnconfigure(1, weight=0, minsize=100)  # 渲染后标签
-        render_options_frame.grid_columnconfigure(2, weight=1, minsize=120)  # 渲染后下拉框
-        render_options_frame.grid_columnconfigure(3, weight=0, minsize=120)  # 开始渲染按钮
+        render_options_frame.grid_columnconfigure(1, weight=0, minsize=100)  # 预热进程复选框
+        render_options_frame.grid_columnconfigure(2, weight=0, minsize=100)  # 渲染缓存复选框
+        render_options_frame.grid_columnconfigure(3, weight=0, minsize=100)  # 分段并行复选框
+        render_options_frame.grid_columnconfigure(4, weight=0, minsize=100)  # 监视模式复选框
+        render_options_frame.grid_columnconfigure(5, weight=0, minsize=100)  # 渲染后标签
+        render_options_frame.grid_columnconfigure(6, weight=1, minsize=120)  # 渲染后下拉框
+        render_options_frame.grid_columnconfigure(7, weight=0, minsize=120)  # 开始渲染按钮
         
         # 透明背景复选框 - 移除标签
         self.transparent_checkbox = ctk.CTkCheckBox(
@@ -226,9 +299,43 @@ class ManimGUI(ctk.CTk):
         )
         self.transparent_checkbox.grid(row=0, column=0, padx=5, pady=5, sticky="w")
 
+        # 预热进程复选框 (仅 POSIX 平台可用)
+        self.warm_worker_checkbox = ctk.CTkCheckBox(
+            render_options_frame,
+            text="预热进程",
+            variable=self.use_warm_worker,
+            state="normal" if WarmWorkerPool.is_supported() else "disabled"
+        )
+        self.warm_worker_checkbox.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+
+        # 渲染缓存复选框：脚本和参数未改变时直接复用上次的输出
+        self.render_cache_checkbox = ctk.CTkCheckBox(
+            render_options_frame,
+            text="渲染缓存",
+            variable=self.use_render_cache
+        )
+        self.render_cache_checkbox.grid(row=0, column=2, padx=5, pady=5, sticky="w")
+
+        # 分段并行复选框：把单个长场景按动画分段，多进程渲染后无损拼接
+        self.chunked_render_checkbox = ctk.CTkCheckBox(
+            render_options_frame,
+            text="分段并行",
+            variable=self.use_chunked_render
+        )
+        self.chunked_render_checkbox.grid(row=0, column=3, padx=5, pady=5, sticky="w")
+
+        # 监视模式复选框：脚本保存后以草稿质量 (-ql) 只重新渲染改变的场景
+        self.watch_checkbox = ctk.CTkCheckBox(
+            render_options_frame,
+            text="监视模式",
+            variable=self.watch_mode,
+            command=self._on_watch_toggled
+        )
+        self.watch_checkbox.grid(row=0, column=4, padx=5, pady=5, sticky="w")
+
         # 渲染后操作
         preview_label = ctk.CTkLabel(render_options_frame, text="渲染后:", anchor="w")
-        preview_label.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        preview_label.grid(row=0, column=5, padx=5, pady=5, sticky="w")
         
         preview_options = {
             "无操作": "none", "播放视频/图片 (-p)": "-p", "打开文件夹 (-f)": "-f"
@@ -240,7 +347,7 @@ class ManimGUI(ctk.CTk):
             values=list(preview_options.keys()), 
             width=120
         )
-        self.preview_menu.grid(row=0, column=2, padx=5, pady=5, sticky="ew")
+        self.preview_menu.grid(row=0, column=6, padx=5, pady=5, sticky="ew")
         self.preview_map = preview_options
 
         # 渲染按钮
@@ -251,7 +358,19 @@ class ManimGUI(ctk.CTk):
             state="disabled", 
             width=120
         )
-        self.render_button.grid(row=0, column=3, padx=5, pady=5, sticky="ew")
+        self.render_button.grid(row=0, column=7, padx=5, pady=5, sticky="ew")
+
+        current_row += 1
+
+        # --- 渲染进度 --- # 根据渲染事件显示整体进度和预计剩余时间
+        progress_frame = ctk.CTkFrame(config_frame)
+        progress_frame.grid(row=current_row, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+        progress_frame.grid_columnconfigure(0, weight=1)
+        self.progress_bar = ctk.CTkProgressBar(progress_frame)
+        self.progress_bar.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
+        self.progress_bar.set(0)
+        self.progress_label = ctk.CTkLabel(progress_frame, text="", anchor="w", width=360)
+        self.progress_label.grid(row=0, column=1, padx=5, pady=5, sticky="w")
 
         current_row += 1
 
@@ -479,61 +598,69 @@ class ManimGUI(ctk.CTk):
         self._update_output_log("Python 解释器扫描完成。\n")
 
     def _scan_parent_directory_scripts(self):
-        """扫描 main.py 父目录中的 .py 文件并更新脚本下拉菜单。
-        如果只找到一个有效脚本，则自动选中它。
+        """在后台线程中递归扫描 main.py 父目录，找出包含场景的脚本并更新脚本下拉菜单。
+
+        使用保存在缓存目录的类索引，只重新解析修改过的文件 (较多时在进程池中并行解析)，
+        扫描结果通过 self.after 回到界面线程显示。
         """
-        try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            parent_dir = os.path.dirname(script_dir)
-            self._update_output_log(f"正在扫描父目录 {parent_dir} 中的 Python 脚本...\\n")
-
-            py_files = glob.glob(os.path.join(parent_dir, "*.py"))
-            self.parent_dir_scripts = {} # 清空旧列表
-
-            found_scripts = []
-            valid_script_paths = {}
-            if py_files:
-                for file_path in py_files:
-                    file_name = os.path.basename(file_path)
-                    # 排除常见的非场景脚本文件
-                    if file_name == "__init__.py" or file_name == os.path.basename(__file__):
-                         continue
-                    # 进一步排除可能的配置文件或其他非Manim场景脚本
-                    # (可以根据需要添加更多排除规则)
-                    # if file_name.endswith("_config.py"):
-                    #     continue
-                    self.parent_dir_scripts[file_name] = file_path
-                    found_scripts.append(file_name)
-                    valid_script_paths[file_name] = file_path # 存储有效脚本
-
-            # 更新脚本下拉菜单的选项 (确保是升序排序)
-            sorted_script_names = sorted(list(self.parent_dir_scripts.keys()))
-            script_menu_options = [self.BROWSE_FILES_OPTION] + sorted_script_names
-            self.parent_script_menu.configure(values=script_menu_options)
-            self._update_output_log(f"在父目录找到脚本: {', '.join(sorted_script_names)}\\n")
-
-            # --- 自动选择逻辑 --- #
-            if len(valid_script_paths) == 1:
-                # 如果只找到一个有效脚本，自动选中它
-                auto_selected_name = list(valid_script_paths.keys())[0]
-                auto_selected_path = valid_script_paths[auto_selected_name]
-                
-                self.script_path.set(auto_selected_path)
-                self.parent_script_menu.set(auto_selected_name)
-                self._update_output_log(f"自动选中脚本: {auto_selected_name}\\n")
-                self._load_scenes() # 加载场景
-                # 立即更新默认输出目录显示
-                self._update_default_output_display(auto_selected_path) 
-            elif not self.script_path.get():
-                # 如果有多个脚本或没有脚本，且当前未选择脚本，则默认显示浏览选项
-                self.parent_script_menu.set(self.BROWSE_FILES_OPTION)
-                # 确保输出目录显示占位符 (如果需要)
-                self._update_default_output_display(None)
-            # 如果 self.script_path 已经有值（例如从上次会话加载），则保留
-            
-        except Exception as e:
-            self._update_output_log(f"扫描父目录脚本时出错: {e}\\n")
-            messagebox.showerror("扫描错误", f"扫描父目录脚本时出错: {e}")
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        parent_dir = os.path.dirname(script_dir)
+        self._update_output_log(f"正在扫描父目录 {parent_dir} 中的 Python 脚本...\n")
+
+        def scan():
+            try:
+                index = get_index(parent_dir, recursive=True)
+                changed = index.update()
+                scripts = index.scenes()
+            except Exception as e:
+                if self.winfo_exists():
+                    self.after(0, self._on_scan_failed, e)
+                return
+            if self.winfo_exists():
+                self.after(0, self._apply_scanned_scripts, parent_dir, scripts, len(changed))
+
+        threading.Thread(target=scan, name="script_scan", daemon=True).start()
+
+    def _on_scan_failed(self, error):
+        self._update_output_log(f"扫描父目录脚本时出错: {error}\n")
+        messagebox.showerror("扫描错误", f"扫描父目录脚本时出错: {error}")
+
+    def _apply_scanned_scripts(self, parent_dir, scripts, changed_count):
+        """显示扫描结果 (在界面线程中调用)。
+
+        Args:
+            parent_dir (str): 扫描的目录。
+            scripts (dict): {脚本绝对路径: 场景名称列表}，只包含有场景的脚本。
+            changed_count (int): 本次重新解析的文件数。
+        """
+        own_file = os.path.abspath(__file__)
+        # 子目录中的脚本以相对路径显示 (例如 "topic04/intro.py")
+        self.parent_dir_scripts = {os.path.relpath(path, parent_dir).replace("\\", "/"): path
+                                   for path in scripts if path != own_file}
+
+        # 更新脚本下拉菜单的选项 (确保是升序排序)
+        sorted_script_names = sorted(self.parent_dir_scripts)
+        script_menu_options = [self.BROWSE_FILES_OPTION] + sorted_script_names
+        self.parent_script_menu.configure(values=script_menu_options)
+        self._update_output_log(f"在父目录找到 {len(sorted_script_names)} 个场景脚本 (重新解析 {changed_count} 个文件): "
+                                f"{', '.join(sorted_script_names)}\n")
+
+        # --- 自动选择逻辑 --- #
+        if self.script_path.get():
+            return # 扫描期间用户已经选择了脚本，保留其选择
+        if len(self.parent_dir_scripts) == 1:
+            # 如果只找到一个有效脚本，自动选中它
+            auto_selected_name, auto_selected_path = next(iter(self.parent_dir_scripts.items()))
+            self.script_path.set(auto_selected_path)
+            self.parent_script_menu.set(auto_selected_name)
+            self._update_output_log(f"自动选中脚本: {auto_selected_name}\n")
+            self._load_scenes() # 加载场景
+            # 立即更新默认输出目录显示
+            self._update_default_output_display(auto_selected_path)
+        else:
+            # 如果有多个脚本或没有脚本，默认显示浏览选项
+            self.parent_script_menu.set(self.BROWSE_FILES_OPTION)
+            self._update_default_output_display(None)
 
     def _on_parent_script_selected(self, selected_name):
         """处理脚本下拉菜单的选择事件。"""
@@ -660,7 +787,11 @@ class ManimGUI(ctk.CTk):
         self.log_context_menu = tk.Menu(self.log_textbox, tearoff=0)
         self.log_context_menu.add_command(label="复制全部", command=self._copy_log_to_clipboard)
         self.log_context_menu.add_separator()
-        self.log_context_menu.add_command(label="清空日志", command=self._clear_log)
+        self.log_context_menu.add_command(label="清空日志", command=lambda: self._clear_log(discard_pending=True))
+        self.log_context_menu.add_command(label="打开完整日志文件", command=self._open_full_log)
+        self.log_context_menu.add_command(label="显示日志刷新统计", command=self._show_log_stats)
+        self.log_context_menu.add_separator()
+        self.log_context_menu.add_command(label="清除当前脚本的渲染缓存", command=self._invalidate_render_cache)
         self.log_textbox.bind("<Button-3>", self._show_log_context_menu)
         self.log_textbox.bind("<Button-2>", self._show_log_context_menu)
 
@@ -681,15 +812,52 @@ class ManimGUI(ctk.CTk):
         except Exception as e:
             messagebox.showerror("复制错误", f"无法复制日志: {e}")
 
-    def _clear_log(self):
-        """清空日志文本框的内容。"""
+    def _clear_log(self, discard_pending=False):
+        """清空日志文本框的内容。
+
+        Args:
+            discard_pending (bool): 同时丢弃尚未刷新到文本框的批量输出 (用户手动清空时)。
+                                    程序内部清空时保留，例如加载场景前写入的扫描结果。
+        """
         try:
+            if discard_pending:
+                self.log_pipeline.discard_pending() # 否则下一次刷新会把清空前的输出再写回文本框
             self.log_textbox.configure(state="normal") # 启用以便删除
             self.log_textbox.delete("1.0", "end")
             self.log_textbox.configure(state="disabled") # 删除后禁用
         except Exception as e:
             messagebox.showerror("清空错误", f"无法清空日志: {e}")
 
+    def _open_full_log(self):
+        """用系统默认程序打开完整的渲染日志文件。"""
+        log_file = self.log_pipeline.log_file
+        if not log_file or not os.path.exists(log_file):
+            messagebox.showinfo("完整日志", "尚未生成日志文件。")
+            return
+        try:
+            open_path(log_file)
+        except Exception as e:
+            messagebox.showerror("打开错误", f"无法打开日志文件 {log_file}: {e}")
+
+    def _show_log_stats(self):
+        """在日志中显示最近一秒的 UI 刷新负载统计。"""
+        stats = self.log_pipeline.stats()
+        self._update_output_log(
+            f"--- 日志刷新统计: {stats['flushes_per_second']} 次/秒 (上限 {stats['max_flushes_per_second']:.0f}), "
+            f"主线程耗时 {stats['ui_ms_per_second']:.1f} ms/秒, 单次最长 {stats['max_flush_ms']:.1f} ms, "
+            f"{stats['lines_per_second']} 行/秒, 仅写入文件的行数 {stats['dropped_lines']} ---\n"
+        )
+
+    def _invalidate_render_cache(self):
+        """删除当前脚本 (或选中场景) 的渲染缓存条目，下次渲染时强制重新执行 manim。"""
+        script = self.script_path.get()
+        if not script:
+            return
+        scene = self.selected_scene.get()
+        scene = scene if scene in self.scene_names else None
+        removed = self.render_cache.invalidate(script_path=script, scene=scene)
+        self._update_output_log(f"--- 已清除 {removed} 条渲染缓存 ---\n")
+
     def _load_scenes(self):
         """解析选定的 Manim 脚本文件，提取场景名称并更新场景下拉菜单。"""
         script = self.script_path.get()
@@ -704,7 +872,12 @@ class ManimGUI(ctk.CTk):
         self._clear_log()
         self._update_output_log(f"正在解析脚本: {os.path.basename(script)} ...\n")
 
-        scenes = get_scene_names(script)
+        if self.watch_mode.get() and (self.file_watcher is None or os.path.abspath(script) not in self.file_watcher.paths):
+            self._start_watching() # 切换脚本后监视新的脚本
+
+        # 基类可以来自同目录的其他脚本 (例如共用的卡片布局基类)
+        scenes = find_scene_names(script)
+        self.scene_names = scenes
         if scenes:
             options = ["全部场景 (-a)"] + scenes
             self.scene_menu.configure(values=options, state="normal")
@@ -718,25 +891,115 @@ class ManimGUI(ctk.CTk):
             self.scene_menu.configure(values=["未找到场景"], state="disabled")
             self.selected_scene.set("未找到场景")
             self.render_button.configure(state="disabled")
-            warning_message = f"在 {os.path.basename(script)} 中未找到有效的 Manim Scene 类。\n请确保类直接继承自 'Scene' 或 'manim.Scene'。"
+            warning_message = f"在 {os.path.basename(script)} 中未找到有效的 Manim Scene 类。\n请确保类 (直接或通过其他基类) 继承自 'Scene' 或 'manim.Scene'。"
             self._update_output_log(f"警告: {warning_message}\n")
             messagebox.showwarning("场景解析", warning_message)
 
     def _update_output_log(self, line):
-        """安全地将一行文本追加到日志文本框末尾。"""
-        def append_text(): # 在主线程中执行 UI 更新
-            try:
-                if not self.winfo_exists(): return # 防止窗口关闭后访问
-                self.log_textbox.configure(state="normal")
-                self.log_textbox.insert("end", line)
-                self.log_textbox.configure(state="disabled")
-                self.log_textbox.see("end")
-            except tk.TclError as e:
-                print(f"更新日志时捕获到 Tkinter 错误: {e}")
-            except Exception as e:
-                print(f"更新日志时发生未知错误: {e}")
+        """安全地将一行文本追加到日志 (可在任意线程调用，由定时刷新写入文本框)。"""
+        self.log_pipeline.write(line)
+
+    def _handle_render_event(self, event):
+        """处理渲染事件 (在渲染线程中调用)：写入日志并更新对应任务的进度。"""
+        self._update_output_log(format_event(event))
+        key = event.job or ""
+        tracker = self.progress_trackers.get(key)
+        if tracker is None:
+            tracker = self.progress_trackers.setdefault(key, ProgressTracker())
+        tracker.handle(event)
+        if isinstance(event, RenderFinished):
+            # 分段渲染的片段只在整个任务结束时才算完成
+            for other, child in list(self.progress_trackers.items()):
+                if self._is_sub_job(key, other):
+                    child.handle(event)
+        self._progress_dirty = True
+
+    @staticmethod
+    def _is_sub_job(key, other):
+        """other 是否为任务 key 的子任务 (例如分段渲染的片段)。"""
+        return other != key and (not key or other.startswith(key + " "))
+
+    def _update_progress_display(self):
+        """根据各任务的进度刷新进度条和剩余时间 (在主线程中执行)。
+
+        分段渲染时任务的进度由其各片段 ("任务名称 片段 i/K") 代替；整体进度取
+        各任务的平均值，并行任务的剩余时间取最大值。
+        """
+        if not self._progress_dirty:
+            return
+        self._progress_dirty = False
+        trackers = dict(self.progress_trackers)
+        leaves = [tracker for key, tracker in trackers.items()
+                  if not any(self._is_sub_job(key, other) for other in trackers)]
+        if not leaves:
+            return
+        fraction = sum(tracker.fraction() for tracker in leaves) / len(leaves)
+        finished = [tracker for tracker in leaves if tracker.finished]
+        if len(finished) == len(leaves):
+            failed = sum(1 for tracker in leaves if tracker.return_code != 0)
+            text = "渲染完成" if not failed else f"渲染结束，{failed} 个任务失败"
+        else:
+            parts = [f"进度 {fraction:.0%}"]
+            etas = [tracker.eta_seconds() for tracker in leaves if not tracker.finished]
+            if etas and None not in etas:
+                minutes, seconds = divmod(int(max(etas)), 60)
+                parts.append(f"剩余约 {minutes:02d}:{seconds:02d}")
+            if len(leaves) == 1 and leaves[0].current is not None:
+                current = leaves[0].current
+                total = f"/{leaves[0].total_animations}" if leaves[0].total_animations else ""
+                parts.append(f"动画 {current.index + 1}{total}")
+                if current.it_per_sec:
+                    parts.append(f"{current.it_per_sec:.1f} it/s")
+            elif len(leaves) > 1:
+                parts.append(f"已完成 {len(finished)}/{len(leaves)}")
+            text = " · ".join(parts)
+        try:
+            self.progress_bar.set(fraction)
+            self.progress_label.configure(text=text)
+        except tk.TclError as e:
+            print(f"更新进度时捕获到 Tkinter 错误: {e}")
+
+    def _schedule_log_flush(self):
+        """按日志管道的刷新间隔定时把积累的文本写入文本框，并刷新进度显示。"""
+        self._flush_log()
+        self._update_progress_display()
         if self.winfo_exists():
-            self.after(0, append_text)
+            self.after(int(self.log_pipeline.flush_interval * 1000), self._schedule_log_flush)
+
+    def _flush_log(self):
+        """一次性插入积累的日志文本，并裁剪文本框到最大行数 (在主线程中执行)。
+
+        进度条显示在文本框末尾 (带 "progress" 标签)，每次刷新时整体替换。
+        """
+        text, progress = self.log_pipeline.drain()
+        if not text and progress is None:
+            return
+        start = time.perf_counter()
+        try:
+            if not self.winfo_exists(): return # 防止窗口关闭后访问
+            self.log_textbox.configure(state="normal")
+            progress_range = self.log_textbox.tag_ranges("progress")
+            if progress_range:
+                if progress is None:
+                    # 进度条未变化：先取出，插入新日志后再放回末尾
+                    progress = self.log_textbox.get(progress_range[0], progress_range[-1]).lstrip("\n")
+                self.log_textbox.delete(progress_range[0], progress_range[-1])
+            self.log_textbox.insert("end", text)
+            if progress:
+                separator = "" if self.log_textbox.get("end-2c", "end-1c") in ("", "\n") else "\n"
+                self.log_textbox.insert("end", separator + progress, "progress")
+            # 只保留最后 max_lines 行 (完整日志在磁盘文件中)
+            line_count = int(self.log_textbox.index("end-1c").split(".")[0])
+            excess = line_count - self.log_pipeline.max_lines
+            if excess > 0:
+                self.log_textbox.delete("1.0", f"{excess + 1}.0")
+            self.log_textbox.configure(state="disabled")
+            self.log_textbox.see("end")
+        except tk.TclError as e:
+            print(f"更新日志时捕获到 Tkinter 错误: {e}")
+        except Exception as e:
+            print(f"更新日志时发生未知错误: {e}")
+        self.log_pipeline.record_flush(time.perf_counter() - start, text.count("\n"))
 
     def _update_default_output_display(self, script_path):
         """
@@ -809,7 +1072,6 @@ class ManimGUI(ctk.CTk):
         self._update_output_log("--- 开始构建 Manim 命令 ---\n")
 
         # --- 构建 Manim 命令行参数列表 --- #
-        command = [selected_py_path, "-m", "manim"]
         self._update_output_log(f"使用 Python: {selected_py_path}\\n")
 
         # --media_dir 
@@ -818,7 +1080,6 @@ class ManimGUI(ctk.CTk):
         # 在选择"浏览"时，会包含浏览的路径
         # 在选择"默认"但脚本无效时，为空字符串
         if output_path:
-            command.extend(["--media_dir", output_path])
             # 日志仍然显示内部使用的路径
             self._update_output_log(f"输出到目录: {output_path}\\n") 
         else:
@@ -826,65 +1087,235 @@ class ManimGUI(ctk.CTk):
             display_path = self.output_dir.get() 
             self._update_output_log(f"输出到目录: {display_path} (Manim将使用其默认行为)\\n")
 
-        # 质量标志 (-ql, -qm, -qh, ...)
         quality_flag = self.quality_map.get(quality_key, "-qh") # 默认高质量
-        command.append(quality_flag)
-
-        # 预览标志 (-p, -f, 或无)
+        output_format = self.format_map.get(format_key, "mp4")
         preview_flag = self.preview_map.get(preview_key)
+        # 多质量导出：以最高质量渲染一次，其余质量由渲染结果缩放得到
+        derived_qualities = None
+        extra_flags = [flag for flag, variable in self.extra_quality_vars.items()
+                       if variable.get() and flag != quality_flag]
+        # 多格式导出：由渲染出的视频生成最后一帧 PNG、GIF 和 WebP
+        derived_formats = [extra_format for extra_format, variable in self.extra_format_vars.items() if variable.get()]
+        if output_format == "gif":
+            # GIF 不再由 manim 直接编码 (--format gif 慢且文件大)：渲染 MP4 后用两遍调色板编码
+            output_format = "mp4"
+            derived_formats = ["gif"] + [extra_format for extra_format in derived_formats if extra_format != "gif"]
+            if preview_flag == "-p":
+                preview_flag = "-f"
+        if (extra_flags or derived_formats) and output_format != "mp4":
+            self._update_output_log("多质量 / 多格式导出需要以 MP4 渲染，忽略“同时导出”和“同时生成”。\n")
+            extra_flags, derived_formats = [], []
+        if extra_flags:
+            quality_flag, derived_qualities = split_render_qualities([quality_flag] + extra_flags)
+            self._update_output_log(f"多质量导出: 以 {quality_flag} 渲染，缩放得到 {', '.join(derived_qualities)}\n")
+        if derived_formats:
+            self._update_output_log(f"多格式导出: 由渲染出的视频生成 {', '.join(derived_formats)}"
+                                    f" (动图: {self.encode_preset.get()})\n")
+
+        # 质量 (-ql, -qm, -qh, ...)、输出格式 (--format gif / -s)、透明度 (-t) 和预览 (-p / -f) 标志
+        # 与命令行批量渲染 (batch_render.py) 共用 build_manim_command
+        command = build_manim_command(
+            selected_py_path,
+            quality_flag=quality_flag,
+            output_format=output_format,
+            transparent=transparent,
+            preview_flag=preview_flag,
+            media_dir=output_path or None,
+        )
 
-        # 输出格式 (--format gif) 和透明度 (-t) 相关标志
-        selected_format_value = self.format_map.get(format_key)
-        # output_suffix = ".mp4" # 不再需要，manim 会自动处理
-
-        if selected_format_value == "gif":
-            command.extend(["--format", "gif"]) # 指定 GIF 格式
-            # GIF 不支持预览播放 (-p)，改为打开文件夹 (-f)
-            if preview_flag == "-p": preview_flag = "-f"
-            # GIF 支持透明度
-            if transparent and "-t" not in command: command.append("-t")
-        elif selected_format_value == "png_last":
-            command.append("-s") # 保存最后一帧为 PNG
-            # PNG 不支持预览播放 (-p)，改为打开文件夹 (-f)
-            if preview_flag == "-p": preview_flag = "-f"
-            # PNG 支持透明度
-            if transparent and "-t" not in command: command.append("-t")
-        elif transparent: # 如果是 MP4 但需要透明，manim 会输出 .mov
-            command.append("-t")
-            # MOV 通常无法直接播放，改为打开文件夹
-            if preview_flag == "-p": preview_flag = "-f"
-
-        # 添加最终确定的预览标志
-        if preview_flag and preview_flag != "none":
-            command.append(preview_flag)
-
-        # Manim 脚本文件路径
-        command.append(script)
-
-        # 场景名称 (如果不是渲染全部场景)
-        if scene != "全部场景 (-a)":
-            command.append(scene)
-
-        # --- 执行渲染命令 --- #
-        command_str = subprocess.list2cmdline(command) # 生成可读的命令字符串
-        self._update_output_log(f"执行命令:\n{command_str}\n\n") # 显示将要执行的命令
+        # 场景名称：选择"全部场景"时拆分为每个场景一个任务，并行渲染
+        if scene == "全部场景 (-a)":
+            scene_names = self.scene_names
+        else:
+            scene_names = [scene]
+        # 根据场景源码估计帧数和像素量，高分辨率渲染长场景前提醒
+        costs = estimate_script(script)
+        long_scenes = [name for name in scene_names
+                       if name in costs and costs[name].pixels(quality_flag) >= LONG_RENDER_PIXELS]
+        if long_scenes:
+            details = "\n".join(f"{name}: {format_cost(costs[name], quality_flag)}" for name in long_scenes)
+            if not messagebox.askyesno("渲染耗时较长",
+                                       f"以 {quality_flag} 渲染以下场景可能需要很长时间:\n{details}\n\n"
+                                       f"可以先用较低质量预览。是否继续？"):
+                self._update_output_log("--- 已取消渲染 ---\n")
+                return
+        # 输出视频时，从不播放动画的场景由渲染器改为直接导出单帧 PNG
+        static_fast_path = output_format == "mp4"
+        for name in scene_names:
+            if name in costs:
+                fast_path = "，快速路径: 直接导出单帧 PNG" if static_fast_path and costs[name].static else ""
+                self._update_output_log(f"{name} 静态估计: {format_cost(costs[name], quality_flag)}{fast_path}\n")
+
+        # 多个场景时先启动最长的任务
+        jobs = order_longest_first(build_scene_jobs(command, script, scene_names))
+        self._launch_jobs(jobs, selected_py_path, derived_qualities, derived_formats, static_fast_path)
+
+    def _launch_jobs(self, jobs, python_path, derived_qualities=None, derived_formats=None, static_fast_path=False):
+        """显示命令和预计耗时并在后台运行渲染任务 (由 _start_render 和监视模式调用)。"""
+        if self.watch_mode.get():
+            # 记录本次渲染的脚本版本，监视模式只重新渲染之后改变的场景
+            self.watch_fingerprints = get_scene_fingerprints(self.script_path.get()) or self.watch_fingerprints
+        for job_name, job_command in jobs:
+            command_str = subprocess.list2cmdline(job_command) # 生成可读的命令字符串
+            self._update_output_log(f"执行命令:\n{command_str}\n") # 显示将要执行的命令
+            # 根据历史渲染记录显示预计耗时
+            self._update_output_log(f"预计耗时: {format_expected(self.telemetry.expected(job_command))}\n\n")
+        self.progress_trackers = {(job_name if len(jobs) > 1 else ""): ProgressTracker() for job_name, _ in jobs}
+        self._progress_dirty = True
         self.is_rendering = True
-        self.render_button.configure(text="渲染中...", state="disabled")
         self._toggle_controls(enabled=False)
+        # 渲染期间渲染按钮变为取消按钮
+        self.render_button.configure(text="取消渲染", state="normal", command=self._cancel_render)
 
         def on_render_complete():
             self.is_rendering = False
-            self.render_button.configure(text="开始渲染") # 状态由 _toggle_controls 控制
+            self.render_job = None
+            self.render_button.configure(text="开始渲染", command=self._start_render) # 状态由 _toggle_controls 控制
             self._toggle_controls(enabled=True)
             self._update_output_log("\n--- 渲染完成 ---\n")
+            if self.watch_pending:
+                # 渲染期间脚本又被保存过
+                self._on_watched_change(set())
+
+        def completion_callback(results):
+            if self.winfo_exists():
+                self.after(100, on_render_complete)
+
+        worker_pool = None
+        if self.use_warm_worker.get():
+            worker_pool = self._get_warm_pool(python_path)
+
+        cache = self.render_cache if self.use_render_cache.get() else None
+        self.render_job = run_manim_jobs(jobs, self._handle_render_event, completion_callback=completion_callback,
+                                         worker_pool=worker_pool, cache=cache,
+                                         chunked=self.use_chunked_render.get(), telemetry=self.telemetry,
+                                         derived_qualities=derived_qualities, derived_formats=derived_formats,
+                                         encode_options=ENCODE_PRESETS.get(self.encode_preset.get()),
+                                         static_fast_path=static_fast_path,
+                                         tex_cache_dir=get_default_tex_cache_dir(), precompile_tex=True)
+
+    def _on_watch_toggled(self):
+        """打开或关闭监视模式。"""
+        if self.watch_mode.get():
+            self._start_watching()
+        else:
+            self._stop_watching()
+            self._update_output_log("--- 监视模式已关闭 ---\n")
 
-        def output_callback_wrapper(line):
-            self._update_output_log(line)
-            if "--- 渲染进程结束" in line:
-                if self.winfo_exists():
-                    self.after(100, on_render_complete)
+    def _start_watching(self):
+        """监视当前脚本：记录各场景的指纹，脚本保存后比较指纹。"""
+        self._stop_watching()
+        script = self.script_path.get()
+        if not script or not os.path.exists(script):
+            messagebox.showerror("错误", "请先选择一个有效的 Manim 脚本文件。")
+            self.watch_mode.set(False)
+            return
+        self.watch_fingerprints = get_scene_fingerprints(script) or {}
+        self.watch_pending = set()
+
+        def on_change(changed_paths):
+            if self.winfo_exists():
+                self.after(0, self._on_watched_change, changed_paths)
+
+        self.file_watcher = FileWatcher([script], on_change)
+        backend = self.file_watcher.start()
+        self._update_output_log(f"--- 监视模式: 正在监视 {os.path.basename(script)} ({backend})，"
+                                f"保存后以 -ql 重新渲染改变的场景 ---\n")
+
+    def _stop_watching(self):
+        if self.file_watcher is not None:
+            self.file_watcher.stop()
+            self.file_watcher = None
+        self.watch_pending = set()
+
+    def _on_watched_change(self, changed_paths):
+        """脚本被保存后 (在界面线程中调用)：找出指纹改变的场景并以草稿质量渲染。"""
+        script = self.script_path.get()
+        if self.file_watcher is None or not script:
+            return
+        if self.is_rendering:
+            self.watch_pending.add(script)
+            return
+        self.watch_pending = set()
+        fingerprints = get_scene_fingerprints(script)
+        if fingerprints is None:
+            self._update_output_log("--- 监视模式: 脚本无法解析，等待下一次保存 ---\n")
+            return
+        # 保存后场景可能增加或删除，刷新场景列表 (不清空日志)
+        self.scene_names = find_scene_names(script)
+        self.scene_menu.configure(values=["全部场景 (-a)"] + self.scene_names if self.scene_names else ["未找到场景"])
+        selected = self.selected_scene.get()
+        candidates = self.scene_names if selected not in self.scene_names else [selected]
+        scene_names = changed_scenes(self.watch_fingerprints, fingerprints, candidates)
+        if not scene_names:
+            self.watch_fingerprints = fingerprints
+            self._update_output_log("--- 监视模式: 没有场景改变 ---\n")
+            return
+        self._update_output_log(f"--- 监视模式: {', '.join(scene_names)} 已改变，以 -ql 重新渲染 ---\n")
+        python_path = self.python_path.get()
+        if not python_path:
+            return
+        # 草稿不生成 GIF：选择 GIF 时预览 MP4
+        draft_format = "png_last" if self.format_map.get(self.selected_format.get()) == "png_last" else "mp4"
+        command = build_manim_command(
+            python_path,
+            quality_flag="-ql",
+            output_format=draft_format,
+            transparent=self.transparent_bg.get(),
+            preview_flag=self.preview_map.get(self.preview_action.get()),
+            media_dir=self._internal_output_dir or None,
+        )
+        self._launch_jobs(build_scene_jobs(command, script, scene_names), python_path,
+                          static_fast_path=draft_format == "mp4")
+
+    def _cancel_render(self):
+        """取消正在运行的渲染：终止所有渲染进程组 (包括 ffmpeg、latex 子进程)。"""
+        if self.render_job is None or self.render_job.done():
+            return
+        self._update_output_log("\n--- 正在取消渲染... ---\n")
+        self.render_button.configure(text="正在取消...", state="disabled")
+        self.render_job.cancel()
+
+    def _get_warm_pool(self, python_path):
+        """返回与指定解释器对应的预热进程池，必要时(重新)启动它。"""
+        if not WarmWorkerPool.is_supported():
+            self._update_output_log("当前平台不支持预热进程，使用普通子进程渲染。\n")
+            return None
+        pool = self.warm_pool
+        if pool is None or pool.python_path != python_path or not pool.is_alive():
+            if pool is not None:
+                pool.close()
+            self._update_output_log("正在启动预热进程 (首次需要导入 manim)...\n")
+            pool = WarmWorkerPool(python_path)
+            try:
+                pool.start()
+            except Exception as e:
+                self._update_output_log(f"启动预热进程失败，使用普通子进程渲染: {e}\n")
+                self.warm_pool = None
+                return None
+            self.warm_pool = pool
+        return pool
 
-        run_manim_command(command, output_callback_wrapper)
+    def _on_close(self):
+        """关闭窗口前终止正在运行的渲染并停止常驻渲染进程。
+
+        在主线程中同步等待，因此只给进程 CLOSE_GRACE_SECONDS 秒自行退出，并先提示正在停止。
+        """
+        if self.render_job is not None or self.warm_pool is not None:
+            try:
+                self.progress_label.configure(text="正在停止渲染进程…")
+                self.update_idletasks()
+            except tk.TclError:
+                pass
+        if self.render_job is not None:
+            # 同步终止渲染进程组 (短暂等待后强制终止)，不依赖退出后可能来不及运行的后台定时器
+            self.render_job.shutdown(grace=CLOSE_GRACE_SECONDS)
+        if self.warm_pool is not None:
+            self.warm_pool.close(timeout=CLOSE_GRACE_SECONDS)
+            self.warm_pool = None
+        self._stop_watching()
+        self.log_pipeline.close()
+        self.destroy()
 
     def _toggle_controls(self, enabled: bool):
         """根据渲染状态启用或禁用 GUI 中的控件。"""
@@ -900,9 +1331,12 @@ class ManimGUI(ctk.CTk):
             self.quality_menu,
             self.format_menu,
             self.transparent_checkbox,
+            self.warm_worker_checkbox,
+            self.render_cache_checkbox,
+            self.chunked_render_checkbox,
             self.preview_menu,
             self.render_button
-        ]
+        ] + self.extra_output_checkboxes
 
         for widget in widgets_to_toggle:
             # 特殊处理场景菜单和渲染按钮的启用条件
@@ -917,6 +1351,8 @@ class ManimGUI(ctk.CTk):
                 python_valid = self.python_path.get() and (os.path.exists(self.python_path.get()) or shutil.which(self.python_path.get()))
                 scene_valid = self.selected_scene.get() not in ["选择场景", "未找到场景"]
                 widget.configure(state="normal" if enabled and script_valid and python_valid and scene_valid else "disabled")
+            elif widget == self.warm_worker_checkbox:
+                widget.configure(state=state if WarmWorkerPool.is_supported() else "disabled")
             else:
                 # 对于其他所有控件（包括下拉菜单和只读输入框），直接设置状态
                 widget.configure(state=state)
@@ -1,5 +1,6 @@
 from manim import *
 import numpy as np
+from scipy.signal import lfilter  # scipy 是 manim 的依赖
 
 # --- 全局配置 ---
 # 配置已移至 manim.cfg 文件
@@ -36,6 +37,9 @@ class PanelData3D(ThreeDScene):
     Z_MAX = 2.5     # Z 轴最大值
     NUM_POINTS = 30 # 每条折线的数据点数量
     NUM_GRAPHS = 6  # 图表数量
+    NOISE_STD = 0.4        # 白噪声的标准差
+    SMOOTHING_ALPHA = 0.4  # 指数平滑因子
+    RANDOM_SEED = 2024     # 随机种子 (每个图表使用由它派生的独立随机数流)
     
     # 相机视角常量
     INITIAL_PHI = 90 * DEGREES      # 初始俯仰角 (正视 XZ 平面)
@@ -52,7 +56,43 @@ class PanelData3D(ThreeDScene):
     CONNECTING_RECT_RUNTIME = 2     # 连接矩形动画时长
     MOVEMENT_RUNTIME = 3            # 平移动画时长
     
-    def create_graph_instance(self, y_shift_val):
+    def generate_panel_series(self, y_positions):
+        """
+        一次生成所有图表的 Z 轴数据 (NUM_GRAPHS × NUM_POINTS 矩阵)。
+
+        每个图表使用由 RANDOM_SEED 派生的独立随机数流 (不重设全局随机种子，
+        图表数量改变时已有图表的数据不变)；指数平滑用 lfilter 对整个矩阵逐行递推，
+        不需要 Python 循环。
+
+        Args:
+            y_positions (np.ndarray): 各图表沿 Y 轴的平移距离，决定波动幅度。
+
+        Returns:
+            np.ndarray: 形状为 (len(y_positions), NUM_POINTS) 的矩阵，每行已归一化到 [Z_MIN, Z_MAX]。
+        """
+        y_positions = np.asarray(y_positions, dtype=float)
+        # 将 y 位置从 [-4.5, 4.5] 映射到 [0, 1] 的归一化因子
+        norm_factor = (y_positions - (-4.5)) / (4.5 - (-4.5))
+        # 控制波动幅度，波动幅度从 1.0 到 2.0
+        amplitude = 1.0 + norm_factor * 1.0
+
+        # 生成白噪声矩阵，每行来自独立的随机数流
+        streams = np.random.SeedSequence(self.RANDOM_SEED).spawn(len(y_positions))
+        noise = np.array([np.random.default_rng(stream).normal(0, self.NOISE_STD, self.NUM_POINTS)
+                          for stream in streams]).reshape(len(y_positions), self.NUM_POINTS)
+
+        # 指数平滑: z[0] = noise[0]，z[i] = alpha * amplitude * noise[i] + (1 - alpha) * z[i-1]
+        alpha = self.SMOOTHING_ALPHA
+        inputs = alpha * amplitude[:, np.newaxis] * noise
+        inputs[:, 0] = noise[:, 0]
+        z_values = lfilter([1.0], [1.0, -(1 - alpha)], inputs, axis=1)
+
+        # 逐行归一化并调整到目标范围 [Z_MIN, Z_MAX]
+        z_min = z_values.min(axis=1, keepdims=True)
+        z_max = z_values.max(axis=1, keepdims=True)
+        return self.Z_MIN + (z_values - z_min) / (z_max - z_min) * (self.Z_MAX - self.Z_MIN)
+
+    def create_graph_instance(self, y_shift_val, z_values):
         """
         创建单个图表实例，包括坐标轴、标签和数据折线。
         并将创建的 Mobjects 沿世界坐标系的 Y 轴进行平移。
@@ -60,6 +100,7 @@ class PanelData3D(ThreeDScene):
         Args:
             y_shift_val (float): 指定该图表实例沿世界坐标系 Y 轴的平移距离。
                                 正值向屏幕外侧移动，负值向屏幕内侧移动。
+            z_values (np.ndarray): 该图表的 Z 轴数据 (generate_panel_series 结果中的一行)。
 
         Returns:
             tuple[ThreeDAxes, VMobject]: 包含两个元素的元组：
@@ -112,34 +153,12 @@ class PanelData3D(ThreeDScene):
         # 生成 X 轴 (时间 t) 的数据点，从 X_START 到 X_END 均匀分布
         x_values = np.linspace(self.X_START, self.X_END, self.NUM_POINTS)
         
-        # --- 使用随机波动生成 Z 轴数据 ---
-        # 将 y_shift_val 从 [-4.5, 4.5] 映射到 [0, 1] 的归一化因子
-        norm_factor = (y_shift_val - (-4.5)) / (4.5 - (-4.5))
-        
-        # 生成随机波动
-        np.random.seed(int((norm_factor + 1) * 1000))  # 不同的种子产生不同的随机序列
-        
-        # 生成白噪声序列，增加标准差使波动更大
-        noise = np.random.normal(0, 0.4, self.NUM_POINTS)  # 标准差 0.4
-        
-        # 应用简单的指数平滑来减少过于剧烈的波动
-        alpha = 0.4  # 平滑因子
-        z_values = np.zeros(self.NUM_POINTS)
-        z_values[0] = noise[0]
-        
-        # 控制波动幅度，显著增加范围
-        amplitude = 1.0 + norm_factor * 1.0  # 波动幅度从 1.0 到 2.0
-        
-        # 生成平滑的随机序列
-        for i in range(1, self.NUM_POINTS):
-            z_values[i] = alpha * noise[i] * amplitude + (1 - alpha) * z_values[i-1]
-        
-        # 归一化并调整到目标范围 [Z_MIN, Z_MAX]
-        z_range = self.Z_MAX - self.Z_MIN
-        z_values = self.Z_MIN + ((z_values - np.min(z_values)) / (np.max(z_values) - np.min(z_values))) * z_range
-        
         # 将 (x, z) 数据点转换为 Manim 坐标系中的点
-        points = [axes.coords_to_point(x, 0, z) for x, z in zip(x_values, z_values)]
+        # 坐标系是线性的，由原点和两个单位向量一次性完成所有点的仿射变换
+        origin = axes.coords_to_point(0, 0, 0)
+        x_unit = axes.coords_to_point(1, 0, 0) - origin
+        z_unit = axes.coords_to_point(0, 0, 1) - origin
+        points = origin + np.outer(x_values, x_unit) + np.outer(z_values, z_unit)
 
         # 使用生成的点创建一条平滑的折线 (VMobject)
         line = VMobject(color=BLUE).set_points_smoothly(points)
@@ -283,8 +302,9 @@ class PanelData3D(ThreeDScene):
         # --- 4. 创建所有图表实例 ---
         all_axes = VGroup()  # 使用 VGroup 分组所有坐标轴
         all_lines = VGroup() # 使用 VGroup 分组所有折线 
-        for y_pos in y_positions:
-            axes_instance, line_instance = self.create_graph_instance(y_pos)
+        panel_series = self.generate_panel_series(y_positions)  # 一次生成所有图表的数据
+        for y_pos, z_values in zip(y_positions, panel_series):
+            axes_instance, line_instance = self.create_graph_instance(y_pos, z_values)
             all_axes.add(axes_instance)
             all_lines.add(line_instance)
             